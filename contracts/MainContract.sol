@@ -12,10 +12,22 @@ contract MainContract {
         address subContractAddress;
     }
 
+    // What a queue reader needs to pick a task, without its content
+    struct ComputeTaskHeader {
+        uint256 id;
+        address subContractAddress;
+        uint256 timestamp;
+    }
+
     ComputeTask[] public RequestQueue;
     ComputeTask[] public InProgressQueue;
     ComputeTask[] public CompletedQueue;
 
+    // Position plus one of each task id in its queue, 0 when absent
+    mapping(uint256 => uint256) private requestPositions;
+    mapping(uint256 => uint256) private inProgressPositions;
+    mapping(uint256 => uint256) private completedPositions;
+
     // Function to add a new task to the request queue
     //Public available to all users
     function addToRequestQueue(
@@ -25,6 +37,12 @@ contract MainContract {
     ) public payable {
         require(msg.value == _sum, "Incorrect token amount sent");
         require(msg.sender.balance >= _sum, "Insufficient balance to add task");
+        require(
+            requestPositions[_id] == 0 &&
+            inProgressPositions[_id] == 0 &&
+            completedPositions[_id] == 0,
+            "Task with the given ID already exists"
+        );
 
         ComputeTask memory newTask = ComputeTask({
             sender: msg.sender,
@@ -35,46 +53,98 @@ contract MainContract {
             subContractAddress: address(0)
         });
 
-        RequestQueue.push(newTask);
+        _push(RequestQueue, requestPositions, newTask);
     }
 
     //Function to move a task from the RequestQueue to the InProgressQueue
     //only availabe to the ROFL/TEE
     function moveToInProgressQueue(uint256 _id, address _subContractAddress) public {
-        for (uint256 i = 0; i < RequestQueue.length; i++) {
-            if (RequestQueue[i].id == _id) {
-                // Update the subcontract address
-                RequestQueue[i].subContractAddress = _subContractAddress;
-
-                // Add the task to the InProgressQueue
-                InProgressQueue.push(RequestQueue[i]);
+        ComputeTask memory task = _remove(
+            RequestQueue, requestPositions, _id,
+            "Task with the given ID not found in RequestQueue");
 
-                // Remove the task from the RequestQueue
-                RequestQueue[i] = RequestQueue[RequestQueue.length - 1];
-                RequestQueue.pop();
-
-                return;
-            }
-        }
-        revert("Task with the given ID not found in RequestQueue");
+        // Update the subcontract address
+        task.subContractAddress = _subContractAddress;
+        _push(InProgressQueue, inProgressPositions, task);
     }
 
     //Function to move a task from the InProgressQueue to the CompletedQueue
     //only availabe to the ROFL/TEE
     function moveToCompletedQueue(uint256 _id) public {
-        for (uint256 i = 0; i < InProgressQueue.length; i++) {
-            if (InProgressQueue[i].id == _id) {
-                // Add the task to the CompletedQueue
-                CompletedQueue.push(InProgressQueue[i]);
+        ComputeTask memory task = _remove(
+            InProgressQueue, inProgressPositions, _id,
+            "Task with the given ID not found in InProgressQueue");
+        _push(CompletedQueue, completedPositions, task);
+    }
+
+    function _push(
+        ComputeTask[] storage _queue,
+        mapping(uint256 => uint256) storage _positions,
+        ComputeTask memory _task
+    ) internal {
+        _queue.push(_task);
+        _positions[_task.id] = _queue.length;
+    }
+
+    // Removes a task by moving the last task of the queue into its place
+    function _remove(
+        ComputeTask[] storage _queue,
+        mapping(uint256 => uint256) storage _positions,
+        uint256 _id,
+        string memory _notFound
+    ) internal returns (ComputeTask memory task) {
+        uint256 position = _positions[_id];
+        require(position != 0, _notFound);
+        task = _queue[position - 1];
+
+        uint256 lastId = _queue[_queue.length - 1].id;
+        _queue[position - 1] = _queue[_queue.length - 1];
+        _positions[lastId] = position;
+        _queue.pop();
+        delete _positions[_id];
+    }
 
-                // Remove the task from the InProgressQueue
-                InProgressQueue[i] = InProgressQueue[InProgressQueue.length - 1];
-                InProgressQueue.pop();
+    function _pageLength(
+        uint256 _total,
+        uint256 _offset,
+        uint256 _limit
+    ) internal pure returns (uint256) {
+        if (_offset >= _total) {
+            return 0;
+        }
+        uint256 remaining = _total - _offset;
+        return remaining < _limit ? remaining : _limit;
+    }
+
+    function _page(
+        ComputeTask[] storage _queue,
+        uint256 _offset,
+        uint256 _limit
+    ) internal view returns (ComputeTask[] memory) {
+        uint256 count = _pageLength(_queue.length, _offset, _limit);
+        ComputeTask[] memory page = new ComputeTask[](count);
+        for (uint256 i = 0; i < count; i++) {
+            page[i] = _queue[_offset + i];
+        }
+        return page;
+    }
 
-                return;
-            }
+    function _headers(
+        ComputeTask[] storage _queue,
+        uint256 _offset,
+        uint256 _limit
+    ) internal view returns (ComputeTaskHeader[] memory) {
+        uint256 count = _pageLength(_queue.length, _offset, _limit);
+        ComputeTaskHeader[] memory headers = new ComputeTaskHeader[](count);
+        for (uint256 i = 0; i < count; i++) {
+            ComputeTask storage task = _queue[_offset + i];
+            headers[i] = ComputeTaskHeader({
+                id: task.id,
+                subContractAddress: task.subContractAddress,
+                timestamp: task.timestamp
+            });
         }
-        revert("Task with the given ID not found in InProgressQueue");
+        return headers;
     }
 
     function getRequestQueue() public view returns (ComputeTask[] memory) {
@@ -89,4 +159,53 @@ contract MainContract {
         return CompletedQueue;
     }
 
-}
\ No newline at end of file
+    function getRequestQueueLength() public view returns (uint256) {
+        return RequestQueue.length;
+    }
+
+    function getInProgressQueueLength() public view returns (uint256) {
+        return InProgressQueue.length;
+    }
+
+    function getCompletedQueueLength() public view returns (uint256) {
+        return CompletedQueue.length;
+    }
+
+    // Paged reads, a page holds at most _limit tasks from _offset on
+    function getRequestQueuePage(uint256 _offset, uint256 _limit)
+        public view returns (ComputeTask[] memory)
+    {
+        return _page(RequestQueue, _offset, _limit);
+    }
+
+    function getInProgressQueuePage(uint256 _offset, uint256 _limit)
+        public view returns (ComputeTask[] memory)
+    {
+        return _page(InProgressQueue, _offset, _limit);
+    }
+
+    function getCompletedQueuePage(uint256 _offset, uint256 _limit)
+        public view returns (ComputeTask[] memory)
+    {
+        return _page(CompletedQueue, _offset, _limit);
+    }
+
+    // Header-only paged reads, without the task contents
+    function getRequestQueueHeaders(uint256 _offset, uint256 _limit)
+        public view returns (ComputeTaskHeader[] memory)
+    {
+        return _headers(RequestQueue, _offset, _limit);
+    }
+
+    function getInProgressQueueHeaders(uint256 _offset, uint256 _limit)
+        public view returns (ComputeTaskHeader[] memory)
+    {
+        return _headers(InProgressQueue, _offset, _limit);
+    }
+
+    function getCompletedQueueHeaders(uint256 _offset, uint256 _limit)
+        public view returns (ComputeTaskHeader[] memory)
+    {
+        return _headers(CompletedQueue, _offset, _limit);
+    }
+}
@@ -0,0 +1,31 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+// Aggregates view calls, so reading N contracts costs one eth_call
+contract Multicall {
+    struct Call {
+        address target;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    // Runs every call with staticcall. A failing call is reported in its
+    // result instead of reverting the whole batch.
+    function aggregate(Call[] calldata _calls)
+        public
+        view
+        returns (uint256 blockNumber, Result[] memory results)
+    {
+        blockNumber = block.number;
+        results = new Result[](_calls.length);
+        for (uint256 i = 0; i < _calls.length; i++) {
+            (bool success, bytes memory returnData) =
+                _calls[i].target.staticcall(_calls[i].callData);
+            results[i] = Result(success, returnData);
+        }
+    }
+}
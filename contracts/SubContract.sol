@@ -22,12 +22,40 @@ contract SubContract {
         uint256 maxRun;
     }
 
+    // The fixed-size fields of a crumb, without its JSON strings
+    struct CrumbHeader {
+        bytes16 id;
+        CrumbStatus status;
+        uint256 price;
+        address assignee;
+        uint256 lastUpdated;
+        uint256 maxRun;
+    }
+
+    // Arguments of addCrumb, for adding many crumbs in one transaction
+    struct NewCrumb {
+        bytes16 id;
+        string aliasName;
+        uint256 price;
+        string setupTask;
+        string setupValidation;
+        uint256 maxRun;
+    }
+
     // State variables
     address public requester;
     string public requestName;
     Crumb[] public crumbs;
     bytes21 public roflAppID;
 
+    // Index sets, so lookups and filtered reads do not scan crumbs[].
+    // Positions are stored plus one, 0 meaning "not present".
+    mapping(bytes16 => uint256) private crumbPositions;
+    mapping(CrumbStatus => uint256[]) private positionsByStatus;
+    mapping(bytes16 => uint256) private statusSlots;
+    mapping(address => uint256[]) private positionsByAssignee;
+    mapping(bytes16 => uint256) private assigneeSlots;
+
     // Events
     event CrumbAdded(bytes16 indexed id, string aliasName);
     event CrumbUpdated(bytes16 indexed id, CrumbStatus status, address assignee);
@@ -53,7 +81,7 @@ contract SubContract {
     }
 
 
-    // Function to add a new crumb
+    // Function to add a new crumb, reverts when the id already exists
     function addCrumb(
         bytes16 _id,
         string memory _aliasName,
@@ -63,6 +91,33 @@ contract SubContract {
         uint256 _maxRun
     ) public {
         // TODO - only ROFL/TEE
+        _addCrumb(_id, _aliasName, _price, _setupTask, _setupValidation, _maxRun);
+    }
+
+    // Function to add many crumbs in one transaction
+    function addCrumbs(NewCrumb[] calldata _crumbs) public {
+        // TODO - only ROFL/TEE
+        for (uint256 i = 0; i < _crumbs.length; i++) {
+            _addCrumb(
+                _crumbs[i].id,
+                _crumbs[i].aliasName,
+                _crumbs[i].price,
+                _crumbs[i].setupTask,
+                _crumbs[i].setupValidation,
+                _crumbs[i].maxRun
+            );
+        }
+    }
+
+    function _addCrumb(
+        bytes16 _id,
+        string memory _aliasName,
+        uint256 _price,
+        string memory _setupTask,
+        string memory _setupValidation,
+        uint256 _maxRun
+    ) internal {
+        require(crumbPositions[_id] == 0, "Crumb already exists");
         Crumb memory newCrumb = Crumb({
             id: _id,
             aliasName: _aliasName,
@@ -77,22 +132,30 @@ contract SubContract {
         });
 
         crumbs.push(newCrumb);
+        crumbPositions[_id] = crumbs.length;
+        _addToStatus(crumbs.length - 1);
         emit CrumbAdded(_id, _aliasName);
     }
 
     // Function to update a crumb's status to Queued and assignee
     // asignee beeing the transaction signer
     function updateCrumbToQueued(bytes16 _id) public {
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].id == _id) {
-                crumbs[i].status = CrumbStatus.QUEUED;
-                crumbs[i].assignee = msg.sender;
-                crumbs[i].lastUpdated = block.timestamp;
-                emit CrumbUpdated(_id, CrumbStatus.QUEUED, msg.sender);
-                return;
-            }
+        _queueCrumb(_id);
+    }
+
+    // Function to queue many crumbs in one transaction
+    function updateCrumbsToQueued(bytes16[] calldata _ids) public {
+        for (uint256 i = 0; i < _ids.length; i++) {
+            _queueCrumb(_ids[i]);
         }
-        revert("Crumb not found");
+    }
+
+    function _queueCrumb(bytes16 _id) internal {
+        uint256 position = _positionOf(_id);
+        _setStatus(position, CrumbStatus.QUEUED);
+        _setAssignee(position, msg.sender);
+        crumbs[position].lastUpdated = block.timestamp;
+        emit CrumbUpdated(_id, CrumbStatus.QUEUED, msg.sender);
     }
 
     // Function to update a crumb's status to Closed and set the result
@@ -101,17 +164,12 @@ contract SubContract {
         bytes16 _id,
         string memory _result
     ) public {
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].id == _id) {
-                require(crumbs[i].assignee == msg.sender, "Not authorized");
-                crumbs[i].status = CrumbStatus.CLOSED;
-                crumbs[i].result = _result;
-                crumbs[i].lastUpdated = block.timestamp;
-                emit CrumbUpdated(_id, CrumbStatus.CLOSED, msg.sender);
-                return;
-            }
-        }
-        revert("Crumb not found");
+        uint256 position = _positionOf(_id);
+        require(crumbs[position].assignee == msg.sender, "Not authorized");
+        _setStatus(position, CrumbStatus.CLOSED);
+        crumbs[position].result = _result;
+        crumbs[position].lastUpdated = block.timestamp;
+        emit CrumbUpdated(_id, CrumbStatus.CLOSED, msg.sender);
     }
     
     // Function to update a crumb's status to ClosedValidated
@@ -119,26 +177,132 @@ contract SubContract {
     function updateCrumbToClosedValidated(
         bytes16 _id
     ) public {
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].id == _id) {
-                crumbs[i].status = CrumbStatus.CLOSED_VALIDATED;
-                crumbs[i].lastUpdated = block.timestamp;
-                emit CrumbUpdated(_id, CrumbStatus.CLOSED_VALIDATED, msg.sender);
-                return;
-            }
+        _validateCrumb(_id);
+    }
+
+    // Function to validate many crumbs in one transaction
+    // TODO - only ROFL/TEE
+    function updateCrumbsToClosedValidated(bytes16[] calldata _ids) public {
+        for (uint256 i = 0; i < _ids.length; i++) {
+            _validateCrumb(_ids[i]);
+        }
+    }
+
+    function _validateCrumb(bytes16 _id) internal {
+        uint256 position = _positionOf(_id);
+        _setStatus(position, CrumbStatus.CLOSED_VALIDATED);
+        crumbs[position].lastUpdated = block.timestamp;
+        emit CrumbUpdated(_id, CrumbStatus.CLOSED_VALIDATED, msg.sender);
+    }
+
+    // INDEX SETS
+    // Position of a crumb in crumbs[], reverts for unknown ids
+    function _positionOf(bytes16 _id) internal view returns (uint256) {
+        uint256 position = crumbPositions[_id];
+        require(position != 0, "Crumb not found");
+        return position - 1;
+    }
+
+    function _addToStatus(uint256 _position) internal {
+        uint256[] storage positions = positionsByStatus[crumbs[_position].status];
+        positions.push(_position);
+        statusSlots[crumbs[_position].id] = positions.length;
+    }
+
+    // Swap and pop, the order of an index set is not meaningful
+    function _removeFromStatus(uint256 _position) internal {
+        uint256[] storage positions = positionsByStatus[crumbs[_position].status];
+        bytes16 id = crumbs[_position].id;
+        uint256 slot = statusSlots[id] - 1;
+        uint256 last = positions[positions.length - 1];
+        positions[slot] = last;
+        statusSlots[crumbs[last].id] = slot + 1;
+        positions.pop();
+        delete statusSlots[id];
+    }
+
+    function _setStatus(uint256 _position, CrumbStatus _status) internal {
+        if (crumbs[_position].status == _status) {
+            return;
+        }
+        _removeFromStatus(_position);
+        crumbs[_position].status = _status;
+        _addToStatus(_position);
+    }
+
+    function _setAssignee(uint256 _position, address _assignee) internal {
+        Crumb storage crumb = crumbs[_position];
+        if (crumb.assignee == _assignee) {
+            return;
+        }
+        if (crumb.assignee != address(0)) {
+            uint256[] storage previous = positionsByAssignee[crumb.assignee];
+            uint256 slot = assigneeSlots[crumb.id] - 1;
+            uint256 last = previous[previous.length - 1];
+            previous[slot] = last;
+            assigneeSlots[crumbs[last].id] = slot + 1;
+            previous.pop();
         }
-        revert("Crumb not found");
+        crumb.assignee = _assignee;
+        positionsByAssignee[_assignee].push(_position);
+        assigneeSlots[crumb.id] = positionsByAssignee[_assignee].length;
+    }
+
+    // Copies crumbs[_positions[_offset.._offset + _limit]] to memory
+    function _page(
+        uint256[] storage _positions,
+        uint256 _offset,
+        uint256 _limit
+    ) internal view returns (Crumb[] memory) {
+        uint256 count = _pageLength(_positions.length, _offset, _limit);
+        Crumb[] memory page = new Crumb[](count);
+        for (uint256 i = 0; i < count; i++) {
+            page[i] = crumbs[_positions[_offset + i]];
+        }
+        return page;
+    }
+
+    // Header view of crumbs[_positions[_offset.._offset + _limit]]
+    function _headerPage(
+        uint256[] storage _positions,
+        uint256 _offset,
+        uint256 _limit
+    ) internal view returns (CrumbHeader[] memory) {
+        uint256 count = _pageLength(_positions.length, _offset, _limit);
+        CrumbHeader[] memory page = new CrumbHeader[](count);
+        for (uint256 i = 0; i < count; i++) {
+            page[i] = _header(crumbs[_positions[_offset + i]]);
+        }
+        return page;
+    }
+
+    function _header(Crumb storage _crumb) internal view returns (CrumbHeader memory) {
+        return CrumbHeader({
+            id: _crumb.id,
+            status: _crumb.status,
+            price: _crumb.price,
+            assignee: _crumb.assignee,
+            lastUpdated: _crumb.lastUpdated,
+            maxRun: _crumb.maxRun
+        });
+    }
+
+    function _pageLength(
+        uint256 _total,
+        uint256 _offset,
+        uint256 _limit
+    ) internal pure returns (uint256) {
+        if (_offset >= _total) {
+            return 0;
+        }
+        uint256 remaining = _total - _offset;
+        return remaining < _limit ? remaining : _limit;
     }
 
     // GETTERS
     // Function to retrieve a crumb by its ID
     function getCrumb(bytes16 _id) public view returns (Crumb memory) {
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].id == _id) {
-                return crumbs[i];
-            }
-        }
-        revert("Crumb not found");
+        return crumbs[_positionOf(_id)];
     }
 
     // Function to get the total number of crumbs
@@ -151,56 +315,86 @@ contract SubContract {
         return crumbs;
     }
 
+    // Function to get a page of crumbs, in insertion order
+    function getCrumbsPage(
+        uint256 _offset,
+        uint256 _limit
+    ) public view returns (Crumb[] memory) {
+        uint256 count = _pageLength(crumbs.length, _offset, _limit);
+        Crumb[] memory page = new Crumb[](count);
+        for (uint256 i = 0; i < count; i++) {
+            page[i] = crumbs[_offset + i];
+        }
+        return page;
+    }
+
     // Function to get the number of crumbs with a specific status
     function getCrumbCountByStatus(CrumbStatus _status) public view returns (uint256) {
-        uint256 count = 0;
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].status == _status) {
-                count++;
-            }
-        }
-        return count;
+        return positionsByStatus[_status].length;
     }
 
-    // Function to get all crumbs with a specific status
+    // Function to get all crumbs with a specific status. The order is that
+    // of the status index set: swap-and-pop removals reorder it, so it is
+    // not the insertion order
     function getCrumbsByStatus(CrumbStatus _status) public view returns (Crumb[] memory) {
-        uint256 count = getCrumbCountByStatus(_status);
-        Crumb[] memory filteredCrumbs = new Crumb[](count);
-        uint256 index = 0;
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].status == _status) {
-                filteredCrumbs[index] = crumbs[i];
-                index++;
-            }
-        }
-        return filteredCrumbs;
+        uint256[] storage positions = positionsByStatus[_status];
+        return _page(positions, 0, positions.length);
     }
 
+    // Function to get a page of the crumbs with a specific status
+    function getCrumbsByStatusPage(
+        CrumbStatus _status,
+        uint256 _offset,
+        uint256 _limit
+    ) public view returns (Crumb[] memory) {
+        return _page(positionsByStatus[_status], _offset, _limit);
+    }
 
-    function getCrumbsByRequester() public view returns (Crumb[] memory) {
-        uint256 count = 0;
+    // Function to get the number of crumbs assigned to the caller
+    function getCrumbCountByRequester() public view returns (uint256) {
+        return positionsByAssignee[msg.sender].length;
+    }
 
-        // Count crumbs for the requester
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].assignee == msg.sender) {
-                count++;
-            }
-        }
+    // Function to get all crumbs assigned to the caller, in the order of
+    // the assignee index set (not the insertion order)
+    function getCrumbsByRequester() public view returns (Crumb[] memory) {
+        uint256[] storage positions = positionsByAssignee[msg.sender];
+        return _page(positions, 0, positions.length);
+    }
 
-        // Create an array to store the matching crumbs
-        Crumb[] memory filteredCrumbs = new Crumb[](count);
-        uint256 index = 0;
+    // Function to get a page of the crumbs assigned to the caller
+    function getCrumbsByRequesterPage(
+        uint256 _offset,
+        uint256 _limit
+    ) public view returns (Crumb[] memory) {
+        return _page(positionsByAssignee[msg.sender], _offset, _limit);
+    }
 
-        for (uint256 i = 0; i < crumbs.length; i++) {
-            if (crumbs[i].assignee == msg.sender) {
-                filteredCrumbs[index] = crumbs[i];
-                index++;
-            }
+    // Header-only pages, for scanning crumbs without their JSON strings
+    function getCrumbHeadersPage(
+        uint256 _offset,
+        uint256 _limit
+    ) public view returns (CrumbHeader[] memory) {
+        uint256 count = _pageLength(crumbs.length, _offset, _limit);
+        CrumbHeader[] memory page = new CrumbHeader[](count);
+        for (uint256 i = 0; i < count; i++) {
+            page[i] = _header(crumbs[_offset + i]);
         }
-
-        return filteredCrumbs;
+        return page;
     }
 
+    function getCrumbHeadersByStatusPage(
+        CrumbStatus _status,
+        uint256 _offset,
+        uint256 _limit
+    ) public view returns (CrumbHeader[] memory) {
+        return _headerPage(positionsByStatus[_status], _offset, _limit);
+    }
 
+    function getCrumbHeadersByRequesterPage(
+        uint256 _offset,
+        uint256 _limit
+    ) public view returns (CrumbHeader[] memory) {
+        return _headerPage(positionsByAssignee[msg.sender], _offset, _limit);
+    }
 }
-
@@ -0,0 +1,111 @@
+import hashlib
+from dataclasses import asdict, dataclass, fields, replace
+from functools import cache
+from pathlib import Path
+
+from peft import LoraConfig, TaskType, get_peft_model, \
+    get_peft_model_state_dict, set_peft_model_state_dict
+
+from core.artifact_store import CHUNK_SIZE
+
+# Files of a pretrained checkpoint that decide its weights
+BASE_MODEL_FILES = {".safetensors", ".bin"}
+BASE_MODEL_CONFIG = "config.json"
+
+
+@dataclass(frozen=True)
+class AdapterSettings:
+    """Low-rank adapter (LoRA) fine-tuning of a task.
+
+    The base model is frozen and only the rank r adapters of
+    target_modules and the classification head are trained. None as
+    target_modules lets peft choose the attention projections of the
+    architecture.
+    """
+    r: int = 8
+    alpha: int = 16
+    dropout: float = 0.1
+    target_modules: tuple[str, ...] | None = None
+    learning_rate: float = 5e-4
+
+    def with_options(self, options: dict) -> "AdapterSettings":
+        """A copy with the fields given in options changed, as set by the
+        adapter_options of a setup_task."""
+        known = {field.name for field in fields(self)}
+        unknown = set(options) - known
+        if unknown:
+            raise ValueError(f"Unknown adapter options {sorted(unknown)}")
+        if options.get("target_modules") is not None:
+            options = {**options,
+                       "target_modules": tuple(options["target_modules"])}
+        return replace(self, **options)
+
+    def lora_config(self) -> LoraConfig:
+        return LoraConfig(
+            task_type=TaskType.SEQ_CLS,
+            r=self.r,
+            lora_alpha=self.alpha,
+            lora_dropout=self.dropout,
+            target_modules=list(self.target_modules)
+            if self.target_modules is not None else None)
+
+    def wrap(self, model):
+        """The model with its weights frozen and adapters added."""
+        return get_peft_model(model, self.lora_config())
+
+    def load(self, model, weights: dict):
+        """Wraps model and loads published adapter weights into it."""
+        model = self.wrap(model)
+        result = set_peft_model_state_dict(model, weights)
+        if result.unexpected_keys:
+            raise ValueError(f"Adapter weights do not fit the model: "
+                             f"{result.unexpected_keys[:5]}")
+        return model
+
+    def to_params(self) -> dict:
+        """The settings as published in the result params."""
+        params = asdict(self)
+        if self.target_modules is not None:
+            params["target_modules"] = list(self.target_modules)
+        return params
+
+
+def adapter_settings(fine_tuning: str | None = None,
+                     options: dict | None = None) -> AdapterSettings | None:
+    """The adapter settings of a setup_task, None for full fine-tuning."""
+    if fine_tuning in (None, "full"):
+        return None
+    if fine_tuning != "adapter":
+        raise ValueError(f"No fine-tuning mode [{fine_tuning}]")
+    return AdapterSettings().with_options(options or {})
+
+
+def adapter_state_dict(model) -> dict:
+    """The trained weights of a wrapped model: adapters and classification
+    head, without the frozen base."""
+    return {name: tensor.detach().contiguous()
+            for name, tensor in get_peft_model_state_dict(model).items()}
+
+
+def base_model_digest(model_path: str | Path) -> str:
+    """sha256 of the pretrained checkpoint in model_path, over its weight
+    files and config. Computed once per version of the files."""
+    files = sorted(path for path in Path(model_path).iterdir()
+                   if path.suffix in BASE_MODEL_FILES
+                   or path.name == BASE_MODEL_CONFIG)
+    if not any(path.suffix in BASE_MODEL_FILES for path in files):
+        raise FileNotFoundError(f"No model weights in {model_path}")
+    return files_digest(tuple(
+        (str(path), path.stat().st_size, path.stat().st_mtime_ns)
+        for path in files))
+
+
+@cache
+def files_digest(files: tuple[tuple[str, int, int], ...]) -> str:
+    digest = hashlib.sha256()
+    for path, size, _ in files:
+        digest.update(f"{Path(path).name}\0{size}\0".encode())
+        with open(path, "rb") as source:
+            while chunk := source.read(CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
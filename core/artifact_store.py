@@ -0,0 +1,106 @@
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from os import getcwd
+from os.path import join
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArtifactStore(ABC):
+    """Content-addressed storage for task artifacts.
+
+    Artifacts are addressed by the sha256 of their bytes, so storing the
+    same weights or predictions twice keeps a single copy and a hash on
+    chain is enough to find and verify them. Backends implement put_file,
+    get_path and uri.
+    """
+
+    def put(self, data: bytes) -> str:
+        """Stores data, returns its sha256."""
+        with tempfile.NamedTemporaryFile(delete=False) as temporary_file:
+            temporary_file.write(data)
+        try:
+            return self.put_file(temporary_file.name)
+        finally:
+            if os.path.exists(temporary_file.name):
+                os.unlink(temporary_file.name)
+
+    @abstractmethod
+    def put_file(self, path: str | Path) -> str:
+        """Stores the file at path, returns its sha256."""
+
+    @abstractmethod
+    def get_path(self, digest: str) -> Path:
+        """Returns a local path holding the artifact."""
+
+    def get(self, digest: str) -> bytes:
+        data = self.get_path(digest).read_bytes()
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Artifact {digest} is corrupted")
+        return data
+
+    @abstractmethod
+    def uri(self, digest: str) -> str:
+        """URI under which the artifact can be fetched."""
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Keeps artifacts in a local directory, one file per hash."""
+
+    def __init__(self, root: str | Path | None = None):
+        self.root: Path = Path(root or join(getcwd(), "output", "artifacts"))
+
+    def __repr__(self) -> str:
+        return f"LocalArtifactStore({str(self.root)!r})"
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put_file(self, path: str | Path) -> str:
+        digest = hashlib.sha256()
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Hash while copying, the final name is only known at the end
+        with open(path, "rb") as source, tempfile.NamedTemporaryFile(
+                dir=self.root, delete=False) as temporary_file:
+            while chunk := source.read(CHUNK_SIZE):
+                digest.update(chunk)
+                temporary_file.write(chunk)
+        content_hash = digest.hexdigest()
+        target = self.path(content_hash)
+        target.parent.mkdir(exist_ok=True)
+        os.replace(temporary_file.name, target)
+        return content_hash
+
+    def get_path(self, digest: str) -> Path:
+        path = self.path(digest)
+        if not path.exists():
+            raise FileNotFoundError(f"Artifact {digest} is not in {self.root}")
+        return path
+
+    def uri(self, digest: str) -> str:
+        return self.path(digest).as_uri()
+
+
+# Backends by URI scheme, plain paths use the local directory backend
+ARTIFACT_STORES: dict[str, type[ArtifactStore]] = {
+    "": LocalArtifactStore,
+    "file": LocalArtifactStore,
+}
+
+
+def open_artifact_store(location: str | None = None) -> ArtifactStore:
+    """Returns the store for a location such as a directory or file:// URL.
+    Other backends register their scheme in ARTIFACT_STORES."""
+    if location is None:
+        return LocalArtifactStore()
+    parsed = urlparse(location)
+    if parsed.scheme not in ARTIFACT_STORES:
+        raise ValueError(f"No artifact store for {location}")
+    if parsed.scheme == "file":
+        location = url2pathname(parsed.path)
+    return ARTIFACT_STORES[parsed.scheme](location)
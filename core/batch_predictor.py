@@ -0,0 +1,71 @@
+from core.constants import MAX_SEQUENCE_LEN
+from core.metrics import top_labels
+
+import numpy as np
+import torch
+
+
+def select_labels(probabilities: np.ndarray, multi_label: bool) -> list:
+    """Turns a (rows, classes) probability matrix into labels.
+
+    Single label tasks get the most probable class index. Multi label
+    tasks get up to MULTI_LABEL_TASK class indexes, most probable first,
+    keeping only those with at least MIN_CLASS_PROBABILITY.
+    """
+    if not multi_label:
+        return probabilities.argmax(axis=1).tolist()
+
+    top, keep = top_labels(probabilities)
+    return [row[mask].tolist() for row, mask in zip(top, keep)]
+
+
+class BatchPredictor:
+    """Batched inference for a fine-tuned sequence classification model.
+
+    Inputs are tokenized once without padding and sorted by token length,
+    so every batch holds texts of similar length and is padded only up to
+    its own longest text. Results are mapped back to the original ids.
+    """
+
+    def __init__(self, model, tokenizer, batch_size: int,
+                 multi_label: bool = False,
+                 max_length: int = MAX_SEQUENCE_LEN):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.multi_label = multi_label
+        self.max_length = max_length
+
+    def probabilities(self, logits: torch.Tensor) -> np.ndarray:
+        if self.multi_label:
+            return torch.sigmoid(logits).float().cpu().numpy()
+        return torch.softmax(logits, dim=-1).float().cpu().numpy()
+
+    def predict(self, text_ids: list, texts: list[str]) -> dict:
+        encodings = self.tokenizer(
+            texts, truncation=True, max_length=self.max_length)
+        lengths = np.fromiter(
+            (len(ids) for ids in encodings["input_ids"]), dtype=np.int64,
+            count=len(texts))
+        order = np.argsort(lengths, kind="stable")
+
+        self.model.eval()
+        device = next(self.model.parameters()).device
+        predictions = {}
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                bucket = order[start:start + self.batch_size]
+                batch = self.tokenizer.pad(
+                    {key: [encodings[key][i] for i in bucket]
+                     for key in encodings.keys()},
+                    return_tensors="pt")
+                batch = {key: value.to(device) for key, value in batch.items()}
+                logits = self.model(**batch).logits
+
+                labels = select_labels(
+                    self.probabilities(logits), self.multi_label)
+                for i, label in zip(bucket, labels):
+                    predictions[text_ids[i]] = label
+
+        # Keep the input order of the ids
+        return {text_id: predictions[text_id] for text_id in text_ids}
@@ -9,9 +9,65 @@ ds_text_id_key = "ds_id_column"
 train_ds_url_key = "train_ds_url"
 test_ds_url_key = "test_ds_url"
 predict_ds_url_key = "predict_ds_url"
+revision_key = "revision"
+streaming_key = "streaming"
+model_key = "model"
+confidence_key = "confidence"
+margin_key = "margin"
+tolerance_key = "tolerance"
+training_profile_key = "training_profile"
+training_options_key = "training_options"
+fine_tuning_key = "fine_tuning"
+adapter_options_key = "adapter_options"
+adapter_key = "adapter"
 
 
 MAX_SEQUENCE_LEN = 512
+STREAMING_CHUNK_ROWS = 10_000  # Rows predicted per chunk in streaming mode
 MIN_CLASS_PROBABILITY = 0.2
 MULTI_LABEL_TASK = 3
-DECIMALS_TO_ROUND_TO = 8
\ No newline at end of file
+DECIMALS_TO_ROUND_TO = 8
+
+# Job discovery
+FETCH_CONCURRENCY = 16  # Sub-contracts queried at the same time
+FETCH_TIMEOUT = 10  # Seconds allowed for a single sub-contract query
+EVENT_BLOCK_RANGE = 100  # Blocks per eth_getLogs request
+EVENT_POLL_INTERVAL = 2  # Seconds between eth_getLogs polls
+EVENT_MAX_BACKOFF = 60  # Longest wait after failed polls of crumb events
+EVENT_RECONCILE_INTERVAL = 300  # Seconds between full fetch_job passes
+EVENT_ADDRESS_REFRESH_INTERVAL = 30  # Seconds between sub-contract list reads
+CRUMB_INDEX_MAX_STALENESS = 30  # Seconds a local crumb index read may lag
+
+# Job pipeline
+POLL_INTERVAL = 30  # Seconds between polling passes that found nothing
+COMPUTE_SLOTS = 1  # Tasks computed at the same time, one process each
+JOB_QUEUE_SIZE = 2  # Jobs waiting for a compute slot or for publication
+PUBLISH_CONCURRENCY = 4  # Results being published at the same time
+JOB_MAX_ATTEMPTS = 5  # Failed attempts before a crumb is given up
+RETRY_DELAY = 60  # Seconds before the first retry of a failed crumb, doubled
+RETRY_MAX_DELAY = 60 * 60  # Longest wait before retrying a failed crumb
+
+# Model cache
+MODEL_CACHE_MAX_BYTES = 4 * 1024 ** 3  # Loaded weights kept across jobs
+
+# Dataset cache
+DATASET_CACHE_MAX_BYTES = 10 * 1024 ** 3  # Downloads and Arrow copies
+
+# Tokenization
+TOKENIZE_PROCESSES = 4  # Worker processes tokenizing a large dataset
+TOKENIZE_MIN_ROWS_PER_PROCESS = 5_000  # Smaller datasets stay in-process
+
+# Task supervision
+JOB_DEADLINE = 24 * 60 * 60  # Seconds a job may run, max_run can only lower it
+HEARTBEAT_INTERVAL = 60  # Seconds between progress lines of a running job
+PROGRESS_INTERVAL = 1  # Seconds between row counts sent by a running task
+SUPERVISOR_POLL_INTERVAL = 0.2  # Seconds between checks on a running task
+
+# Validation
+VALIDATION_CONFIDENCE = 0.99  # Confidence of the sampled mismatch rate
+VALIDATION_MARGIN = 0.02  # Margin of error of the sampled mismatch rate
+VALIDATION_TOLERANCE = 0.01  # Mismatch rate a validated result may have
+
+# Training
+TRAINING_PROFILE = "default"  # Profile of tasks that do not choose one
+TRAINING_TIME_SHARE = 0.8  # Share of a job's deadline training may use
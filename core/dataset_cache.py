@@ -0,0 +1,258 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from os import getcwd
+from os.path import join
+from pathlib import Path
+from typing import Iterator
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+from urllib.request import Request, url2pathname, urlopen
+
+from core.constants import DATASET_CACHE_MAX_BYTES
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def local_path(url: str) -> Path | None:
+    """Returns the filesystem path of file:// URLs and plain paths."""
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return Path(url2pathname(parsed.path))
+    if parsed.scheme == "":
+        return Path(url)
+    return None
+
+
+class DatasetCache:
+    """On-disk cache of task datasets.
+
+    Downloads are stored once per content hash under blobs/, and the URL
+    index remembers the ETag/Last-Modified validators of each URL so that
+    later fetches are conditional requests. Local files are validated by
+    size and mtime instead. Every blob is converted once to an
+    uncompressed Arrow IPC file that later jobs memory-map instead of
+    parsing the CSV again. Blobs are evicted least recently used first
+    once the cache, downloads and Arrow copies together, grows past
+    max_bytes.
+
+    The cross-process lock only guards the index: downloads and Arrow
+    conversions are written to temporary files outside of it, and moved
+    into blobs/ under the lock, where they are checked against evictions
+    made in the meantime.
+    """
+
+    def __init__(self,
+                 root: str | None = None,
+                 max_bytes: int = DATASET_CACHE_MAX_BYTES):
+        self.root: Path = Path(root or join(getcwd(), "cache", "datasets"))
+        self.max_bytes: int = max_bytes
+
+    @property
+    def blobs(self) -> Path:
+        return self.root / "blobs"
+
+    @contextmanager
+    def locked_index(self):
+        """Yields the URL index under an exclusive lock, shared by the
+        worker processes, and saves it on exit."""
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index_path = self.root / "index.json"
+            index = {}
+            if index_path.exists():
+                with open(index_path) as index_file:
+                    index = json.load(index_file)
+            yield index
+            temporary_path = index_path.with_suffix(".tmp")
+            with open(temporary_path, "w") as index_file:
+                json.dump(index, index_file)
+            os.replace(temporary_path, index_path)
+
+    def store(self, source, suffix: str) -> str:
+        """Copies a readable binary stream into blobs/, returns its hash."""
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+                dir=self.blobs, delete=False) as temporary_file:
+            while chunk := source.read(CHUNK_SIZE):
+                digest.update(chunk)
+                temporary_file.write(chunk)
+        content_hash = digest.hexdigest()
+        os.replace(temporary_file.name, self.blobs / f"{content_hash}{suffix}")
+        return content_hash
+
+    def blob_path(self, entry: dict) -> Path:
+        return self.blobs / f"{entry['sha256']}{entry['suffix']}"
+
+    def fetch(self, url: str) -> Path:
+        """Returns the path of a cached copy of url, downloading it when
+        it is missing or no longer valid."""
+        with self.locked_index() as index:
+            entry = index.get(url)
+        # Download without the lock, other workers keep using the cache
+        path = local_path(url)
+        if path is not None:
+            entry = self.fetch_local(path, entry)
+        else:
+            entry = self.fetch_remote(url, entry)
+        with self.locked_index() as index:
+            evicted = not self.blob_path(entry).exists()
+            if not evicted:
+                entry["last_used"] = time.time()
+                index[url] = entry
+                self.evict(index, keep=entry["sha256"])
+        if evicted:
+            # A still valid copy was evicted meanwhile, download it again
+            return self.fetch(url)
+        return self.blob_path(entry)
+
+    def fetch_local(self, path: Path, entry: dict | None) -> dict:
+        stat = os.stat(path)
+        validators = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if entry is not None and entry["validators"] == validators \
+                and self.blob_path(entry).exists():
+            return entry
+        with open(path, "rb") as source:
+            content_hash = self.store(source, path.suffix)
+        return {"sha256": content_hash, "suffix": path.suffix,
+                "validators": validators}
+
+    def fetch_remote(self, url: str, entry: dict | None) -> dict:
+        headers = {}
+        if entry is not None and self.blob_path(entry).exists():
+            validators = entry["validators"]
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        else:
+            entry = None
+
+        try:
+            with urlopen(Request(url, headers=headers)) as response:
+                suffix = Path(urlparse(url).path).suffix
+                content_hash = self.store(response, suffix)
+                return {"sha256": content_hash, "suffix": suffix,
+                        "validators": {
+                            "etag": response.headers.get("ETag"),
+                            "last_modified":
+                                response.headers.get("Last-Modified")}}
+        except HTTPError as error:
+            if error.code == 304 and entry is not None:
+                return entry
+            raise
+        except URLError:
+            if entry is None:
+                raise
+            print(f"Could not revalidate {url}, using the cached copy")
+            return entry
+
+    def evict(self, index: dict, keep: str):
+        # A blob is its download plus its Arrow copy
+        sizes = {}
+        for path in self.blobs.iterdir():
+            content_hash = path.name.split(".")[0]
+            sizes[content_hash] = \
+                sizes.get(content_hash, 0) + path.stat().st_size
+        # Temporary files of downloads in progress are not counted
+        referenced = {entry["sha256"] for entry in index.values()}
+        total = sum(sizes.get(content_hash, 0) for content_hash in referenced)
+
+        by_age = sorted(index.items(), key=lambda item: item[1]["last_used"])
+        for url, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            content_hash = entry["sha256"]
+            if content_hash == keep:
+                continue
+            del index[url]
+            if any(other["sha256"] == content_hash
+                   for other in index.values()):
+                continue
+            for path in self.blobs.glob(f"{content_hash}*"):
+                path.unlink()
+            total -= sizes.get(content_hash, 0)
+
+    def arrow_path(self, url: str,
+                   string_columns: tuple[str, ...] = ()) -> Path:
+        """Returns the Arrow IPC copy of a CSV dataset, converting it on
+        first use.
+
+        Column types are inferred from the first block of the CSV, so a
+        column that mixes numbers and text further down fails to convert.
+        string_columns are read as strings instead; each set of them has
+        its own copy.
+        """
+        csv_path = self.fetch(url)
+        content_hash = csv_path.name.split(".")[0]
+        arrow_path = csv_path.with_suffix(".arrow")
+        if string_columns:
+            key = hashlib.sha256(
+                "\0".join(sorted(string_columns)).encode()).hexdigest()
+            arrow_path = csv_path.with_name(
+                f"{content_hash}.{key[:16]}.arrow")
+        if arrow_path.exists():
+            return arrow_path
+        # Convert block by block so large files never sit in memory
+        reader = pa_csv.open_csv(
+            csv_path, convert_options=pa_csv.ConvertOptions(column_types={
+                column: pa.string() for column in string_columns}))
+        with tempfile.NamedTemporaryFile(
+                dir=self.blobs, delete=False) as temporary_file:
+            with pa.ipc.new_file(temporary_file, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+
+        with self.locked_index() as index:
+            cached = csv_path.exists() and any(
+                entry["sha256"] == content_hash for entry in index.values())
+            if cached:
+                os.replace(temporary_file.name, arrow_path)
+                self.evict(index, keep=content_hash)
+        if not cached:
+            # The blob was evicted during the conversion
+            os.unlink(temporary_file.name)
+            return self.arrow_path(url, string_columns)
+        return arrow_path
+
+    def iter_batches(self,
+                     url: str,
+                     rows: int,
+                     columns: list[str] | None = None,
+                     string_columns: tuple[str, ...] = ()
+                     ) -> Iterator[pa.RecordBatch]:
+        """Yields the dataset in record batches of at most rows rows,
+        read from the memory-mapped Arrow copy."""
+        with pa.memory_map(
+                str(self.arrow_path(url, string_columns))) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, rows):
+                    yield batch.slice(offset, rows)
+
+    def read_table(self, url: str,
+                   string_columns: tuple[str, ...] = ()) -> pa.Table:
+        """Memory-maps the cached Arrow copy of a dataset."""
+        source = pa.memory_map(str(self.arrow_path(url, string_columns)))
+        return pa.ipc.open_file(source).read_all()
+
+    def read_dataframe(self, url: str,
+                       string_columns: tuple[str, ...] = ()
+                       ) -> pd.DataFrame:
+        return self.read_table(url, string_columns).to_pandas()
+
+
+# Shared by every task run in this process
+dataset_cache = DatasetCache()
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import time
+from os import getcwd
+from os.path import join
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from web3 import AsyncWeb3, Web3
+from web3.providers.persistent import WebSocketProvider
+from websockets.exceptions import ConnectionClosed
+
+from core.constants import EVENT_ADDRESS_REFRESH_INTERVAL, \
+    EVENT_BLOCK_RANGE, EVENT_MAX_BACKOFF, EVENT_POLL_INTERVAL
+from src.ContractUtility import ContractUtility
+from src.SubContract import CrumbStatus, CrumbUpdate, crumb_event_topic, \
+    decode_crumb_update, get_crumb_updates
+
+
+class CrumbEventFollower:
+    """Follows the CrumbUpdated events of a set of sub-contracts and
+    reports the crumbs that get QUEUED to our account.
+
+    Events are read with eth_getLogs over block ranges, or pushed by a
+    logs subscription when a WebSocket endpoint is configured. The last
+    fully processed block is persisted in cursor_path, so a restart
+    resumes where the previous run stopped.
+
+    With list_addresses the followed sub-contracts are read again every
+    address_refresh_interval seconds. The blocks processed since the
+    previous read did not include the sub-contracts added meanwhile, so
+    their events are replayed for those before the cursor moves on.
+    """
+
+    def __init__(self,
+                 contract_utility: ContractUtility,
+                 cursor_path: str | None = None,
+                 block_range: int = EVENT_BLOCK_RANGE,
+                 poll_interval: float = EVENT_POLL_INTERVAL,
+                 ws_endpoint: str | None = None,
+                 list_addresses: Callable[[], Awaitable[list[str]]]
+                 | None = None,
+                 address_refresh_interval: float =
+                 EVENT_ADDRESS_REFRESH_INTERVAL):
+        self.contract_utility: ContractUtility = contract_utility
+        self.cursor_path: Path = Path(
+            cursor_path or join(getcwd(), "output", "event_cursor.json"))
+        self.block_range: int = block_range
+        self.poll_interval: float = poll_interval
+        self.ws_endpoint: str | None = ws_endpoint
+        self.list_addresses = list_addresses
+        self.address_refresh_interval: float = address_refresh_interval
+        self.addresses: list[str] = []
+        # Latest block when the addresses were read, and when that was
+        self.addresses_block: int | None = None
+        self.addresses_read_at: float | None = None
+        self.queued: asyncio.Queue[CrumbUpdate] = asyncio.Queue()
+        self.cursor: int | None = self.load_cursor()
+
+    def load_cursor(self) -> int | None:
+        if not self.cursor_path.exists():
+            return None
+        with open(self.cursor_path) as cursor_file:
+            return json.load(cursor_file)["block"]
+
+    def save_cursor(self, block: int):
+        self.cursor = block
+        self.cursor_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.cursor_path.with_suffix(".tmp")
+        with open(temporary_path, "w") as cursor_file:
+            json.dump({"block": block}, cursor_file)
+        os.replace(temporary_path, self.cursor_path)
+
+    def set_addresses(self, addresses: list[str]):
+        self.addresses = [
+            Web3.to_checksum_address(address) for address in addresses]
+
+    def addresses_due(self) -> bool:
+        return self.list_addresses is not None and (
+            self.addresses_read_at is None
+            or time.monotonic() - self.addresses_read_at
+            >= self.address_refresh_interval)
+
+    async def refresh_addresses(self, latest: int, replay_until: int | None):
+        """Reads the followed sub-contracts as of block latest, and replays
+        the events of the new ones up to block replay_until."""
+        followed = set(self.addresses)
+        previous_block = self.addresses_block
+        self.set_addresses(await self.list_addresses())
+        self.addresses_block = latest
+        self.addresses_read_at = time.monotonic()
+        added = [address for address in self.addresses
+                 if address not in followed]
+        if added and previous_block is not None and replay_until is not None:
+            await self.replay(added, previous_block + 1, replay_until)
+
+    async def replay(self, addresses: list[str], from_block: int,
+                     to_block: int) -> list[CrumbUpdate]:
+        """Processes the events of some addresses over blocks that are
+        already behind the cursor."""
+        found = []
+        while from_block <= to_block:
+            end = min(from_block + self.block_range - 1, to_block)
+            updates = await get_crumb_updates(
+                addresses, from_block, end,
+                contract_utility=self.contract_utility)
+            found.extend(update for update in updates if self.handle(update))
+            from_block = end + 1
+        return found
+
+    def handle(self, update: CrumbUpdate) -> bool:
+        """Queues the update if it assigns a crumb to our account."""
+        if (update.status != CrumbStatus.QUEUED or update.assignee
+                != self.contract_utility.w3.eth.default_account):
+            return False
+        self.queued.put_nowait(update)
+        return True
+
+    async def poll(self) -> list[CrumbUpdate]:
+        """Processes every block since the cursor, in ranges of at most
+        block_range blocks, and returns the updates that were queued.
+
+        On the first run there is no cursor; it is set to the latest
+        block and nothing is replayed.
+        """
+        latest = await self.contract_utility.w3.eth.get_block_number()
+        if self.addresses_due():
+            await self.refresh_addresses(latest, self.cursor)
+        if self.cursor is None:
+            self.save_cursor(latest)
+            return []
+
+        found = []
+        from_block = self.cursor + 1
+        while from_block <= latest:
+            to_block = min(from_block + self.block_range - 1, latest)
+            updates = await get_crumb_updates(
+                self.addresses, from_block, to_block,
+                contract_utility=self.contract_utility)
+            found.extend(update for update in updates if self.handle(update))
+            self.save_cursor(to_block)
+            from_block = to_block + 1
+        return found
+
+    async def follow(self):
+        """Runs forever, feeding self.queued. Failed polls and dropped
+        subscriptions are retried after poll_interval, doubled per
+        consecutive failure up to EVENT_MAX_BACKOFF."""
+        failures = 0
+        while True:
+            try:
+                if self.ws_endpoint is None:
+                    await self.poll()
+                else:
+                    await self.follow_subscription()
+                failures = 0
+                delay = self.poll_interval
+            except Exception as error:
+                failures += 1
+                delay = min(EVENT_MAX_BACKOFF,
+                            self.poll_interval * 2 ** (failures - 1))
+                if isinstance(error, (ConnectionClosed, OSError)):
+                    print(f"Log subscription dropped ({error}), "
+                          f"reconnecting in {delay:.0f}s...")
+                else:
+                    print(f"Following crumb events failed ({error}), "
+                          f"retrying in {delay:.0f}s...")
+            await asyncio.sleep(delay)
+
+    async def refresh_addresses_periodically(self):
+        """Keeps the addresses fresh while a subscription runs. Logs of new
+        sub-contracts were dropped until now, so they are replayed up to
+        the latest block."""
+        while True:
+            await asyncio.sleep(self.address_refresh_interval)
+            try:
+                latest = \
+                    await self.contract_utility.w3.eth.get_block_number()
+                await self.refresh_addresses(latest, latest)
+            except Exception as error:
+                print(f"Reading the followed sub-contracts failed: {error}")
+
+    async def follow_subscription(self):
+        # Catch up on anything emitted while we were not subscribed
+        await self.poll()
+        refresher = None
+        if self.list_addresses is not None:
+            refresher = asyncio.create_task(
+                self.refresh_addresses_periodically())
+        try:
+            await self.process_subscription()
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+
+    async def process_subscription(self):
+        async with AsyncWeb3(WebSocketProvider(self.ws_endpoint)) as w3:
+            await w3.eth.subscribe(
+                "logs", {"topics": [crumb_event_topic("CrumbUpdated")]})
+            async for response in w3.socket.process_subscriptions():
+                log = response["result"]
+                if Web3.to_checksum_address(log["address"]) \
+                        not in self.addresses:
+                    continue
+                update = decode_crumb_update(log, self.contract_utility)
+                self.handle(update)
+                # Later logs of the same block may still be on their way
+                self.save_cursor(
+                    max(self.cursor or 0, update.block_number - 1))
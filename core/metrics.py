@@ -0,0 +1,168 @@
+from core.constants import MIN_CLASS_PROBABILITY, MULTI_LABEL_TASK
+
+import numpy as np
+
+
+def to_numpy(values) -> np.ndarray:
+    """Arrays as given by the Trainer: torch tensors (possibly bf16, on
+    any device) or NumPy arrays."""
+    if hasattr(values, "detach"):
+        values = values.detach()
+        if values.is_floating_point():
+            values = values.float()
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+def top_labels(probabilities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """The labels of a multi label task, for a (rows, classes) probability
+    matrix: the MULTI_LABEL_TASK most probable class indexes of each row,
+    most probable first, and a mask of those with at least
+    MIN_CLASS_PROBABILITY."""
+    top = np.argsort(-probabilities, axis=1, kind="stable")[
+        :, :MULTI_LABEL_TASK]
+    keep = np.take_along_axis(probabilities, top, axis=1) \
+        >= MIN_CLASS_PROBABILITY
+    return top, keep
+
+
+def multi_label_mask(probabilities: np.ndarray) -> np.ndarray:
+    """(rows, classes) boolean matrix of the labels top_labels keeps."""
+    top, keep = top_labels(probabilities)
+    mask = np.zeros(probabilities.shape, dtype=bool)
+    np.put_along_axis(mask, top, keep, axis=1)
+    return mask
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # 0 where the denominator is 0, like sklearn's zero_division=0
+    return np.divide(numerator, denominator,
+                     out=np.zeros(np.shape(numerator), dtype=np.float64),
+                     where=denominator != 0)
+
+
+class ClassificationMetrics:
+    """Streaming accuracy, precision, recall and f1 from logits.
+
+    Batches are folded into per-class counts as they come (a confusion
+    matrix for single label tasks, true/false positives and negatives per
+    class for multi label ones), so evaluation never holds every
+    prediction. Instances are usable as a Trainer compute_metrics, also
+    with batch_eval_metrics: the counts are reset once a result is
+    computed.
+
+    :param multi_label: Rows may have several labels, given as multi-hot
+        label rows; predictions follow top_labels
+    :param num_classes: Number of classes, by default the width of the
+        first logits seen
+    """
+
+    def __init__(self, multi_label: bool = False,
+                 num_classes: int | None = None):
+        self.multi_label: bool = multi_label
+        self.num_classes: int | None = num_classes
+        self.reset()
+
+    def reset(self):
+        self.rows: int = 0
+        self.exact: int = 0  # Rows with every label right
+        self.confusion: np.ndarray | None = None
+        self.true_positives: np.ndarray | None = None
+        self.false_positives: np.ndarray | None = None
+        self.false_negatives: np.ndarray | None = None
+
+    def allocate(self, num_classes: int):
+        self.num_classes = self.num_classes or num_classes
+        classes = self.num_classes
+        if self.multi_label:
+            self.true_positives = np.zeros(classes, dtype=np.int64)
+            self.false_positives = np.zeros(classes, dtype=np.int64)
+            self.false_negatives = np.zeros(classes, dtype=np.int64)
+        else:
+            self.confusion = np.zeros((classes, classes), dtype=np.int64)
+
+    def update(self, logits, labels):
+        logits = to_numpy(logits)
+        labels = to_numpy(labels)
+        if self.confusion is None and self.true_positives is None:
+            self.allocate(logits.shape[-1])
+
+        if self.multi_label:
+            probabilities = np.exp(-np.logaddexp(0, -logits))
+            predicted = multi_label_mask(probabilities)
+            actual = labels > 0.5
+            self.true_positives += (predicted & actual).sum(axis=0)
+            self.false_positives += (predicted & ~actual).sum(axis=0)
+            self.false_negatives += (~predicted & actual).sum(axis=0)
+            self.exact += int((predicted == actual).all(axis=1).sum())
+            self.rows += len(labels)
+            return
+
+        # Rows labelled -100 are padding
+        keep = labels >= 0
+        actual = labels[keep].astype(np.int64)
+        predicted = logits[keep].argmax(axis=-1)
+        classes = self.num_classes
+        self.confusion += np.bincount(
+            actual * classes + predicted, minlength=classes * classes
+        ).reshape(classes, classes)
+        self.exact += int((actual == predicted).sum())
+        self.rows += len(actual)
+
+    def counts(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per-class true positives, false positives, false negatives."""
+        if self.multi_label:
+            return (self.true_positives, self.false_positives,
+                    self.false_negatives)
+        true_positives = np.diag(self.confusion)
+        return (true_positives,
+                self.confusion.sum(axis=0) - true_positives,
+                self.confusion.sum(axis=1) - true_positives)
+
+    def confusion_matrix(self) -> np.ndarray:
+        """(classes, classes) counts of actual x predicted for single
+        label tasks, (classes, 2, 2) [[tn, fp], [fn, tp]] per class for
+        multi label ones."""
+        if not self.multi_label:
+            return self.confusion.copy()
+        true_negatives = self.rows - self.true_positives - \
+            self.false_positives - self.false_negatives
+        return np.stack([
+            np.stack([true_negatives, self.false_positives], axis=-1),
+            np.stack([self.false_negatives, self.true_positives], axis=-1),
+        ], axis=1)
+
+    def compute(self) -> dict[str, float]:
+        if self.num_classes is None or self.rows == 0:
+            return {}
+        true_positives, false_positives, false_negatives = self.counts()
+        support = true_positives + false_negatives
+        precision = _ratio(true_positives, true_positives + false_positives)
+        recall = _ratio(true_positives, support)
+        f1 = _ratio(2 * true_positives,
+                    2 * true_positives + false_positives + false_negatives)
+
+        tp, fp, fn = (true_positives.sum(), false_positives.sum(),
+                      false_negatives.sum())
+        micro = {"precision": _ratio(tp, tp + fp),
+                 "recall": _ratio(tp, tp + fn),
+                 "f1": _ratio(2 * tp, 2 * tp + fp + fn)}
+        metrics = {"accuracy": self.exact / self.rows}
+        for name, per_class in (("precision", precision), ("recall", recall),
+                                ("f1", f1)):
+            metrics[f"{name}_micro"] = float(micro[name])
+            metrics[f"{name}_macro"] = float(per_class.mean())
+            metrics[f"{name}_weighted"] = float(
+                _ratio((per_class * support).sum(), support.sum()))
+        return metrics
+
+    def __call__(self, eval_pred, compute_result: bool = True) -> dict:
+        logits, labels = eval_pred[0], eval_pred[1]
+        if isinstance(logits, tuple):
+            logits = logits[0]
+        self.update(logits, labels)
+        if not compute_result:
+            return {}
+        metrics = self.compute()
+        self.reset()
+        return metrics
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from core.constants import MODEL_CACHE_MAX_BYTES
+
+import torch
+
+
+def estimate_size(value) -> int:
+    """Bytes held by the parameters and buffers of a model or pipeline.
+    Anything else (e.g. tokenizers) is counted as free."""
+    module = getattr(value, "model", value)
+    if not isinstance(module, torch.nn.Module):
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class ModelCache:
+    """In-process LRU cache of loaded models, tokenizers and pipelines.
+
+    Entries are evicted least recently used first once their estimated
+    size exceeds max_bytes. Pinned entries are never evicted.
+    """
+
+    def __init__(self, max_bytes: int = MODEL_CACHE_MAX_BYTES):
+        self.max_bytes: int = max_bytes
+        self.entries: OrderedDict[Hashable, tuple[object, int]] = \
+            OrderedDict()
+        self.pinned: set[Hashable] = set()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, size in self.entries.values())
+
+    def get(self,
+            key: Hashable,
+            loader: Callable[[], object],
+            pin: bool = False):
+        """Returns the cached value for key, loading it on a miss."""
+        if pin:
+            self.pinned.add(key)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        value = loader()
+        self.entries[key] = (value, estimate_size(value))
+        self.evict(keep=key)
+        return value
+
+    def pin(self, key: Hashable):
+        self.pinned.add(key)
+
+    def unpin(self, key: Hashable):
+        self.pinned.discard(key)
+        self.evict()
+
+    def evict(self, keep: Hashable | None = None):
+        for key in list(self.entries):
+            if self.size <= self.max_bytes:
+                return
+            if key in self.pinned or key == keep:
+                continue
+            del self.entries[key]
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.pinned.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Shared by every task run in this process
+model_cache = ModelCache()
@@ -0,0 +1,282 @@
+import asyncio
+import shutil
+import time
+from asyncio import sleep
+from dataclasses import dataclass
+from multiprocessing.context import BaseContext
+from os import getcwd
+from os.path import join
+from typing import TYPE_CHECKING
+
+from core.artifact_store import ArtifactStore, LocalArtifactStore
+from core.constants import COMPUTE_SLOTS, JOB_QUEUE_SIZE, \
+    PUBLISH_CONCURRENCY, POLL_INTERVAL, JOB_DEADLINE, JOB_MAX_ATTEMPTS, \
+    RETRY_DELAY, RETRY_MAX_DELAY
+from core.supervisor import ProgressEvent, TaskTimeout, TaskWorker
+from src.SubContract import Crumb
+
+if TYPE_CHECKING:
+    from core.scheduler import Orchestrator
+
+
+@dataclass
+class Job:
+    sub_contract_address: str
+    crumb: Crumb
+
+    @property
+    def key(self) -> tuple[str, bytes]:
+        return (self.sub_contract_address, self.crumb.id)
+
+    def deadline(self, job_deadline: float | None) -> float | None:
+        """Seconds the job may run: the crumb's max_run, capped by the
+        configured deadline. Zero or None means no limit."""
+        limits = [limit for limit in (self.crumb.max_run, job_deadline)
+                  if limit]
+        return min(limits) if limits else None
+
+
+class RetryBackoff:
+    """Failed attempts per job key.
+
+    After its n-th failure a key waits delay * 2^(n-1) seconds, at most
+    max_delay, before it is tried again, and after max_attempts failures
+    it is given up.
+    """
+
+    def __init__(self,
+                 max_attempts: int = JOB_MAX_ATTEMPTS,
+                 delay: float = RETRY_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.max_attempts: int = max_attempts
+        self.delay: float = delay
+        self.max_delay: float = max_delay
+        self.failures: dict[tuple[str, bytes], int] = {}
+        self.retry_at: dict[tuple[str, bytes], float] = {}
+
+    def failed(self, key: tuple[str, bytes]) -> float | None:
+        """Records a failure, returns the seconds until the next attempt
+        or None once the key is given up."""
+        failures = self.failures[key] = self.failures.get(key, 0) + 1
+        if failures >= self.max_attempts:
+            return None
+        delay = min(self.max_delay, self.delay * 2 ** (failures - 1))
+        self.retry_at[key] = time.monotonic() + delay
+        return delay
+
+    def ready(self, key: tuple[str, bytes]) -> bool:
+        """Whether key may be tried now."""
+        return self.failures.get(key, 0) < self.max_attempts and \
+            time.monotonic() >= self.retry_at.get(key, 0)
+
+    def succeeded(self, key: tuple[str, bytes]):
+        self.failures.pop(key, None)
+        self.retry_at.pop(key, None)
+
+
+def run_task(setup_task: str, artifact_store: ArtifactStore,
+             checkpoint_dir: str | None = None,
+             training_profile: str | None = None,
+             deadline: float | None = None) -> str:
+    """Runs one TransformerTask to completion and returns its result
+    manifest. Executed in a worker process, so it must stay importable at
+    module level; the artifacts are stored from the worker so the weights
+    never cross the process boundary. Partial work is kept in
+    checkpoint_dir, so a retry of a stopped job resumes from it.
+    training_profile is used when the task does not choose one, and
+    training stops early enough for predicting to fit in deadline."""
+    # Imported here so that only worker processes load torch/transformers
+    from core.prediction_spill import PredictionSpill
+    from core.result_codec import encode_results
+    from core.transformer_task import TransformerTask
+
+    task = TransformerTask()
+    task.default_training_profile = training_profile
+    task.set_params(setup_task)
+    task.checkpoint_dir = checkpoint_dir
+    task.deadline = deadline
+    task.start_working()
+    results = task.get_results()
+    try:
+        return encode_results(results, artifact_store)
+    finally:
+        if isinstance(results[1], PredictionSpill):
+            # Stored in the artifact store, or recomputed by a retry
+            results[1].unlink()
+
+
+class JobPipeline:
+    """Staged worker: discovery -> compute slots -> publisher.
+
+    Discovery feeds a bounded job queue and blocks when it is full, so at
+    most queue_size crumbs wait for a compute slot. Each compute slot runs
+    one task at a time in its own supervised worker process, keeping the
+    event loop free for RPC traffic. A task is stopped once it runs past
+    its crumb's max_run or job_deadline; its checkpoint is kept, so the
+    crumb is resumed when it is discovered again. A crumb that failed or
+    timed out stays in flight for the delay of retries before it can be
+    discovered again, and for good once it is given up. A result that
+    could not be published is published again after that delay, without
+    computing it again. Results go
+    through a second bounded queue to publish_concurrency publishers, so
+    the next crumbs are computed while earlier results are still being
+    confirmed.
+    """
+
+    def __init__(self,
+                 orchestrator: "Orchestrator",
+                 compute_slots: int = COMPUTE_SLOTS,
+                 queue_size: int = JOB_QUEUE_SIZE,
+                 publish_concurrency: int = PUBLISH_CONCURRENCY,
+                 poll_interval: float = POLL_INTERVAL,
+                 artifact_store: ArtifactStore | None = None,
+                 job_deadline: float | None = JOB_DEADLINE,
+                 mp_context: BaseContext | None = None,
+                 checkpoint_root: str | None = None,
+                 training_profile: str | None = None,
+                 retries: RetryBackoff | None = None):
+        self.orchestrator: "Orchestrator" = orchestrator
+        self.compute_slots: int = compute_slots
+        self.publish_concurrency: int = publish_concurrency
+        self.poll_interval: float = poll_interval
+        self.artifact_store: ArtifactStore = \
+            artifact_store or LocalArtifactStore()
+        self.jobs: asyncio.Queue[Job] = asyncio.Queue(maxsize=queue_size)
+        self.results: asyncio.Queue[tuple[Job, str]] = \
+            asyncio.Queue(maxsize=queue_size)
+        self.job_deadline: float | None = job_deadline
+        self.checkpoint_root: str = \
+            checkpoint_root or join(getcwd(), "cache", "checkpoints")
+        self.training_profile: str | None = training_profile
+        self.workers: list[TaskWorker] = [
+            TaskWorker(mp_context) for _ in range(compute_slots)]
+        # Latest progress of the jobs being computed
+        self.progress: dict[tuple[str, bytes], ProgressEvent] = {}
+        self.retries: RetryBackoff = retries or RetryBackoff()
+        # Results waiting for another publishing attempt
+        self.requeued: set[asyncio.Task] = set()
+
+    async def discover(self):
+        orchestrator = self.orchestrator
+        while True:
+            try:
+                if orchestrator.follower is not None:
+                    found = await orchestrator.wait_for_job()
+                else:
+                    found = await orchestrator.fetch_job()
+            except Exception as error:
+                print(f"Discovering jobs failed: {error}")
+                await sleep(self.poll_interval)
+                continue
+            if not found:
+                if orchestrator.follower is None:
+                    await sleep(self.poll_interval)
+                continue
+
+            job = Job(orchestrator.selected_contract, orchestrator.current_job)
+            orchestrator.in_flight.add(job.key)
+            print(f"Queued crumb {job.crumb.id.hex()} "
+                  f"of {job.sub_contract_address}")
+            await self.jobs.put(job)
+
+    def checkpoint_dir(self, job: Job) -> str:
+        return join(self.checkpoint_root, job.sub_contract_address.lower(),
+                    job.crumb.id.hex())
+
+    async def compute(self, worker: TaskWorker):
+        while True:
+            job = await self.jobs.get()
+            label = f"Crumb {job.crumb.id.hex()}"
+
+            def on_progress(event: ProgressEvent, key=job.key):
+                self.progress[key] = event
+
+            deadline = job.deadline(self.job_deadline)
+            try:
+                manifest = await worker.run(
+                    run_task, job.crumb.setup_task, self.artifact_store,
+                    self.checkpoint_dir(job), self.training_profile,
+                    deadline, deadline=deadline,
+                    on_progress=on_progress,
+                    label=label)
+            except Exception as error:
+                if isinstance(error, TaskTimeout):
+                    print(f"{error}, its checkpoint is kept for a retry")
+                else:
+                    print(f"{label} failed: {error}")
+                self.retry_later(job)
+                continue
+            finally:
+                self.progress.pop(job.key, None)
+            await self.results.put((job, manifest))
+
+    def retry_later(self, job: Job):
+        """Keeps a failed job in flight, so discovery skips it, until its
+        retry is due."""
+        delay = self.retries.failed(job.key)
+        if delay is None:
+            print(f"Crumb {job.crumb.id.hex()} failed "
+                  f"{self.retries.max_attempts} times, giving up")
+            return
+        print(f"Crumb {job.crumb.id.hex()} is retried in {delay:.0f}s")
+        asyncio.get_running_loop().call_later(
+            delay, self.orchestrator.in_flight.discard, job.key)
+
+    async def publish(self):
+        while True:
+            job, manifest = await self.results.get()
+            try:
+                await self.orchestrator.publish_job_results(
+                    manifest, job.sub_contract_address, job.crumb)
+            except Exception as error:
+                print(f"Publishing crumb {job.crumb.id.hex()} "
+                      f"failed: {error}")
+                self.retry_publish(job, manifest)
+                continue
+            shutil.rmtree(self.checkpoint_dir(job), ignore_errors=True)
+            self.retries.succeeded(job.key)
+            self.orchestrator.in_flight.discard(job.key)
+
+    def retry_publish(self, job: Job, manifest: str):
+        """Publishes the manifest of a job again once its retry is due.
+        The job stays in flight, so it is not computed again."""
+        delay = self.retries.failed(job.key)
+        if delay is None:
+            print(f"Publishing crumb {job.crumb.id.hex()} failed "
+                  f"{self.retries.max_attempts} times, giving up")
+            return
+        print(f"Publishing crumb {job.crumb.id.hex()} is retried in "
+              f"{delay:.0f}s")
+
+        async def requeue():
+            await sleep(delay)
+            await self.results.put((job, manifest))
+
+        # Referenced until done, the loop only keeps weak references
+        task = asyncio.create_task(requeue())
+        self.requeued.add(task)
+        task.add_done_callback(self.requeued.discard)
+
+    async def run(self):
+        orchestrator = self.orchestrator
+        stages = []
+        if orchestrator.follower is not None:
+            # Full pass first: picks up crumbs that were queued before the
+            # follower started
+            if await orchestrator.fetch_job():
+                job = Job(orchestrator.selected_contract,
+                          orchestrator.current_job)
+                orchestrator.in_flight.add(job.key)
+                await self.jobs.put(job)
+            stages.append(orchestrator.follower.follow())
+
+        stages.append(self.discover())
+        stages += [self.compute(worker) for worker in self.workers]
+        stages += [self.publish() for _ in range(self.publish_concurrency)]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for task in self.requeued:
+                task.cancel()
+            for worker in self.workers:
+                worker.stop()
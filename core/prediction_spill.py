@@ -0,0 +1,100 @@
+from pathlib import Path
+from typing import Iterator
+
+import pyarrow as pa
+
+
+class PredictionSpill:
+    """Append-only on-disk store of id -> label predictions.
+
+    Predictions are written as an Arrow IPC stream, one record batch per
+    write, so memory stays bounded by the size of a single write. Once
+    closed its (id, label) items read back one batch at a time, and it
+    pickles as just its path. The file is removed with unlink once the
+    predictions are stored elsewhere.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path: Path = Path(path)
+        self.rows: int = 0
+        self.writer: pa.ipc.RecordBatchStreamWriter | None = None
+        self.sink = None
+
+    def __enter__(self) -> "PredictionSpill":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @classmethod
+    def open(cls, path: str | Path) -> "PredictionSpill":
+        """Reads back a spill written and closed earlier."""
+        spill = cls(path)
+        spill.rows = sum(batch.num_rows for batch in spill.iter_file())
+        return spill
+
+    def write(self, predictions: dict):
+        if not predictions:
+            return
+        self.write_batch(pa.record_batch({
+            "id": pa.array(list(predictions.keys())),
+            "label": pa.array(list(predictions.values())),
+        }))
+
+    def extend(self, other: "PredictionSpill"):
+        for batch in other.batches():
+            self.write_batch(batch)
+
+    def write_batch(self, batch: pa.RecordBatch):
+        if self.writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.sink = pa.OSFile(str(self.path), "wb")
+            self.writer = pa.ipc.new_stream(self.sink, batch.schema)
+        self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+            self.writer = None
+            self.sink = None
+
+    def unlink(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.rows = 0
+
+    def __getstate__(self) -> dict:
+        return {"path": self.path, "rows": self.rows}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["path"])
+        self.rows = state["rows"]
+
+    def __repr__(self) -> str:
+        return f"PredictionSpill({str(self.path)!r}, rows={self.rows})"
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def batches(self) -> Iterator[pa.RecordBatch]:
+        if self.rows == 0:
+            return
+        yield from self.iter_file()
+
+    def iter_file(self) -> Iterator[pa.RecordBatch]:
+        with pa.memory_map(str(self.path)) as source:
+            yield from pa.ipc.open_stream(source)
+
+    def items(self) -> Iterator[tuple]:
+        for batch in self.batches():
+            yield from zip(batch.column("id").to_pylist(),
+                           batch.column("label").to_pylist())
+
+    def __iter__(self) -> Iterator:
+        for text_id, _ in self.items():
+            yield text_id
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
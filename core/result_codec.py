@@ -0,0 +1,227 @@
+import json
+import struct
+import tempfile
+import zlib
+from typing import Callable
+
+from core.artifact_store import ArtifactStore
+from core.constants import model_key
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from safetensors.torch import load, save_file, save_model
+
+PREDICTIONS_MAGIC = b"CRPR"
+RESULT_FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBI")  # magic, version, metadata length
+ENCODE_BATCH_SIZE = 65536  # Predictions encoded at a time
+
+
+def prediction_columns(predictions) -> tuple[pa.ChunkedArray, Callable]:
+    """The ids of a dict or PredictionSpill as an Arrow column, and a
+    function returning the labels at some positions of that column."""
+    if isinstance(predictions, dict):
+        ids = list(predictions.keys())
+        if all(type(text_id) is int for text_id in ids):
+            id_type = pa.int64()
+        elif all(type(text_id) is str for text_id in ids):
+            id_type = pa.string()
+        else:
+            raise TypeError("Prediction ids must all be int or all be str")
+        labels = list(predictions.values())
+        return (pa.chunked_array([pa.array(ids, id_type)]),
+                lambda positions: [labels[i] for i in positions.tolist()])
+
+    batches = list(predictions.batches())
+    if not batches:
+        return pa.chunked_array([], pa.int64()), lambda positions: []
+    ids = pa.chunked_array([batch.column("id") for batch in batches])
+    if not (pa.types.is_integer(ids.type) or pa.types.is_string(ids.type)
+            or pa.types.is_large_string(ids.type)):
+        raise TypeError(f"Prediction ids must all be int or all be str, "
+                        f"not {ids.type}")
+    labels = pa.chunked_array([batch.column("label") for batch in batches])
+    return ids, lambda positions: labels.take(positions).to_pylist()
+
+
+def encode_predictions(predictions) -> bytes:
+    """Packs an id -> label mapping (a dict or a PredictionSpill).
+
+    Ids are sorted, integer ids are stored as int64 deltas and string ids
+    as one blob plus their lengths. Labels are replaced by their index in
+    the list of distinct labels, in the smallest unsigned dtype that
+    fits. The payload is zlib compressed behind a small versioned header.
+    A spill is read from its Arrow columns ENCODE_BATCH_SIZE rows at a
+    time, without building the mapping in memory.
+
+    :raises TypeError: Ids are not all int or all str
+    """
+    ids, labels_at = prediction_columns(predictions)
+    order = pc.sort_indices(ids) if len(ids) else pa.array([], pa.int64())
+    id_type = "int" if pa.types.is_integer(ids.type) else "str"
+
+    labels = []
+    label_index = {}
+    indexes = np.empty(len(ids), dtype=np.int64)
+    id_chunks = []
+    length_chunks = []
+    previous = 0
+    for start in range(0, len(ids), ENCODE_BATCH_SIZE):
+        positions = order[start:start + ENCODE_BATCH_SIZE]
+        for i, label in enumerate(labels_at(positions), start):
+            key = json.dumps(label)
+            if key not in label_index:
+                label_index[key] = len(labels)
+                labels.append(label)
+            indexes[i] = label_index[key]
+
+        batch_ids = ids.take(positions)
+        if id_type == "int":
+            values = batch_ids.to_numpy().astype(np.int64)
+            id_chunks.append(np.diff(values, prepend=previous).tobytes())
+            previous = values[-1]
+        else:
+            encoded = [text_id.encode() for text_id in batch_ids.to_pylist()]
+            length_chunks.append(np.fromiter(
+                map(len, encoded), dtype=np.uint32,
+                count=len(encoded)).tobytes())
+            id_chunks.append(b"".join(encoded))
+    index_dtype = np.min_scalar_type(max(len(labels) - 1, 0))
+
+    metadata = json.dumps({
+        "count": len(ids),
+        "id_type": id_type,
+        "index_dtype": index_dtype.str,
+        "labels": labels,
+    }, separators=(",", ":")).encode()
+    compressor = zlib.compressobj(9)
+    payload = [compressor.compress(metadata)]
+    for chunk in length_chunks + id_chunks:
+        payload.append(compressor.compress(chunk))
+    payload.append(compressor.compress(indexes.astype(index_dtype).tobytes()))
+    payload.append(compressor.flush())
+    return HEADER.pack(PREDICTIONS_MAGIC, RESULT_FORMAT_VERSION,
+                       len(metadata)) + b"".join(payload)
+
+
+class EncodedPredictions:
+    """Read access to a prediction set packed by encode_predictions.
+
+    The payload is decompressed once and its columns are viewed in place,
+    so the count and labels are known without decoding any row, and
+    items() turns only the requested positions into Python objects.
+
+    :raises ValueError: The data is not an encoded prediction set of a
+        supported version
+    """
+
+    def __init__(self, data: bytes):
+        magic, version, metadata_length = HEADER.unpack_from(data)
+        if magic != PREDICTIONS_MAGIC:
+            raise ValueError("Not an encoded prediction set")
+        if version != RESULT_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported prediction format version {version}")
+
+        self.body: bytes = zlib.decompress(data[HEADER.size:])
+        metadata = json.loads(self.body[:metadata_length])
+        self.count: int = metadata["count"]
+        self.labels: list = metadata["labels"]
+        offset = metadata_length
+
+        count = self.count
+        self.lengths = None
+        if metadata["id_type"] == "int":
+            self.deltas = np.frombuffer(
+                self.body, dtype=np.int64, count=count, offset=offset)
+            offset += count * 8
+        else:
+            self.lengths = np.frombuffer(
+                self.body, dtype=np.uint32, count=count, offset=offset)
+            offset += count * 4
+            self.ids_offset = offset
+            offset += int(self.lengths.sum(dtype=np.int64))
+        self.indexes = np.frombuffer(
+            self.body, dtype=np.dtype(metadata["index_dtype"]),
+            count=count, offset=offset)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self, positions=None) -> dict:
+        """The id -> label mapping of the rows at positions (an array of
+        row numbers in id order), or of every row."""
+        if positions is None:
+            positions = np.arange(self.count)
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.lengths is None:
+            ids = np.cumsum(self.deltas)[positions].tolist()
+        else:
+            ends = self.ids_offset + np.cumsum(self.lengths, dtype=np.int64)
+            starts = ends - self.lengths
+            ids = [self.body[start:end].decode() for start, end in
+                   zip(starts[positions].tolist(), ends[positions].tolist())]
+        labels = self.labels
+        return {text_id: labels[i] for text_id, i in
+                zip(ids, self.indexes[positions].tolist())}
+
+
+def decode_predictions(data: bytes) -> dict:
+    return EncodedPredictions(data).items()
+
+
+def store_model(model, store: ArtifactStore) -> dict:
+    """Saves the weights of a torch module, or a state dict such as the
+    weights of an adapter, as safetensors."""
+    with tempfile.NamedTemporaryFile(suffix=".safetensors") as weights_file:
+        if isinstance(model, dict):
+            save_file(model, weights_file.name)
+        else:
+            # save_model drops tied duplicates that safetensors cannot hold
+            save_model(model, weights_file.name)
+        digest = store.put_file(weights_file.name)
+    return {"sha256": digest, "format": "safetensors",
+            "uri": store.uri(digest)}
+
+
+def load_model_weights(entry: dict, store: ArtifactStore) -> dict:
+    """Returns the state dict of a stored model, for load_state_dict."""
+    return load(store.get(entry["sha256"]))
+
+
+def encode_results(results: tuple[dict, dict], store: ArtifactStore) -> str:
+    """Stores the artifacts of a task result and returns the manifest that
+    goes on chain: result parameters plus the hashes of the artifacts."""
+    result_params, result_values = results
+    params = dict(result_params)
+    if params.get(model_key) is not None:
+        params[model_key] = store_model(params[model_key], store)
+
+    digest = store.put(encode_predictions(result_values))
+    return json.dumps({
+        "version": RESULT_FORMAT_VERSION,
+        "params": params,
+        "predictions": {"sha256": digest, "format": "crumb-predictions",
+                        "uri": store.uri(digest)},
+    }, separators=(",", ":"), sort_keys=True)
+
+
+def open_results(manifest: str, store: ArtifactStore
+                 ) -> tuple[dict, EncodedPredictions]:
+    """Like decode_results, but leaves the predictions encoded, for
+    readers that only need some of the rows."""
+    manifest = json.loads(manifest)
+    if manifest["version"] != RESULT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported result format version {manifest['version']}")
+    predictions = EncodedPredictions(
+        store.get(manifest["predictions"]["sha256"]))
+    return (manifest["params"], predictions)
+
+
+def decode_results(manifest: str, store: ArtifactStore) -> tuple[dict, dict]:
+    """Reverses encode_results. Model entries are returned as they are in
+    the manifest, see load_model_weights."""
+    params, predictions = open_results(manifest, store)
+    return (params, predictions.items())
@@ -1,27 +1,50 @@
-from asyncio import sleep
+import asyncio
 import os
 from web3 import Web3, AsyncWeb3
-from web3.middleware import SignAndSendRawMiddlewareBuilder
 
-from eth_account.signers.local import LocalAccount
-from eth_account import Account
-from sapphirepy import sapphire
-import json
-from pathlib import Path
 from typing import Union
-from src.SubContract import Crumb, CrumbStatus, update_crumb_to_closed
-from core.transformer_task import TransformerTask
-from src.SubContract import get_crumbs_by_status, get_crumbs_by_requester
-from src.MainContract import get_in_progress_queue, ComputeTask
+from src.ContractUtility import ContractUtility
+from src.utils import get_contract, get_contract_instance, has_function
+from src.SubContract import Crumb, CrumbHeader, CrumbStatus, \
+    update_crumb_to_closed
+from core.pipeline import JobPipeline
+from core.validator import ResultValidator
+from core.artifact_store import open_artifact_store
+from core.constants import FETCH_CONCURRENCY, FETCH_TIMEOUT, \
+    EVENT_RECONCILE_INTERVAL, CRUMB_INDEX_MAX_STALENESS, COMPUTE_SLOTS, \
+    JOB_QUEUE_SIZE, PUBLISH_CONCURRENCY, JOB_DEADLINE
+from core.discovery import CrumbEventFollower
+from src.CrumbIndex import CrumbIndex
+from src.Multicall import HEADER_PAGE_SIZE, MulticallBatcher
+from src.SubContract import get_crumbs_by_status, get_crumbs_by_requester, \
+    get_crumb, iter_crumb_pages
+from src.MainContract import get_in_progress_queue, \
+    get_in_progress_headers, ComputeTask, ComputeTaskHeader
+
+# Default MainContract, overridden by start --main-contract
+MAIN_CONTRACT_ADDR = "0x885cA90bD752A682dD1883614edA0C0557c973a6"
 
 
 class Orchestrator:
-    def __init__(self, network: str, contract: str, pkey: str):
+    def __init__(self, network: str, contract: str, pkey: str,
+                 fetch_concurrency: int = FETCH_CONCURRENCY,
+                 fetch_timeout: float = FETCH_TIMEOUT,
+                 discovery: str = "poll",
+                 ws_endpoint: str | None = None,
+                 crumb_index: CrumbIndex | None = None,
+                 multicall_address: str | None = None,
+                 main_contract: str = MAIN_CONTRACT_ADDR):
         self.network: str = network
         self.contract: str = contract
+        self.main_contract: str = main_contract
         self.pkey: str = pkey
+        self.fetch_concurrency: int = fetch_concurrency
+        self.fetch_timeout: float = fetch_timeout
+        self.crumb_index: CrumbIndex | None = crumb_index
         self.current_job: Crumb | None = None
         self.selected_contract: str | None = None
+        # (sub-contract, crumb id) of jobs being computed or published
+        self.in_flight: set[tuple[str, bytes]] = set()
         if not all(
             [
                 self.pkey,
@@ -34,73 +57,272 @@ class Orchestrator:
         private_key_value: str = private_key_file.read()
 
         os.environ.setdefault("PRIVATE_KEY", private_key_value)
-        account: LocalAccount = Account.from_key(private_key_value)
-
-        w3 = AsyncWeb3(
-            AsyncWeb3.AsyncHTTPProvider(
-                sapphire.NETWORKS[self.network]
-            )
-        )
-
-        w3.middleware_onion.add(
-            SignAndSendRawMiddlewareBuilder.build(account)
-        )
-        w3 = sapphire.wrap(w3, account)
-        # w3.eth.set_gas_price_strategy(rpc_gas_price_strategy)
-        w3.eth.default_account = account.address
-        self.w3: Web3 | AsyncWeb3 = w3
+        self.contract_utility: ContractUtility = ContractUtility.get_pooled(
+            self.network, private_key_value)
+        self.w3: Web3 | AsyncWeb3 = self.contract_utility.w3
 
-    # Functions for working with contracts
-    def process_json_file(filepath, mode="r", data=None):
-        with open(filepath, mode) as file:
-            if mode == "r":
-                return json.load(file)
-            elif mode == "w" and data:
-                json.dump(data, file)
+        # In "events" mode jobs are discovered from CrumbUpdated logs
+        self.follower: CrumbEventFollower | None = None
+        if discovery == "events":
+            self.follower = CrumbEventFollower(
+                self.contract_utility, ws_endpoint=ws_endpoint,
+                list_addresses=self.in_progress_addresses)
+        elif discovery != "poll":
+            raise ValueError(f"Unknown discovery mode [{discovery}]")
 
+        # With a Multicall contract a polling pass is one eth_call
+        self.multicall: MulticallBatcher | None = None
+        if multicall_address is not None:
+            try:
+                get_contract("Multicall")
+            except FileNotFoundError as error:
+                raise FileNotFoundError(
+                    "No compiled Multicall artifact, run python main.py "
+                    "compile --contract Multicall first") from error
+            self.multicall = MulticallBatcher(
+                self.contract_utility, multicall_address)
+
+    # Functions for working with contracts
     def get_contract(self, contract_name: str):
-        output_path = (
-            Path(__file__).parent.parent
-            / "compiled_contracts"
-            / f"{contract_name}_compiled.json"
-        ).resolve()
-        compiled_contract = self.process_json_file(output_path)
-
-        contract_data = compiled_contract["contracts"][f"{contract_name}.sol"][
-            contract_name
-        ]
-        abi, bytecode = (
-            contract_data["abi"],
-            contract_data["evm"]["bytecode"]["object"]
-        )
-        return abi, bytecode
+        return get_contract(contract_name)
+
+    async def find_queued_crumb(
+        self,
+        contract: ComputeTask,
+        semaphore: asyncio.Semaphore
+    ) -> tuple[str, Crumb] | None:
+        """Returns the first QUEUED crumb of a sub-contract, if any.
+
+        Without a crumb index only the headers of our crumbs are scanned,
+        and the full crumb is read once one is picked.
+
+        A query that exceeds fetch_timeout is treated as having no crumbs,
+        so one slow sub-contract does not stall the whole discovery pass.
+        """
+        address = contract.subContractAddress
+        async with semaphore:
+            try:
+                if self.crumb_index is not None:
+                    available_crumbs: list[Crumb] = await asyncio.wait_for(
+                        get_crumbs_by_requester(
+                            address,
+                            network_name=self.network,
+                            contract_utility=self.contract_utility,
+                            crumb_index=self.crumb_index),
+                        self.fetch_timeout)
+                    selected = self.first_queued(address, available_crumbs)
+                    return None if selected is None else (address, selected)
+                header = await asyncio.wait_for(
+                    self.find_queued_header(address), self.fetch_timeout)
+                if header is None:
+                    return None
+                return address, await asyncio.wait_for(
+                    get_crumb(address, header.id,
+                              network_name=self.network,
+                              contract_utility=self.contract_utility),
+                    self.fetch_timeout)
+            except asyncio.TimeoutError:
+                print(f"Timed out fetching crumbs of {address}")
+                return None
+
+    async def find_queued_header(self, address: str) -> CrumbHeader | None:
+        async for headers in iter_crumb_pages(
+                address, requester=True, headers=True,
+                network_name=self.network,
+                contract_utility=self.contract_utility):
+            header = self.first_queued(address, headers)
+            if header is not None:
+                return header
+        return None
+
+    def first_queued(self, address: str, crumbs: list):
+        """First QUEUED crumb or header that is not already being worked
+        on."""
+        for crumb in crumbs:
+            if crumb.status.value == CrumbStatus.QUEUED.value and \
+                    (address, crumb.id) not in self.in_flight:
+                return crumb
+        return None
+
+    async def find_queued_crumb_batched(
+        self,
+        contracts: list[ComputeTaskHeader]
+    ) -> tuple[str, Crumb] | None:
+        """Reads the QUEUED crumb count and first header page of every
+        sub-contract in one aggregated call, then the full crumb of the
+        first one assigned to this orchestrator. Only when none is found
+        are the further header pages read, in a second aggregated call.
+
+        getCrumbsByRequester filters on msg.sender, which is the Multicall
+        contract here, so the assignee is checked locally instead.
+        Sub-contracts deployed before the header getters are read with
+        getCrumbsByStatus.
+        """
+        queued = CrumbStatus.QUEUED.value
+        addresses = [contract.subContractAddress for contract in contracts]
+        paged = await asyncio.gather(*(
+            has_function(get_contract_instance(
+                self.w3, "SubContract", address),
+                "getCrumbHeadersByStatusPage", queued, 0, 0)
+            for address in addresses))
+
+        async with self.multicall.batch():
+            counts = [
+                self.multicall.crumb_count_by_status(address, queued)
+                if has_pages else None
+                for address, has_pages in zip(addresses, paged)
+            ]
+            first_pages = [
+                [self.multicall.crumb_headers_by_status(address, queued)
+                 if has_pages else
+                 self.multicall.crumbs_by_status(address, queued)]
+                for address, has_pages in zip(addresses, paged)
+            ]
+        found = await self.first_assigned(addresses, first_pages)
+        if found is not None:
+            return found
+
+        async with self.multicall.batch():
+            next_pages = []
+            for address, count in zip(addresses, counts):
+                if count is None or count.exception() is not None:
+                    next_pages.append([])
+                    continue
+                next_pages.append([
+                    self.multicall.crumb_headers_by_status(
+                        address, queued, offset)
+                    for offset in range(
+                        HEADER_PAGE_SIZE, count.result(), HEADER_PAGE_SIZE)
+                ])
+        return await self.first_assigned(addresses, next_pages)
+
+    async def first_assigned(
+        self,
+        addresses: list[str],
+        pages: list[list[asyncio.Future]]
+    ) -> tuple[str, Crumb] | None:
+        """Reads the full crumb of the first QUEUED header, in the
+        aggregated pages of each sub-contract, that is assigned to this
+        orchestrator."""
+        for address, futures in zip(addresses, pages):
+            for headers in futures:
+                if headers.exception() is not None:
+                    print(f"Fetching crumbs of {address} "
+                          f"failed: {headers.exception()}")
+                    break
+                header = self.first_queued(address, [
+                    header for header in headers.result()
+                    if header.assignee == self.w3.eth.default_account])
+                if header is not None:
+                    return address, await self.multicall.crumb(
+                        address, header.id)
+        return None
+
+    async def in_progress_addresses(self) -> list[str]:
+        """Addresses of the in-progress sub-contracts, which the event
+        follower watches."""
+        return [contract.subContractAddress for contract in
+                await get_in_progress_headers(
+                    self.main_contract,
+                    network_name=self.network,
+                    contract_utility=self.contract_utility)]
 
     async def fetch_job(self):
         # Get crumbs that have been selected for work
-        MAIN_CONTRACT_ADDR = "0x885cA90bD752A682dD1883614edA0C0557c973a6"
-        all_subcontracts: list[ComputeTask] = await get_in_progress_queue(MAIN_CONTRACT_ADDR)
-        for contract in all_subcontracts:
-            available_crumbs: list[Crumb] = await get_crumbs_by_requester(contract.subContractAddress)
-            if len(available_crumbs) > 0:
-                for crumb in available_crumbs:
-                    if crumb.status.value == CrumbStatus.QUEUED.value:
-                        self.current_job = crumb
-                        self.selected_contract = contract.subContractAddress
-                        break
-                if self.current_job is None:
+        self.current_job = None
+        self.selected_contract = None
+        if self.crumb_index is not None:
+            all_subcontracts: list[ComputeTask] = await get_in_progress_queue(
+                self.main_contract,
+                network_name=self.network,
+                contract_utility=self.contract_utility,
+                crumb_index=self.crumb_index)
+        else:
+            # Only the sub-contract addresses are needed, skip the contents
+            all_subcontracts: list[ComputeTaskHeader] = \
+                await get_in_progress_headers(
+                    self.main_contract,
+                    network_name=self.network,
+                    contract_utility=self.contract_utility)
+
+        if self.multicall is not None and self.crumb_index is None:
+            found = await self.find_queued_crumb_batched(all_subcontracts)
+            if found is not None:
+                self.select_job(*found)
+            return self.current_job is not None
+
+        # Query the sub-contracts concurrently and stop at the first match
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+        queries = [
+            asyncio.create_task(self.find_queued_crumb(contract, semaphore))
+            for contract in all_subcontracts
+        ]
+        try:
+            for query in asyncio.as_completed(queries):
+                found = await query
+                if found is None:
                     continue
-                # Shameful hack to get the setup_task
-                self.current_job.setup_task = json.loads(
-                    self.current_job.setup_task)
-                self.current_job.setup_validation = json.loads(
-                    self.current_job.setup_validation)
+                self.select_job(*found)
                 break
+        finally:
+            for query in queries:
+                query.cancel()
+            await asyncio.gather(*queries, return_exceptions=True)
         return self.current_job is not None
 
-    async def publish_job_results(self, result: str) -> bool:
-        if self.current_job is None:
+    def select_job(self, sub_contract_address: str, crumb: Crumb):
+        self.selected_contract = sub_contract_address
+        self.current_job = crumb
+
+    async def wait_for_job(
+        self,
+        timeout: float = EVENT_RECONCILE_INTERVAL
+    ) -> bool:
+        """Waits for the event follower to report a crumb QUEUED to us.
+
+        When nothing arrives within timeout, a full fetch_job pass picks
+        up anything the events missed (e.g. crumbs queued before the
+        first cursor).
+        """
+        self.current_job = None
+        self.selected_contract = None
+        try:
+            update = await asyncio.wait_for(
+                self.follower.queued.get(), timeout)
+        except asyncio.TimeoutError:
+            return await self.fetch_job()
+        if (update.address, update.id) in self.in_flight:
+            return False
+
+        crumb = await get_crumb(
+            update.address, update.id,
+            network_name=self.network,
+            contract_utility=self.contract_utility)
+        if crumb.status.value != CrumbStatus.QUEUED.value:
+            return False
+        self.select_job(update.address, crumb)
+        return True
+
+    async def publish_job_results(
+        self,
+        result: str,
+        sub_contract_address: str | None = None,
+        crumb: Crumb | None = None
+    ) -> bool:
+        """Closes a crumb with its result, by default the current job."""
+        if crumb is None:
+            sub_contract_address, crumb = \
+                self.selected_contract, self.current_job
+        if crumb is None:
             raise Exception("Current job is None")
-        await update_crumb_to_closed(self.selected_contract, self.current_job.id, result)
+        await update_crumb_to_closed(
+            sub_contract_address, crumb.id, result,
+            network_name=self.network,
+            contract_utility=self.contract_utility)
+        if self.crumb_index is not None:
+            # Do not pick the crumb up again before the next sync
+            await self.crumb_index.refresh(
+                sub_contract_address, [crumb.id], self.contract_utility)
         return True
 
 
@@ -108,25 +330,64 @@ async def start_orchestrator(
     network: str,
     contract: str,
     pkey: str,
+    discovery: str = "poll",
+    ws_endpoint: str | None = None,
+    crumb_index_path: str | None = None,
+    max_staleness: float = CRUMB_INDEX_MAX_STALENESS,
+    compute_slots: int = COMPUTE_SLOTS,
+    job_queue_size: int = JOB_QUEUE_SIZE,
+    publish_concurrency: int = PUBLISH_CONCURRENCY,
+    artifact_store: str | None = None,
+    multicall_address: str | None = None,
+    job_deadline: float | None = JOB_DEADLINE,
+    mode: str = "compute",
+    training_profile: str | None = None,
+    main_contract: str = MAIN_CONTRACT_ADDR,
 ) -> None:
+    if mode == "validate" and artifact_store is None:
+        # The default local store only holds the results computed here
+        raise ValueError("Validator mode needs the artifact store the "
+                         "results are published to, set --artifact-store")
+
     # Initialize the Orchestrator
     print("Starting orchestrator...")
     print(f"Network: {network}")
     print(f"Contract: {contract}")
-    orchestrator = Orchestrator(network, contract,  pkey)
-
-    print("Starting recurring task for fetching jobs...")
-    while True:
-        await orchestrator.fetch_job()
-        if orchestrator.current_job is None:
-            await sleep(30)
-            continue
-        task = TransformerTask()
-        task.set_params(
-            orchestrator.current_job.setup_task)
-        task.start_working()
-
-        result_str = str(task.get_results())
-        await orchestrator.publish_job_results(result_str)
-
-        await sleep(30)
+    print(f"Discovery: {discovery}")
+    print(f"Main contract: {main_contract}")
+    crumb_index = None
+    if crumb_index_path is not None:
+        print(f"Crumb index: {crumb_index_path}")
+        crumb_index = CrumbIndex(crumb_index_path, max_staleness)
+    orchestrator = Orchestrator(network, contract,  pkey,
+                                discovery=discovery,
+                                ws_endpoint=ws_endpoint,
+                                crumb_index=crumb_index,
+                                multicall_address=multicall_address,
+                                main_contract=main_contract)
+
+    if mode == "validate":
+        print(f"Starting validator with {compute_slots} slot(s)...")
+        validator = ResultValidator(
+            orchestrator, main_contract,
+            validation_slots=compute_slots,
+            artifact_store=open_artifact_store(artifact_store),
+            job_deadline=job_deadline,
+            crumb_index=crumb_index or CrumbIndex(
+                max_staleness=max_staleness))
+        print(f"Artifact store: {validator.artifact_store}")
+        await validator.run()
+        return
+    elif mode != "compute":
+        raise ValueError(f"Unknown mode [{mode}]")
+
+    print(f"Starting job pipeline with {compute_slots} compute slot(s)...")
+    pipeline = JobPipeline(orchestrator,
+                           compute_slots=compute_slots,
+                           queue_size=job_queue_size,
+                           publish_concurrency=publish_concurrency,
+                           artifact_store=open_artifact_store(artifact_store),
+                           job_deadline=job_deadline,
+                           training_profile=training_profile)
+    print(f"Artifact store: {pipeline.artifact_store}")
+    await pipeline.run()
@@ -0,0 +1,216 @@
+import asyncio
+import atexit
+import multiprocessing
+import queue
+import time
+import traceback
+from dataclasses import dataclass
+from multiprocessing.context import BaseContext
+from typing import Callable
+
+from core.constants import HEARTBEAT_INTERVAL, PROGRESS_INTERVAL, \
+    SUPERVISOR_POLL_INTERVAL
+
+
+class TaskError(Exception):
+    """A supervised task raised, or its worker process died."""
+
+
+class TaskTimeout(TaskError):
+    """A supervised task ran past its deadline and was stopped."""
+
+
+@dataclass
+class ProgressEvent:
+    phase: str
+    rows_done: int
+    rows_per_second: float
+    elapsed: float  # Seconds since the task started
+
+    def __str__(self) -> str:
+        return (f"{self.phase}: {self.rows_done} rows, "
+                f"{self.rows_per_second:.1f} rows/s, "
+                f"{self.elapsed:.0f}s elapsed")
+
+
+class ProgressReporter:
+    """Child side of the progress stream. Phase changes are sent right
+    away, row counts at most every interval seconds."""
+
+    def __init__(self, events, interval: float = PROGRESS_INTERVAL):
+        self.events = events
+        self.interval: float = interval
+        self.reset()
+
+    def reset(self):
+        self.started: float = time.monotonic()
+        self.phase: str | None = None
+        self.phase_started: float = self.started
+        self.last_sent: float = 0
+
+    def report(self, phase: str, rows_done: int = 0):
+        now = time.monotonic()
+        if phase != self.phase:
+            self.phase = phase
+            self.phase_started = now
+        elif now - self.last_sent < self.interval:
+            return
+        self.last_sent = now
+        phase_elapsed = now - self.phase_started
+        self.events.put(("progress", ProgressEvent(
+            phase, rows_done,
+            rows_done / phase_elapsed if phase_elapsed > 0 else 0.0,
+            now - self.started)))
+
+
+# Set in worker processes only, see report_progress
+_reporter: ProgressReporter | None = None
+
+
+def report_progress(phase: str, rows_done: int = 0):
+    """Reports the phase of the running task and the rows it has done in
+    that phase to the supervising process. Does nothing when the task is
+    not running under a TaskWorker."""
+    if _reporter is not None:
+        _reporter.report(phase, rows_done)
+
+
+def _worker_main(tasks, events):
+    global _reporter
+    _reporter = ProgressReporter(events)
+    while True:
+        item = tasks.get()
+        if item is None:
+            return
+        target, args = item
+        _reporter.reset()
+        try:
+            result = target(*args)
+        except Exception:
+            events.put(("error", traceback.format_exc()))
+        else:
+            events.put(("result", result))
+
+
+class TaskWorker:
+    """Long-lived child process that runs one task at a time.
+
+    The process outlives single tasks so the caches it fills (models,
+    datasets, tokenized data) serve the next jobs as well. While a task
+    runs, the event loop stays free: progress events are drained every
+    poll_interval, a heartbeat line is printed every heartbeat_interval,
+    and a task that overruns its deadline or whose caller is cancelled
+    gets its process terminated. A fresh process is started for the next
+    task.
+
+    The process is not daemonic, so tasks may start processes of their
+    own (dataloader workers). It is stopped at interpreter exit instead.
+
+    :param mp_context: Multiprocessing context, spawn by default since
+        forked children do not get along with torch/CUDA state
+    :param poll_interval: Seconds between checks on a running task
+    :param heartbeat_interval: Seconds between progress lines
+    """
+
+    def __init__(self,
+                 mp_context: BaseContext | None = None,
+                 poll_interval: float = SUPERVISOR_POLL_INTERVAL,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.mp_context: BaseContext = \
+            mp_context or multiprocessing.get_context("spawn")
+        self.poll_interval: float = poll_interval
+        self.heartbeat_interval: float = heartbeat_interval
+        self.process = None
+        self.tasks = None
+        self.events = None
+
+    def start(self):
+        # New queues every time, a terminated child may leave a lock held
+        self.tasks = self.mp_context.Queue()
+        self.events = self.mp_context.Queue()
+        self.process = self.mp_context.Process(
+            target=_worker_main, args=(self.tasks, self.events))
+        self.process.start()
+        # Runs before multiprocessing joins its non-daemonic children
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.process is None:
+            return
+        atexit.unregister(self.stop)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        for channel in (self.tasks, self.events):
+            channel.cancel_join_thread()
+            channel.close()
+        self.process = self.tasks = self.events = None
+
+    def drain(self) -> list[tuple]:
+        messages = []
+        while True:
+            try:
+                messages.append(self.events.get_nowait())
+            except queue.Empty:
+                return messages
+
+    async def run(self,
+                  target: Callable,
+                  *args,
+                  deadline: float | None = None,
+                  on_progress: Callable[[ProgressEvent], None] | None = None,
+                  label: str = "Task"):
+        """
+        Runs target(*args) in the worker process and returns its result.
+
+        target and args are pickled, so target must be importable at
+        module level.
+
+        :param deadline: Seconds the task may run before it is stopped
+        :param on_progress: Called with every ProgressEvent received
+        :param label: Name printed with the heartbeat lines
+        :raises TaskTimeout: The deadline passed
+        :raises TaskError: The task raised or the process died
+        """
+        if self.process is None or not self.process.is_alive():
+            self.stop()
+            self.start()
+        self.tasks.put((target, args))
+        started = last_beat = time.monotonic()
+        last_event: ProgressEvent | None = None
+        failure: str | None = None
+        try:
+            while failure is None:
+                alive = self.process.is_alive()
+                for kind, payload in self.drain():
+                    if kind == "result":
+                        return payload
+                    if kind == "error":
+                        failure = payload
+                        break
+                    last_event = payload
+                    if on_progress is not None:
+                        on_progress(payload)
+                else:
+                    if not alive:
+                        raise TaskError(f"{label} worker exited with code "
+                                        f"{self.process.exitcode}")
+                    now = time.monotonic()
+                    if deadline is not None and now - started > deadline:
+                        raise TaskTimeout(
+                            f"{label} stopped after {deadline}s deadline")
+                    if now - last_beat >= self.heartbeat_interval:
+                        last_beat = now
+                        print(f"{label} running for {now - started:.0f}s, "
+                              f"{last_event or 'no progress reported'}")
+                    await asyncio.sleep(self.poll_interval)
+        except BaseException:
+            # Timed out, cancelled or dead: the task may still be running
+            # in the process, so a new one takes over
+            self.stop()
+            raise
+        # The task raised, its process is fine and is kept
+        raise TaskError(f"{label} failed:\n{failure}")
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from os import getcwd
+from os.path import join
+from pathlib import Path
+
+from core.constants import MAX_SEQUENCE_LEN, TOKENIZE_PROCESSES, \
+    TOKENIZE_MIN_ROWS_PER_PROCESS
+
+import pandas as pd
+from datasets import Dataset, load_from_disk
+from datasets.fingerprint import Hasher
+
+
+def dataset_fingerprint(frame: pd.DataFrame) -> str:
+    digest = hashlib.sha256()
+    digest.update(",".join(map(str, frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).values)
+    return digest.hexdigest()
+
+
+class TokenizationCache:
+    """Tokenizes datasets in parallel and keeps the results on disk.
+
+    Entries are keyed by the tokenizer fingerprint, the dataset content
+    hash and MAX_SEQUENCE_LEN, so a retried or repeated crumb loads the
+    tokenized dataset instead of tokenizing it again. Sequences are
+    stored unpadded; padding is left to the data collator.
+    """
+
+    def __init__(self,
+                 root: str | None = None,
+                 processes: int = TOKENIZE_PROCESSES):
+        self.root: Path = Path(root or join(getcwd(), "cache", "tokenized"))
+        self.processes: int = processes
+
+    def key(self, tokenizer, frame: pd.DataFrame, text_column: str) -> str:
+        return hashlib.sha256("/".join([
+            Hasher.hash(tokenizer),
+            dataset_fingerprint(frame),
+            text_column,
+            str(MAX_SEQUENCE_LEN),
+        ]).encode()).hexdigest()
+
+    def num_proc(self, rows: int) -> int | None:
+        processes = min(self.processes, rows // TOKENIZE_MIN_ROWS_PER_PROCESS)
+        return processes if processes > 1 else None
+
+    def tokenize(self,
+                 tokenizer,
+                 frame: pd.DataFrame,
+                 text_column: str = "text") -> Dataset:
+        path = self.root / self.key(tokenizer, frame, text_column)
+        if path.exists():
+            return load_from_disk(str(path))
+
+        def tokenize_function(examples):
+            return tokenizer(examples[text_column],
+                             truncation=True,
+                             max_length=MAX_SEQUENCE_LEN)
+
+        tokenized = Dataset.from_pandas(frame).map(
+            tokenize_function, batched=True,
+            num_proc=self.num_proc(len(frame)))
+
+        # Save next to the final location and move it in one step
+        self.root.mkdir(parents=True, exist_ok=True)
+        temporary_path = tempfile.mkdtemp(dir=self.root)
+        tokenized.save_to_disk(temporary_path)
+        try:
+            os.rename(temporary_path, path)
+        except OSError:
+            # Another worker stored the same entry first
+            shutil.rmtree(temporary_path)
+        return load_from_disk(str(path))
+
+
+# Shared by every task run in this process
+tokenization_cache = TokenizationCache()
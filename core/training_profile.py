@@ -0,0 +1,137 @@
+import os
+import time
+from dataclasses import dataclass, fields, replace
+from functools import cache
+from typing import Callable
+
+import torch
+from transformers import TrainerCallback
+
+from core.constants import TRAINING_PROFILE
+
+
+@cache
+def cpu_supports_bf16() -> bool:
+    """Whether the CPU has native bf16 instructions (AVX512-BF16 or AMX),
+    without which bf16 autocast is slower than fp32."""
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            flags = set(next(
+                (line for line in cpuinfo if line.startswith("flags")),
+                "").split())
+    except OSError:
+        return False
+    return bool(flags & {"avx512_bf16", "amx_bf16"})
+
+
+def available_cores() -> int:
+    return len(os.sched_getaffinity(0))
+
+
+@dataclass(frozen=True)
+class TrainingProfile:
+    """Hardware-related training settings of a task.
+
+    Thread counts left as None keep the torch defaults. bf16 is only used
+    where cpu_supports_bf16, or on a CUDA device.
+    """
+    name: str
+    num_train_epochs: int = 50
+    group_by_length: bool = False
+    dataloader_workers: int = 0
+    intra_op_threads: int | None = None
+    inter_op_threads: int | None = None
+    bf16: bool = False
+    gradient_accumulation_steps: int = 1
+    use_cpu: bool = False
+
+    def with_options(self, options: dict) -> "TrainingProfile":
+        """A copy with the fields given in options changed, as set by the
+        training_options of a setup_task."""
+        known = {field.name for field in fields(self)} - {"name"}
+        unknown = set(options) - known
+        if unknown:
+            raise ValueError(f"Unknown training options {sorted(unknown)}")
+        return replace(self, **options)
+
+    def use_bf16(self) -> bool:
+        if not self.bf16:
+            return False
+        if torch.cuda.is_available() and not self.use_cpu:
+            return torch.cuda.is_bf16_supported()
+        return cpu_supports_bf16()
+
+    def apply_threads(self):
+        """Sets the torch thread pools of this process."""
+        if self.intra_op_threads is not None:
+            torch.set_num_threads(self.intra_op_threads)
+        if self.inter_op_threads is not None and \
+                torch.get_num_interop_threads() != self.inter_op_threads:
+            try:
+                torch.set_num_interop_threads(self.inter_op_threads)
+            except RuntimeError:
+                # Only possible before the first inter-op parallel work,
+                # a worker process keeps what its first job set
+                pass
+
+    def training_arguments(self) -> dict:
+        """The TrainingArguments this profile decides."""
+        return {
+            "num_train_epochs": self.num_train_epochs,
+            "train_sampling_strategy":
+                "group_by_length" if self.group_by_length else "random",
+            "dataloader_num_workers": self.dataloader_workers,
+            "dataloader_persistent_workers": self.dataloader_workers > 0,
+            "gradient_accumulation_steps": self.gradient_accumulation_steps,
+            "bf16": self.use_bf16(),
+            "use_cpu": self.use_cpu,
+        }
+
+
+def cpu_profile() -> TrainingProfile:
+    """For CPU-only workers: length-grouped batches pad less, a couple of
+    dataloader workers collate while the remaining cores run the model in
+    one inter-op pool, and bf16 where the CPU has it."""
+    cores = available_cores()
+    workers = min(2, cores // 8)
+    return TrainingProfile(
+        name="cpu",
+        group_by_length=True,
+        dataloader_workers=workers,
+        intra_op_threads=max(1, cores - workers),
+        inter_op_threads=1,
+        bf16=True,
+        use_cpu=True)
+
+
+# Profiles by name, selected by the training_profile of a setup_task or
+# the --training-profile of the worker
+TRAINING_PROFILES: dict[str, Callable[[], TrainingProfile]] = {
+    "default": lambda: TrainingProfile(name="default"),
+    "cpu": cpu_profile,
+}
+
+
+def training_profile(name: str | None = None,
+                     options: dict | None = None) -> TrainingProfile:
+    name = name or TRAINING_PROFILE
+    if name not in TRAINING_PROFILES:
+        raise ValueError(f"No training profile [{name}]")
+    return TRAINING_PROFILES[name]().with_options(options or {})
+
+
+class TimeLimit(TrainerCallback):
+    """Stops training, with a final checkpoint, once seconds have passed
+    since the callback was created."""
+
+    def __init__(self, seconds: float):
+        self.seconds: float = seconds
+        self.started: float = time.monotonic()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if time.monotonic() - self.started >= self.seconds:
+            print(f"Training stopped after {self.seconds:.0f}s, at step "
+                  f"{state.global_step}")
+            control.should_training_stop = True
+            control.should_save = True
+        return control
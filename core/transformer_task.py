@@ -1,23 +1,53 @@
 from core.task import RequestedWorkTask
 from core.constants import *
+from core.batch_predictor import BatchPredictor
+from core.model_cache import model_cache
+from core.dataset_cache import dataset_cache
+from core.prediction_spill import PredictionSpill
+from core.tokenization_cache import tokenization_cache
+from core.supervisor import report_progress
+from core.metrics import ClassificationMetrics
+from core.training_profile import TimeLimit, training_profile
+from core.adapter import adapter_settings, adapter_state_dict, \
+    base_model_digest
 
 from os.path import join
 from pathlib import Path
 from os import getcwd
-from datasets import Dataset
-from scipy.special import softmax
 
-import evaluate
-import pickle
+import copy
+import os
+import time
+import uuid
+import json
 import torch
-import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
 from transformers import AutoTokenizer, AutoModelForSequenceClassification, \
     TrainingArguments, Trainer, DataCollatorWithPadding, \
-    EarlyStoppingCallback, pipeline
+    EarlyStoppingCallback, TrainerCallback, pipeline
+from transformers.trainer_utils import get_last_checkpoint
+
+
+def tied_weight_names(model) -> set:
+    """Names of the tied or shared params of a model. _tied_weights_keys
+    maps each tied param to its source, or lists the tied params in
+    older transformers releases."""
+    tied = getattr(model, "_tied_weights_keys", None) or {}
+    if isinstance(tied, dict):
+        return set(tied) | set(tied.values())
+    return set(tied)
+
+
+class TrainingProgress(TrainerCallback):
+    """Reports the training rows seen so far to the supervisor."""
+
+    def on_step_end(self, args, state, control, **kwargs):
+        report_progress("training", state.global_step *
+                        args.per_device_train_batch_size *
+                        args.gradient_accumulation_steps)
 
-f1 = evaluate.load("f1")
 
 class TransformerTask(RequestedWorkTask):
     pipeline = None
@@ -34,6 +64,17 @@ class TransformerTask(RequestedWorkTask):
     predict_ds_url = None
     text_key = None
     text_id_key = None
+    revision = None
+    streaming = False
+    adapter = None
+    # Set by the pipeline: training checkpoints and finished prediction
+    # chunks are kept there, so a stopped job resumes where it was
+    checkpoint_dir = None
+    # Set by the pipeline: the worker's training profile, used when the
+    # task does not choose one, and the seconds the job may run
+    default_training_profile = None
+    deadline = None
+    started = None
 
     def set_params(self, configuration_json:str):
         super().set_params(configuration_json)
@@ -49,6 +90,17 @@ class TransformerTask(RequestedWorkTask):
         self.train_ds_url = self.params[train_ds_url_key]
         self.test_ds_url = self.params[test_ds_url_key]
         self.predict_ds_url = self.params[predict_ds_url_key]
+        self.revision = self.params.get(revision_key)
+        self.streaming = self.params.get(streaming_key, False)
+        self.training_profile = training_profile(
+            self.params.get(training_profile_key)
+            or self.default_training_profile,
+            self.params.get(training_options_key))
+        # None fine-tunes every weight, otherwise only low-rank adapters
+        # and the classification head are trained and published
+        self.adapter = adapter_settings(
+            self.params.get(fine_tuning_key),
+            self.params.get(adapter_options_key))
 
         if len(self.model_name) == 0:
             self.model_name = None
@@ -60,29 +112,50 @@ class TransformerTask(RequestedWorkTask):
                 path = Path(path_to_check)     
                 path.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def multi_label(self) -> bool:
+        return self.task_type == "multi_label_classification"
+
+    @property
+    def string_columns(self) -> tuple[str, str]:
+        """Dataset columns read as strings whatever they look like."""
+        return (self.text_id_key, self.text_key)
+
+    def model_cache_key(self, kind: str, with_labels: bool = False) -> tuple:
+        key = (kind, self.task_type, self.model_name, self.revision)
+        if with_labels:
+            key += (json.dumps(self.id_dict, sort_keys=True),
+                    json.dumps(self.label_dict, sort_keys=True))
+        return key
+
+    def load_model(self):
+        """A copy of the cached base model, free to be trained or to get
+        other weights loaded into."""
+        return copy.deepcopy(model_cache.get(
+            self.model_cache_key("model", with_labels=True),
+            lambda: AutoModelForSequenceClassification.from_pretrained(
+                self.model_path,
+                num_labels=len(self.id_dict), id2label=self.id_dict,
+                label2id=self.label_dict,
+                ignore_mismatched_sizes=True,
+                problem_type=self.task_type)))
+
+    def load_tokenizer(self):
+        return model_cache.get(
+            self.model_cache_key("tokenizer"),
+            lambda: AutoTokenizer.from_pretrained(self.model_path))
+
     def get_model_and_data_task(self, train, test):        
-        id2label = self.id_dict
-        label2id = self.label_dict
-        model_type = self.task_type
-
-        model = AutoModelForSequenceClassification.from_pretrained(
-            self.model_path,
-            num_labels=len(id2label), id2label=id2label, label2id=label2id,
-            ignore_mismatched_sizes=True,
-            problem_type=model_type)
-        tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        # Training changes the weights, so work on a copy of the cached model
+        model = self.load_model()
+        if self.adapter is not None:
+            model = self.adapter.wrap(model)
+        tokenizer = self.load_tokenizer()
         data_collator = DataCollatorWithPadding(tokenizer=tokenizer)
 
-        def tokenize_function(examples):
-            return tokenizer(examples["text"], 
-                             padding=True, 
-                             truncation=True, 
-                             max_length=MAX_SEQUENCE_LEN)
-
-        for_train = Dataset.from_pandas(train).map(
-            tokenize_function, batched=True)
-        for_test = Dataset.from_pandas(test).map(
-            tokenize_function, batched=True)
+        # Unpadded, the collator pads each batch to its own longest text
+        for_train = tokenization_cache.tokenize(tokenizer, train)
+        for_test = tokenization_cache.tokenize(tokenizer, test)
 
         return (model, tokenizer, data_collator, for_train, for_test)
 
@@ -91,79 +164,243 @@ class TransformerTask(RequestedWorkTask):
                            tokenizer, data_collator, 
                            compute_metrics):
         
+        profile = self.training_profile
+        profile.apply_threads()
         training_args = TrainingArguments(
-            output_dir=self.output_dir,
-            learning_rate=2e-5,
+            output_dir=self.trainer_dir(),
+            learning_rate=2e-5 if self.adapter is None
+            else self.adapter.learning_rate,
             per_device_train_batch_size=self.batch_size,
             per_device_eval_batch_size=self.batch_size,
-            num_train_epochs=50,
             weight_decay=0.01,
-            evaluation_strategy="epoch",
+            eval_strategy="epoch",
             save_strategy="epoch",
             save_total_limit=1,
             load_best_model_at_end=True,
             push_to_hub=False,
-            resume_from_checkpoint=True
+            # compute_metrics folds each eval batch into running counts
+            batch_eval_metrics=True,
+            **profile.training_arguments()
         )
 
+        callbacks = [EarlyStoppingCallback(early_stopping_patience=3),
+                     TrainingProgress()]
+        time_left = self.training_time_left()
+        if time_left is not None:
+            callbacks.append(TimeLimit(time_left))
+
         trainer = Trainer(
             model=model,
             args=training_args,
             train_dataset=for_train,
             eval_dataset=for_test,
-            tokenizer=tokenizer,
+            processing_class=tokenizer,
             data_collator=data_collator,
             compute_metrics=compute_metrics,
-            callbacks=[EarlyStoppingCallback(early_stopping_patience=3)]
+            callbacks=callbacks
         )
 
         return trainer
 
+    def training_time_left(self) -> float | None:
+        """Seconds training may still take: TRAINING_TIME_SHARE of the
+        job's deadline, the rest is kept for predicting."""
+        if self.deadline is None:
+            return None
+        elapsed = time.monotonic() - (self.started or time.monotonic())
+        return max(0.0, self.deadline * TRAINING_TIME_SHARE - elapsed)
+
+    def trainer_dir(self) -> str:
+        if self.checkpoint_dir is None:
+            return self.output_dir
+        return join(self.checkpoint_dir, "trainer")
+
+    def last_training_checkpoint(self) -> str | None:
+        if self.checkpoint_dir is None or not os.path.isdir(self.trainer_dir()):
+            return None
+        return get_last_checkpoint(self.trainer_dir())
+
+    def predict_with_pipeline(self, text_ids: list, texts: list[str]) -> dict:
+        """Zero-shot path: builds the default pipeline for the task once
+        and runs it over the texts in batches of batch_size."""
+        classifier = model_cache.get(
+            self.model_cache_key("pipeline"),
+            lambda: pipeline(
+                self.task_type, model=None, revision=self.revision))
+
+        predictions = {}
+        outputs = classifier(texts, batch_size=self.batch_size)
+        for text_id, output in zip(text_ids, outputs):
+            if isinstance(output, list):
+                output = output[0]
+            predictions[text_id] = output["label"]
+        return predictions
+
+    def read_predict_rows(self, text_ids: list) -> tuple[list, list, int]:
+        """Ids and texts of the given rows of the predict dataset, and its
+        row count. The memory-mapped table is filtered on its id column,
+        so only the selected texts are read."""
+        table = dataset_cache.read_table(
+            self.predict_ds_url, self.string_columns)
+        column = table.column(self.text_id_key)
+        selected = table.filter(pc.is_in(
+            column, value_set=pa.array(text_ids).cast(column.type)))
+        return (selected.column(self.text_id_key).to_pylist(),
+                selected.column(self.text_key).to_pylist(),
+                table.num_rows)
+
+    def predict_sample(self, text_ids: list, texts: list[str],
+                       weights: dict | None = None,
+                       adapter: dict | None = None) -> dict:
+        """Predicts a few rows again, with the published weights of a
+        trained model or with the zero-shot pipeline when there are
+        none. adapter holds the published adapter params when weights
+        are adapter weights, which only fit the base model they were
+        trained on."""
+        if self.model_name is None:
+            return self.predict_with_pipeline(text_ids, texts)
+        model = self.load_model()
+        if adapter is not None:
+            adapter = dict(adapter)
+            if adapter.pop("base_model") != \
+                    base_model_digest(self.model_path):
+                raise ValueError(f"Adapter weights were trained on another "
+                                 f"version of {self.model_name}")
+            model = adapter_settings("adapter", adapter).load(
+                model, weights).merge_and_unload()
+        else:
+            missing, unexpected = model.load_state_dict(weights,
+                                                        strict=False)
+            # store_model leaves out one side of each tied pair
+            missing = [key for key in missing
+                       if key not in tied_weight_names(model)]
+            if missing or unexpected:
+                raise ValueError(f"Weights do not fit {self.model_name}: "
+                                 f"missing {missing[:5]}, "
+                                 f"unexpected {unexpected[:5]}")
+        predictor = BatchPredictor(model, self.load_tokenizer(),
+                                   self.batch_size,
+                                   multi_label=self.multi_label)
+        return predictor.predict(text_ids, texts)
+
+    def iter_predict_chunks(self):
+        """Yields (ids, texts) chunks of the predict dataset."""
+        for batch in dataset_cache.iter_batches(
+                self.predict_ds_url, STREAMING_CHUNK_ROWS,
+                columns=[self.text_id_key, self.text_key],
+                string_columns=self.string_columns):
+            yield (batch.column(self.text_id_key).to_pylist(),
+                   batch.column(self.text_key).to_pylist())
+
+    def predict_all(self, predict):
+        """Runs predict(ids, texts) over the predict dataset.
+
+        In streaming mode the dataset is read in chunks and the results are
+        spilled to disk as they come, so memory is bounded by the chunk
+        size rather than the dataset size. With a checkpoint_dir each
+        finished chunk is also kept there, and a retry does not predict
+        it again.
+        """
+        if not self.streaming:
+            report_progress("predicting")
+            to_predict = dataset_cache.read_dataframe(
+                self.predict_ds_url, self.string_columns)
+            predictions = predict(to_predict[self.text_id_key].tolist(),
+                                  to_predict[self.text_key].tolist())
+            report_progress("predicting", len(predictions))
+            return predictions
+
+        spill_path = join(getcwd(), "output", "predictions",
+                          f"{uuid.uuid4().hex}.arrow")
+        rows_done = 0
+        report_progress("predicting")
+        with PredictionSpill(spill_path) as spill:
+            try:
+                for index, (text_ids, texts) in \
+                        enumerate(self.iter_predict_chunks()):
+                    if self.checkpoint_dir is None:
+                        spill.write(predict(text_ids, texts))
+                    else:
+                        spill.extend(self.checkpointed_chunk(
+                            index, predict, text_ids, texts))
+                    rows_done += len(text_ids)
+                    report_progress("predicting", rows_done)
+            except BaseException:
+                spill.unlink()
+                raise
+        return spill
+
+    def checkpointed_chunk(self, index: int, predict, text_ids: list,
+                           texts: list[str]) -> PredictionSpill:
+        """Predictions of one chunk, read back from the checkpoint when an
+        earlier run of the job already finished it."""
+        chunk_path = Path(self.checkpoint_dir, "predictions",
+                          f"{index:08d}.arrow")
+        if not chunk_path.exists():
+            partial_path = chunk_path.with_suffix(".partial")
+            with PredictionSpill(partial_path) as chunk:
+                chunk.write(predict(text_ids, texts))
+            if not chunk.rows:
+                return chunk
+            os.replace(partial_path, chunk_path)
+        return PredictionSpill.open(chunk_path)
+
     def start_working(self):
         train = None
         test = None
-        to_predict = pd.read_csv(self.predict_ds_url)
         self.result_values = {}
         self.result_params = {}
+        self.started = time.monotonic()
 
-        if self.model_name == None:          
-            for _, row in to_predict.iterrows():
-                text = row[self.text_key]
-                text_id = row[self.text_id_key]  
-                output = pipeline(self.task_type, model=None)(text)[0]["label"]
-
-                self.result_values[text_id] = output
+        report_progress("loading")
+        if self.model_name == None:
+            self.result_values = self.predict_all(self.predict_with_pipeline)
             self.result_params = {model_name_key: None}
         else:
             torch.cuda.empty_cache()
+            train = dataset_cache.read_dataframe(
+                self.train_ds_url, self.string_columns)
+            test = dataset_cache.read_dataframe(
+                self.test_ds_url, self.string_columns)
             (model, tokenizer, data_collator, for_train,for_test) = self.get_model_and_data_task(train, test)
             
-            def compute_metrics(eval_pred):
-                predictions, labels = eval_pred
-                predictions = np.argmax(predictions, axis=1)
-                
-                return f1.compute(predictions=predictions, references=labels)
-
             trainer = self.get_training_setup(
                 model, for_train, for_test, 
                 tokenizer, data_collator,
-                compute_metrics)
-            _ = trainer.train()
+                ClassificationMetrics(multi_label=self.multi_label))
+            # Continues from the last epoch saved before the job was stopped
+            train_output = trainer.train(
+                resume_from_checkpoint=self.last_training_checkpoint())
+            samples_per_second = train_output.metrics.get(
+                "train_samples_per_second")
+            print(f"Trained with the {self.training_profile.name} profile "
+                  f"at {samples_per_second} samples/s")
 
             torch.cuda.empty_cache()
-            
-            for _, row in to_predict.iterrows():
-                text = row[text_key]
-                text_id = row[text_id_key]
-                inputs = tokenizer(text, return_tensors="pt")
-                outputs = model(**inputs)
 
-                probabilities = softmax(
-                        outputs[0].cpu().detach().numpy(), axis=1)[0]
-                
-                predicted_label = int(probabilities.argmax())
+            # Only the adapters are published; merged into the base
+            # weights they add no work to predicting
+            published = model
+            if self.adapter is not None:
+                published = adapter_state_dict(model)
+                model = model.merge_and_unload()
+
+            predictor = BatchPredictor(
+                model, tokenizer, self.batch_size,
+                multi_label=self.multi_label)
+            self.result_values = self.predict_all(predictor.predict)
 
-                self.result_values[text_id] = predicted_label
-                
-            self.result_params = {model_name_key: pickle.dumps(model)}
+            # The publisher stores the weights, see core.result_codec
+            self.result_params = {model_name_key: self.model_name,
+                                  revision_key: self.revision,
+                                  model_key: published,
+                                  training_profile_key: {
+                                      "name": self.training_profile.name,
+                                      "samples_per_second":
+                                          samples_per_second}}
+            if self.adapter is not None:
+                self.result_params[adapter_key] = {
+                    **self.adapter.to_params(),
+                    "base_model": base_model_digest(self.model_path)}
 
+        print(f"Model cache: {model_cache.stats()}")
@@ -0,0 +1,255 @@
+import asyncio
+import math
+import secrets
+from asyncio import sleep
+from dataclasses import dataclass
+from multiprocessing.context import BaseContext
+from statistics import NormalDist
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from core.artifact_store import ArtifactStore, LocalArtifactStore
+from core.constants import COMPUTE_SLOTS, POLL_INTERVAL, JOB_DEADLINE, \
+    VALIDATION_CONFIDENCE, VALIDATION_MARGIN, VALIDATION_TOLERANCE, \
+    confidence_key, margin_key, tolerance_key, model_key, adapter_key
+from core.pipeline import Job, RetryBackoff
+from core.supervisor import TaskWorker
+from src.CrumbIndex import CrumbIndex
+from src.MainContract import get_in_progress_headers
+from src.SubContract import CrumbHeader, CrumbStatus, get_crumb, \
+    update_crumbs_to_closed_validated
+
+if TYPE_CHECKING:
+    from core.scheduler import Orchestrator
+
+
+def sample_size(population: int,
+                confidence: float = VALIDATION_CONFIDENCE,
+                margin: float = VALIDATION_MARGIN) -> int:
+    """Rows to sample so that the mismatch rate seen in the sample is
+    within margin of the real one with the given confidence (Cochran's
+    formula at the worst case p = 0.5, with the finite population
+    correction). It levels off near z^2 / (4 margin^2) rows however large
+    the population is."""
+    if population <= 0:
+        return 0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    unbounded = z * z * 0.25 / (margin * margin)
+    return min(population, math.ceil(
+        unbounded / (1 + (unbounded - 1) / population)))
+
+
+@dataclass
+class ValidationReport:
+    sample_size: int
+    mismatches: int  # Sampled rows predicted differently
+    missing: int  # Sampled ids that are not in the predict dataset
+    published_rows: int
+    dataset_rows: int
+    tolerance: float
+
+    @property
+    def mismatch_rate(self) -> float:
+        if self.sample_size == 0:
+            return 0.0
+        return (self.mismatches + self.missing) / self.sample_size
+
+    @property
+    def passed(self) -> bool:
+        return self.published_rows == self.dataset_rows and \
+            self.mismatch_rate <= self.tolerance
+
+    def __str__(self) -> str:
+        return (f"{self.mismatches + self.missing}/{self.sample_size} "
+                f"sampled rows differ, {self.published_rows}/"
+                f"{self.dataset_rows} rows published")
+
+
+def validate_result(setup_task: str, validation: dict, manifest: str,
+                    artifact_store: ArtifactStore,
+                    seed: int | None = None) -> ValidationReport:
+    """Predicts a random sample of a published result again and counts the
+    rows that differ. Executed in a worker process like run_task; the
+    inference cost depends on the sample size only.
+
+    validation, the parsed setup_validation of the crumb, may set the
+    confidence, margin and tolerance used instead of the configured
+    ones."""
+    # Imported here so that only worker processes load torch/transformers
+    from core.result_codec import open_results, load_model_weights
+    from core.transformer_task import TransformerTask
+
+    options = validation
+    task = TransformerTask()
+    task.set_params(setup_task)
+    params, encoded = open_results(manifest, artifact_store)
+
+    size = sample_size(
+        len(encoded),
+        options.get(confidence_key, VALIDATION_CONFIDENCE),
+        options.get(margin_key, VALIDATION_MARGIN))
+    rng = np.random.default_rng(
+        seed if seed is not None else secrets.randbits(64))
+    # Only the sampled rows of the published result are decoded
+    predictions = encoded.items(rng.choice(len(encoded), size,
+                                           replace=False))
+    # Dataset ids are read as strings, results published before that
+    # may hold them as integers
+    predictions = {str(text_id): label
+                   for text_id, label in predictions.items()}
+
+    text_ids, texts, dataset_rows = task.read_predict_rows(list(predictions))
+    weights = None
+    if params.get(model_key) is not None:
+        weights = load_model_weights(params[model_key], artifact_store)
+    recomputed = task.predict_sample(text_ids, texts, weights,
+                                     params.get(adapter_key)) \
+        if text_ids else {}
+
+    return ValidationReport(
+        sample_size=size,
+        mismatches=sum(predictions[text_id] != label
+                       for text_id, label in recomputed.items()),
+        missing=size - len(recomputed),
+        published_rows=len(encoded),
+        dataset_rows=dataset_rows,
+        tolerance=options.get(tolerance_key, VALIDATION_TOLERANCE))
+
+
+class ResultValidator:
+    """Validator mode: checks the CLOSED crumbs of other orchestrators.
+
+    Each pass lists the CLOSED crumbs of the in-progress sub-contracts
+    from a crumb index, which only replays the crumb events since its
+    last sync, checks the ones that were not computed by this account on
+    validation_slots supervised workers, and marks those that pass
+    CLOSED_VALIDATED with one batched write per sub-contract. Results
+    that fail are reported and skipped from then on; results that cannot
+    be checked are retried with a backoff, then given up as well.
+
+    crumb_index defaults to the orchestrator's crumb index, or to a local
+    one when it has none.
+    """
+
+    def __init__(self,
+                 orchestrator: "Orchestrator",
+                 main_contract: str,
+                 validation_slots: int = COMPUTE_SLOTS,
+                 poll_interval: float = POLL_INTERVAL,
+                 artifact_store: ArtifactStore | None = None,
+                 job_deadline: float | None = JOB_DEADLINE,
+                 mp_context: BaseContext | None = None,
+                 crumb_index: CrumbIndex | None = None,
+                 retries: RetryBackoff | None = None):
+        self.orchestrator: "Orchestrator" = orchestrator
+        self.main_contract: str = main_contract
+        self.poll_interval: float = poll_interval
+        self.artifact_store: ArtifactStore = \
+            artifact_store or LocalArtifactStore()
+        self.job_deadline: float | None = job_deadline
+        self.workers: list[TaskWorker] = [
+            TaskWorker(mp_context) for _ in range(validation_slots)]
+        self.crumb_index: CrumbIndex = \
+            crumb_index or orchestrator.crumb_index or CrumbIndex()
+        # (sub-contract, crumb id) of results that did not pass
+        self.rejected: set[tuple[str, bytes]] = set()
+        # Results whose validation raised
+        self.retries: RetryBackoff = retries or RetryBackoff()
+
+    async def find_closed(self) -> list[tuple[str, CrumbHeader]]:
+        orchestrator = self.orchestrator
+        contracts = await get_in_progress_headers(
+            self.main_contract,
+            network_name=orchestrator.network,
+            contract_utility=orchestrator.contract_utility)
+        found = []
+        for contract in contracts:
+            address = contract.subContractAddress
+            await self.crumb_index.ensure_fresh(
+                address, orchestrator.contract_utility)
+            found += [
+                (address, CrumbHeader.from_crumb(crumb))
+                for crumb in self.crumb_index.crumbs_by_status(
+                    address, CrumbStatus.CLOSED)
+                if crumb.assignee != orchestrator.w3.eth.default_account
+                and (address, crumb.id) not in self.rejected
+                and self.retries.ready((address, crumb.id))]
+        return found
+
+    async def validate(self, worker: TaskWorker, address: str,
+                       header: CrumbHeader) -> bool:
+        orchestrator = self.orchestrator
+        crumb = await get_crumb(
+            address, header.id,
+            network_name=orchestrator.network,
+            contract_utility=orchestrator.contract_utility)
+        job = Job(address, crumb)
+        label = f"Validation of crumb {crumb.id.hex()}"
+        try:
+            report = await worker.run(
+                validate_result, crumb.setup_task, crumb.validation,
+                crumb.result, self.artifact_store,
+                deadline=job.deadline(self.job_deadline), label=label)
+        except Exception as error:
+            delay = self.retries.failed(job.key)
+            if delay is None:
+                print(f"{label} failed: {error}, giving up")
+                self.rejected.add(job.key)
+            else:
+                print(f"{label} failed: {error}, retrying in {delay:.0f}s")
+            return False
+        self.retries.succeeded(job.key)
+        print(f"{label}: {report}, "
+              f"{'passed' if report.passed else 'rejected'}")
+        if not report.passed:
+            self.rejected.add(job.key)
+        return report.passed
+
+    async def validate_all(self, candidates: list[tuple[str, CrumbHeader]]
+                           ) -> dict[str, list[bytes]]:
+        """Validates the candidates on the workers and returns the ids
+        that passed, by sub-contract."""
+        pending: asyncio.Queue = asyncio.Queue()
+        for candidate in candidates:
+            pending.put_nowait(candidate)
+        passed: dict[str, list[bytes]] = {}
+
+        async def drain(worker: TaskWorker):
+            while not pending.empty():
+                address, header = pending.get_nowait()
+                if await self.validate(worker, address, header):
+                    passed.setdefault(address, []).append(header.id)
+
+        await asyncio.gather(*(drain(worker) for worker in self.workers))
+        return passed
+
+    async def run_once(self) -> int:
+        """One validation pass, returns the number of crumbs validated."""
+        orchestrator = self.orchestrator
+        passed = await self.validate_all(await self.find_closed())
+        validated = 0
+        for address, crumb_ids in passed.items():
+            try:
+                await update_crumbs_to_closed_validated(
+                    address, crumb_ids,
+                    network_name=orchestrator.network,
+                    contract_utility=orchestrator.contract_utility)
+            except Exception as error:
+                print(f"Marking {len(crumb_ids)} crumbs of {address} "
+                      f"validated failed: {error}")
+                continue
+            validated += len(crumb_ids)
+            # Do not check them again before the next sync
+            await self.crumb_index.refresh(
+                address, crumb_ids, orchestrator.contract_utility)
+        return validated
+
+    async def run(self):
+        try:
+            while True:
+                if not await self.run_once():
+                    await sleep(self.poll_interval)
+        finally:
+            for worker in self.workers:
+                worker.stop()
@@ -2,10 +2,11 @@
 
 import asyncio
 import os
-from core.scheduler import start_orchestrator
-from src.ContractUtility import ContractUtility
-from src.MessageBox import set_message, get_message
 import argparse
+from pathlib import Path
+
+# The subcommands import what they use when they run, so that --help and
+# the contract commands do not load web3 or the ML stack of the workers
 
 
 async def async_main():
@@ -31,6 +32,17 @@ async def async_main():
         help="Name of the contract to compile",
         default="MessageBox"
     )
+    compile_parser.add_argument(
+        "--all",
+        help="Compile every contract in contracts/, to regenerate all of "
+        "compiled_contracts/ after the Solidity changed",
+        action="store_true"
+    )
+    compile_parser.add_argument(
+        "--no-abi",
+        help="Do not write the slim ABI-only artifact",
+        action="store_true"
+    )
 
     # Subparser for deploy
     deploy_parser = subparsers.add_parser(
@@ -97,8 +109,96 @@ async def async_main():
         help="Path to the private key file",
         required=True,
     )
+    start_parser.add_argument(
+        "--main-contract",
+        help="Address of the MainContract whose in-progress queue lists "
+        "the sub-contracts to work on",
+        default=None,
+    )
+    start_parser.add_argument(
+        "--mode",
+        help="Compute the crumbs queued to this account, or validate "
+        "the results other accounts published, which needs their "
+        "--artifact-store",
+        choices=["compute", "validate"],
+        default="compute",
+    )
+    start_parser.add_argument(
+        "--discovery",
+        help="How to discover jobs: poll every sub-contract, "
+        "or follow crumb events",
+        choices=["poll", "events"],
+        default="poll",
+    )
+    start_parser.add_argument(
+        "--ws-endpoint",
+        help="WebSocket endpoint used to subscribe to crumb events",
+        default=None,
+    )
+    start_parser.add_argument(
+        "--crumb-index",
+        help="Path to a local SQLite crumb index to answer reads from",
+        default=None,
+    )
+    start_parser.add_argument(
+        "--max-staleness",
+        help="Seconds a crumb index read may lag behind the chain",
+        type=float,
+        default=30,
+    )
+    start_parser.add_argument(
+        "--compute-slots",
+        help="Number of tasks computed (or results validated) at the "
+        "same time",
+        type=int,
+        default=1,
+    )
+    start_parser.add_argument(
+        "--job-queue-size",
+        help="Number of discovered jobs waiting for a compute slot",
+        type=int,
+        default=2,
+    )
+    start_parser.add_argument(
+        "--publish-concurrency",
+        help="Number of results published at the same time",
+        type=int,
+        default=4,
+    )
+    start_parser.add_argument(
+        "--artifact-store",
+        help="Directory or URL where model weights and predictions "
+        "are stored, only their hashes are published on chain",
+        default=None,
+    )
+    start_parser.add_argument(
+        "--multicall",
+        help="Address of a deployed Multicall contract, to poll every "
+        "sub-contract in one call",
+        default=None,
+    )
+
+    start_parser.add_argument(
+        "--job-deadline",
+        help="Seconds a job may run before it is stopped, a crumb's "
+        "max_run can only lower it",
+        type=float,
+        default=24 * 60 * 60,
+    )
+    start_parser.add_argument(
+        "--training-profile",
+        help="Training profile of tasks that do not choose one, cpu "
+        "tunes threads, batching and bf16 for CPU-only workers",
+        choices=["default", "cpu"],
+        default=None,
+    )
 
     arguments = parser.parse_args()
+    if arguments.command is None:
+        parser.print_help()
+        return
+
+    from src.ContractUtility import ContractUtility
 
     match arguments.command:
         case "compile":
@@ -106,31 +206,57 @@ async def async_main():
             # require an instance of ContractUtility.
             # This is to avoid setting up the Web3 instance
             # which requires the PRIVATE_KEY.
-            ContractUtility.setup_and_compile_contract(arguments.contract)
+            contracts = [arguments.contract]
+            if arguments.all:
+                contracts = sorted(path.stem for path in
+                                   Path("contracts").glob("*.sol"))
+            for contract in contracts:
+                ContractUtility.setup_and_compile_contract(
+                    contract,
+                    write_abi=not arguments.no_abi
+                )
         case "deploy":
-            contract_utility = ContractUtility(arguments.network)
+            contract_utility = ContractUtility.get_pooled(arguments.network)
             await contract_utility.deploy_contract(arguments.contract)
         case "setMessage":
+            from src.MessageBox import set_message
             await set_message(
                 arguments.address,
                 arguments.message,
                 arguments.network
             )
         case "message":
+            from src.MessageBox import get_message
             await get_message(arguments.address, arguments.network)
         case "start":
             print("Starting the application...")
             print("With private key file [" + arguments.pkfile +
                   "] on network [" + arguments.network + "]")
+            from core.scheduler import MAIN_CONTRACT_ADDR, \
+                start_orchestrator
             await start_orchestrator(
                 network=arguments.network,
                 contract="MessageBox",
                 pkey=arguments.pkfile,
-
+                discovery=arguments.discovery,
+                ws_endpoint=arguments.ws_endpoint,
+                crumb_index_path=arguments.crumb_index,
+                max_staleness=arguments.max_staleness,
+                compute_slots=arguments.compute_slots,
+                job_queue_size=arguments.job_queue_size,
+                publish_concurrency=arguments.publish_concurrency,
+                artifact_store=arguments.artifact_store,
+                multicall_address=arguments.multicall,
+                job_deadline=arguments.job_deadline,
+                mode=arguments.mode,
+                training_profile=arguments.training_profile,
+                main_contract=arguments.main_contract or MAIN_CONTRACT_ADDR,
             )
         case _:
             parser.print_help()
 
+    await ContractUtility.close_pooled()
+
 
 def main():
     """
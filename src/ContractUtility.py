@@ -1,11 +1,16 @@
 import os
 from pathlib import Path
+from typing import Optional
+from eth_account import Account
 from solcx import compile_standard, install_solc
 
+from src.TransactionManager import TransactionManager
 from src.utils import (
     setup_web3_middleware,
     get_contract,
     process_json_file,
+    compiled_contract_path,
+    write_abi_artifact,
 )
 
 
@@ -15,16 +20,98 @@ class ContractUtility:
 
     :param network_name: Name of the network to connect to
     :type network_name: str
+    :param private_key: Key to sign with, defaults to $PRIVATE_KEY
+    :type private_key: Optional[str]
     :return: None
     """
 
-    def __init__(self, network_name: str):
-        PRIVATE_KEY = os.environ.get("PRIVATE_KEY")
+    # Process-wide pool of clients keyed by (network name, account address).
+    # Reusing a client keeps its provider, and with it the keep-alive HTTP
+    # session, the middleware onion and the sapphire wrapper.
+    _pool: dict[tuple[str, Optional[str]], "ContractUtility"] = {}
+    _account_addresses: dict[str, str] = {}
+
+    def __init__(self, network_name: str, private_key: Optional[str] = None):
+        PRIVATE_KEY = private_key or os.environ.get("PRIVATE_KEY")
+        self.network_name = network_name
         self.w3 = setup_web3_middleware(network_name, PRIVATE_KEY)
+        self._transactions: Optional[TransactionManager] = None
+
+    @classmethod
+    def get_pooled(
+        cls, network_name: str, private_key: Optional[str] = None
+    ) -> "ContractUtility":
+        """
+        Returns the shared ContractUtility for a network and account,
+        creating it on first use.
+
+        :param network_name: Name of the network to connect to
+        :param private_key: Key to sign with, defaults to $PRIVATE_KEY
+        :return: The pooled ContractUtility
+        """
+        PRIVATE_KEY = private_key or os.environ.get("PRIVATE_KEY")
+        key = (network_name, cls._account_address(PRIVATE_KEY))
+        contract_utility = cls._pool.get(key)
+        if contract_utility is None:
+            contract_utility = cls(network_name, PRIVATE_KEY)
+            cls._pool[key] = contract_utility
+        return contract_utility
+
+    @classmethod
+    async def close_pooled(cls) -> None:
+        """
+        Disconnects and forgets every pooled client.
+        """
+        pooled = list(cls._pool.values())
+        cls._pool.clear()
+        for contract_utility in pooled:
+            if contract_utility._transactions is not None:
+                await contract_utility._transactions.close()
+            await contract_utility.w3.provider.disconnect()
+
+    @property
+    def transactions(self) -> TransactionManager:
+        """
+        The transaction manager of this client's account, created on
+        first use. Pooled clients share one per (network, account).
+        """
+        if self._transactions is None:
+            self._transactions = TransactionManager(self.w3)
+        return self._transactions
+
+    async def send_transaction(self, function, params: Optional[dict] = None,
+                               wait: bool = True, label: Optional[str] = None):
+        """
+        Sends function.transact(params) through the transaction manager.
+
+        :param function: Bound contract function or constructor
+        :param params: Extra transaction fields such as value
+        :param wait: Wait for the receipt instead of returning its future
+        :param label: Name printed with the transaction hash
+        :return: The receipt, or a future resolved with it
+        :raises ContractLogicError: The transaction reverted
+        """
+        future = await self.transactions.send(function, params, label)
+        if wait:
+            return await future
+        return future
+
+    @classmethod
+    def _account_address(cls, private_key: Optional[str]) -> Optional[str]:
+        if not private_key:
+            return None
+        address = cls._account_addresses.get(private_key)
+        if address is None:
+            address = Account.from_key(private_key).address
+            cls._account_addresses[private_key] = address
+        return address
 
     @classmethod
     def setup_and_compile_contract(
-        cls, contract_name: str = "MessageBox", SOLIDITY_VERSION: str = "0.8.0"
+        cls,
+        contract_name: str = "MessageBox",
+        SOLIDITY_VERSION: str = "0.8.0",
+        write_abi: bool = True,
     ) -> str:
         # This remains synchronous as compilation doesn't need to be async.
         install_solc(SOLIDITY_VERSION)
@@ -50,23 +137,19 @@ class ContractUtility:
             },
             solc_version=SOLIDITY_VERSION,
         )
-        output_path = (
-            Path(__file__).parent.parent
-            / "compiled_contracts"
-            / f"{contract_name}_compiled.json"
-        ).resolve()
+        output_path = compiled_contract_path(contract_name)
         Path(output_path.parent).mkdir(parents=True, exist_ok=True)
         process_json_file(output_path, mode="w", data=compiled_sol)
         print(f"Compiled contract {contract_name} {output_path}")
+        if write_abi:
+            abi_path = write_abi_artifact(contract_name, compiled_sol)
+            print(f"Wrote ABI artifact {abi_path}")
         return compiled_sol
 
     async def deploy_contract(self, contract_name: str):
         abi, bytecode = get_contract(contract_name)
         contract = self.w3.eth.contract(abi=abi, bytecode=bytecode)
-        gas_price = await self.w3.eth.gas_price
-        tx_hash = await contract.constructor().transact({
-            "gasPrice": gas_price
-            })
-        tx_receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        tx_receipt = await self.send_transaction(
+            contract.constructor(), label="deploy")
         print(f"Contract deployed at {tx_receipt.contractAddress}")
         return tx_receipt.contractAddress
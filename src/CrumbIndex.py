@@ -0,0 +1,238 @@
+import asyncio
+import sqlite3
+import time
+from os import getcwd
+from os.path import join
+from pathlib import Path
+from typing import Optional
+
+from core.constants import FETCH_CONCURRENCY
+from src.ContractUtility import ContractUtility
+from src.MainContract import ComputeTask
+from src.SubContract import Crumb, CrumbStatus, get_all_crumbs, get_crumb, \
+    get_touched_crumb_ids
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crumbs (
+    address TEXT NOT NULL,
+    id BLOB NOT NULL,
+    alias_name TEXT NOT NULL,
+    price TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    setup_task TEXT NOT NULL,
+    setup_validation TEXT NOT NULL,
+    result TEXT NOT NULL,
+    assignee TEXT NOT NULL,
+    last_updated INTEGER NOT NULL,
+    max_run INTEGER NOT NULL,
+    PRIMARY KEY (address, id)
+);
+CREATE INDEX IF NOT EXISTS crumbs_by_status ON crumbs (address, status);
+CREATE INDEX IF NOT EXISTS crumbs_by_assignee ON crumbs (address, assignee);
+
+CREATE TABLE IF NOT EXISTS compute_tasks (
+    address TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    sum TEXT NOT NULL,
+    id TEXT NOT NULL,
+    sub_contract_address TEXT NOT NULL,
+    PRIMARY KEY (address, queue, position)
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    address TEXT NOT NULL,
+    source TEXT NOT NULL,
+    block INTEGER,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (address, source)
+);
+"""
+
+CRUMB_COLUMNS = ("id, alias_name, price, status, setup_task, "
+                 "setup_validation, result, assignee, last_updated, max_run")
+
+
+class CrumbIndex:
+    """
+    Local, persistent mirror of sub-contract crumbs and main-contract
+    queues, stored in SQLite.
+
+    Sub-contracts are loaded in full once, then kept up to date by
+    replaying CrumbAdded/CrumbUpdated logs over block ranges and
+    re-reading only the crumbs they touched. Queues are cached whole.
+    Reads are answered locally while the mirror is younger than
+    max_staleness seconds.
+
+    :param path: SQLite file, defaults to output/crumb_index.sqlite3
+    :param max_staleness: Default staleness bound in seconds
+    :param block_range: Blocks per eth_getLogs request
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 max_staleness: float = 30,
+                 block_range: int = 100):
+        self.path: Path = Path(
+            path or join(getcwd(), "output", "crumb_index.sqlite3"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_staleness: float = max_staleness
+        self.block_range: int = block_range
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    # Sync state
+    def synced_block(self, address: str, source: str = "crumbs") -> int | None:
+        row = self.connection.execute(
+            "SELECT block FROM sync_state WHERE address = ? AND source = ?",
+            (address, source)).fetchone()
+        return None if row is None else row[0]
+
+    def is_fresh(self,
+                 address: str,
+                 max_staleness: Optional[float] = None,
+                 source: str = "crumbs") -> bool:
+        if max_staleness is None:
+            max_staleness = self.max_staleness
+        row = self.connection.execute(
+            "SELECT synced_at FROM sync_state "
+            "WHERE address = ? AND source = ?",
+            (address, source)).fetchone()
+        return row is not None and time.time() - row[0] <= max_staleness
+
+    def mark_synced(self,
+                    address: str,
+                    block: int | None,
+                    source: str = "crumbs"):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync_state "
+                "(address, source, block, synced_at) VALUES (?, ?, ?, ?)",
+                (address, source, block, time.time()))
+
+    # Crumbs
+    def upsert_crumbs(self, address: str, crumbs: list[Crumb]):
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO crumbs (address, {CRUMB_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(address, bytes(crumb.id), crumb.alias_name, str(crumb.price),
+                  crumb.status.value, crumb.setup_task,
+                  crumb.setup_validation, crumb.result, crumb.assignee,
+                  crumb.last_updated, crumb.max_run)
+                 for crumb in crumbs])
+
+    def _select_crumbs(self, where: str, parameters: tuple) -> list[Crumb]:
+        rows = self.connection.execute(
+            f"SELECT {CRUMB_COLUMNS} FROM crumbs WHERE {where} "
+            "ORDER BY rowid", parameters).fetchall()
+        return [Crumb.from_tuple((row[0], row[1], int(row[2])) + row[3:])
+                for row in rows]
+
+    def crumb(self, address: str, crumb_id: bytes) -> Crumb | None:
+        crumbs = self._select_crumbs(
+            "address = ? AND id = ?", (address, bytes(crumb_id)))
+        return crumbs[0] if crumbs else None
+
+    def all_crumbs(self, address: str) -> list[Crumb]:
+        return self._select_crumbs("address = ?", (address,))
+
+    def crumbs_by_status(self,
+                         address: str,
+                         status: CrumbStatus | int) -> list[Crumb]:
+        return self._select_crumbs(
+            "address = ? AND status = ?",
+            (address, CrumbStatus(status).value))
+
+    def crumbs_by_assignee(self, address: str, assignee: str) -> list[Crumb]:
+        return self._select_crumbs(
+            "address = ? AND assignee = ?", (address, assignee))
+
+    async def refresh(self,
+                      address: str,
+                      crumb_ids,
+                      contract_utility: ContractUtility):
+        """Re-reads the given crumbs from the chain, at most
+        FETCH_CONCURRENCY at a time."""
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+        async def read(crumb_id) -> Crumb:
+            async with semaphore:
+                return await get_crumb(
+                    address, crumb_id, contract_utility=contract_utility)
+
+        crumbs = await asyncio.gather(*[
+            read(crumb_id) for crumb_id in crumb_ids])
+        self.upsert_crumbs(address, list(crumbs))
+
+    async def sync(self, address: str, contract_utility: ContractUtility):
+        """Brings the crumbs of a sub-contract up to the latest block."""
+        # Read the block first so that changes racing with the sync are
+        # replayed on the next one
+        latest = await contract_utility.w3.eth.get_block_number()
+        synced_block = self.synced_block(address)
+        if synced_block is None:
+            crumbs = await get_all_crumbs(
+                address, contract_utility=contract_utility)
+            self.upsert_crumbs(address, crumbs)
+        else:
+            touched_ids = set()
+            from_block = synced_block + 1
+            while from_block <= latest:
+                to_block = min(from_block + self.block_range - 1, latest)
+                touched_ids |= await get_touched_crumb_ids(
+                    address, from_block, to_block,
+                    contract_utility=contract_utility)
+                from_block = to_block + 1
+            await self.refresh(address, touched_ids, contract_utility)
+        self.mark_synced(address, latest)
+
+    async def ensure_fresh(self,
+                           address: str,
+                           contract_utility: ContractUtility,
+                           max_staleness: Optional[float] = None):
+        if not self.is_fresh(address, max_staleness):
+            await self.sync(address, contract_utility)
+
+    # Compute tasks
+    def compute_tasks(self,
+                      address: str,
+                      queue: str,
+                      max_staleness: Optional[float] = None
+                      ) -> list[ComputeTask] | None:
+        """Returns the cached queue, or None when it is missing or stale."""
+        if not self.is_fresh(address, max_staleness, source=queue):
+            return None
+        rows = self.connection.execute(
+            "SELECT sender, timestamp, content, sum, id, "
+            "sub_contract_address FROM compute_tasks "
+            "WHERE address = ? AND queue = ? ORDER BY position",
+            (address, queue)).fetchall()
+        return [ComputeTask.from_tuple(
+            (row[0], row[1], row[2], int(row[3]), int(row[4]), row[5]))
+            for row in rows]
+
+    def replace_compute_tasks(self,
+                              address: str,
+                              queue: str,
+                              tasks: list[ComputeTask]):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM compute_tasks WHERE address = ? AND queue = ?",
+                (address, queue))
+            self.connection.executemany(
+                "INSERT INTO compute_tasks (address, queue, position, "
+                "sender, timestamp, content, sum, id, sub_contract_address) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(address, queue, position, task.sender, task.timestamp,
+                  task.content, str(task.sum), str(task.id),
+                  task.subContractAddress)
+                 for position, task in enumerate(tasks)])
+        self.mark_synced(address, None, source=queue)
@@ -1,7 +1,20 @@
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import AsyncIterator, Optional, Tuple, TYPE_CHECKING
 from src.ContractUtility import ContractUtility
-from src.utils import get_contract
+from src.utils import get_contract_instance, has_function, iter_pages
+
+if TYPE_CHECKING:
+    from src.CrumbIndex import CrumbIndex
+
+QUEUE_PAGE_SIZE = 50  # Tasks returned by one paged getter call
+PAGE_CONCURRENCY = 8  # Pages requested at the same time
+
+# Contract getter prefix of each queue
+QUEUES = {
+    "request": "RequestQueue",
+    "in_progress": "InProgressQueue",
+    "completed": "CompletedQueue",
+}
 
 
 @dataclass
@@ -25,97 +38,223 @@ class ComputeTask:
         )
 
 
+@dataclass
+class ComputeTaskHeader:
+    id: int
+    subContractAddress: str
+    timestamp: int
+
+    @classmethod
+    def from_tuple(cls, data: Tuple) -> 'ComputeTaskHeader':
+        return cls(
+            id=data[0],
+            subContractAddress=data[1],
+            timestamp=data[2],
+        )
+
+    @classmethod
+    def from_task(cls, task: ComputeTask) -> 'ComputeTaskHeader':
+        return cls(
+            id=task.id,
+            subContractAddress=task.subContractAddress,
+            timestamp=task.timestamp,
+        )
+
+
 async def add_to_request_queue(
     address: str,
     content: str,
     sum_value: int,
     task_id: int,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("MainContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "MainContract", address)
 
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.addToRequestQueue(
-        content, sum_value, task_id
-    ).transact({"value": sum_value, "gasPrice": gas_price})
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"addToRequestQueue transaction: {tx_receipt.transactionHash.hex()}")
-    print(tx_receipt)
+    return await contract_utility.send_transaction(
+        contract.functions.addToRequestQueue(content, sum_value, task_id),
+        {"value": sum_value},
+        wait=wait)
 
 
 async def move_to_in_progress_queue(
     address: str,
     task_id: int,
     sub_contract_address: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("MainContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "MainContract", address)
 
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.moveToInProgressQueue(
-        task_id, sub_contract_address
-    ).transact({"gasPrice": gas_price})
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(
-        f"moveToInProgressQueue transaction: {tx_receipt.transactionHash.hex()}")
+    return await contract_utility.send_transaction(
+        contract.functions.moveToInProgressQueue(
+            task_id, sub_contract_address),
+        wait=wait)
 
 
 async def move_to_completed_queue(
     address: str,
     task_id: int,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("MainContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "MainContract", address)
 
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.moveToCompletedQueue(
-        task_id
-    ).transact({"gasPrice": gas_price})
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(
-        f"moveToCompletedQueue transaction: {tx_receipt.transactionHash.hex()}")
+    return await contract_utility.send_transaction(
+        contract.functions.moveToCompletedQueue(task_id),
+        wait=wait)
 
 
 async def get_request_queue(
     address: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    crumb_index: Optional["CrumbIndex"] = None,
+    max_staleness: Optional[float] = None
 ) -> list[ComputeTask]:
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("MainContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if crumb_index is not None:
+        indexed_queue = crumb_index.compute_tasks(
+            address, "request", max_staleness)
+        if indexed_queue is not None:
+            return indexed_queue
 
-    queue = await contract.functions.getRequestQueue().call()
-    print(f"RequestQueue: {queue}")
-    return [ComputeTask.from_tuple(ct) for ct in queue]
+    compute_tasks = [
+        compute_task
+        async for page in iter_queue_pages(
+            address, "request", contract_utility=contract_utility)
+        for compute_task in page
+    ]
+    print(f"RequestQueue: {compute_tasks}")
+    if crumb_index is not None:
+        crumb_index.replace_compute_tasks(address, "request", compute_tasks)
+    return compute_tasks
 
 
 async def get_in_progress_queue(
     address: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    crumb_index: Optional["CrumbIndex"] = None,
+    max_staleness: Optional[float] = None
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("MainContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if crumb_index is not None:
+        indexed_queue = crumb_index.compute_tasks(
+            address, "in_progress", max_staleness)
+        if indexed_queue is not None:
+            return indexed_queue
 
-    queue = await contract.functions.getInProgressQueue().call()
-    print(f"InProgressQueue: {queue}")
-    return [ComputeTask.from_tuple(ct) for ct in queue]
+    compute_tasks = [
+        compute_task
+        async for page in iter_queue_pages(
+            address, "in_progress", contract_utility=contract_utility)
+        for compute_task in page
+    ]
+    print(f"InProgressQueue: {compute_tasks}")
+    if crumb_index is not None:
+        crumb_index.replace_compute_tasks(
+            address, "in_progress", compute_tasks)
+    return compute_tasks
 
 
 async def get_completed_queue(
     address: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    crumb_index: Optional["CrumbIndex"] = None,
+    max_staleness: Optional[float] = None
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("MainContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if crumb_index is not None:
+        indexed_queue = crumb_index.compute_tasks(
+            address, "completed", max_staleness)
+        if indexed_queue is not None:
+            return indexed_queue
+
+    compute_tasks = [
+        compute_task
+        async for page in iter_queue_pages(
+            address, "completed", contract_utility=contract_utility)
+        for compute_task in page
+    ]
+    print(f"CompletedQueue: {compute_tasks}")
+    if crumb_index is not None:
+        crumb_index.replace_compute_tasks(address, "completed", compute_tasks)
+    return compute_tasks
+
+
+async def iter_queue_pages(
+    address: str,
+    queue: str,
+    headers: bool = False,
+    page_size: int = QUEUE_PAGE_SIZE,
+    concurrency: int = PAGE_CONCURRENCY,
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None
+) -> AsyncIterator[list]:
+    """Yields a main-contract queue ("request", "in_progress" or
+    "completed") one page at a time, in order. With headers only the id,
+    sub-contract address and timestamp of each task are read, as
+    ComputeTaskHeader, instead of full ComputeTask objects.
+
+    Contracts deployed before the paged getters are read with their
+    whole-queue getter, and the result is split into pages locally."""
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "MainContract", address)
+    functions = contract.functions
+    name = QUEUES[queue]
+    if not await has_function(contract, f"get{name}Page", 0, 0):
+        compute_tasks = [ComputeTask.from_tuple(task)
+                         for task in await functions[f"get{name}"]().call()]
+        if headers:
+            compute_tasks = [ComputeTaskHeader.from_task(task)
+                             for task in compute_tasks]
+        for offset in range(0, len(compute_tasks), page_size):
+            yield compute_tasks[offset:offset + page_size]
+        return
+
+    count = await functions[f"get{name}Length"]().call()
+    if headers:
+        get_page, from_tuple = \
+            functions[f"get{name}Headers"], ComputeTaskHeader.from_tuple
+    else:
+        get_page, from_tuple = \
+            functions[f"get{name}Page"], ComputeTask.from_tuple
 
-    queue = await contract.functions.getCompletedQueue().call()
-    print(f"CompletedQueue: {queue}")
-    return [ComputeTask.from_tuple(ct) for ct in queue]
+    async for page in iter_pages(
+            count, page_size,
+            lambda offset: get_page(offset, page_size).call(),
+            concurrency):
+        yield [from_tuple(item) for item in page]
+
+
+async def get_in_progress_headers(
+    address: str,
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None
+) -> list[ComputeTaskHeader]:
+    return [
+        header
+        async for page in iter_queue_pages(
+            address, "in_progress", headers=True,
+            network_name=network_name, contract_utility=contract_utility)
+        for header in page
+    ]
@@ -1,47 +1,37 @@
 # type:ignore
 from typing import Optional
 from src.ContractUtility import ContractUtility
-from src.utils import get_contract
+from src.utils import get_contract_instance
 
 
 async def set_message(
     address: str,
     message: str,
-    network_name: str = "sapphire-localnet"
-) -> None:
-    contract_utility = ContractUtility(network_name)
+    network_name: str = "sapphire-localnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
+):
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
 
-    abi, bytecode = get_contract("MessageBox")
+    contract = get_contract_instance(
+        contract_utility.w3, "MessageBox", address)
 
-    contract = contract_utility.w3.eth.contract(
-        address=address,
-        abi=abi
-    )
-
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.setMessage(message).transact(
-        {"gasPrice": gas_price}
-    )
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(
-        tx_hash
-    )
-    print(f"""Message set.
-          Transaction hash: {tx_receipt.transactionHash.hex()}"""
-          )
+    return await contract_utility.send_transaction(
+        contract.functions.setMessage(message),
+        wait=wait)
 
 
 async def get_message(
         address: str,
-        network_name: Optional[str] = "sapphire-localnet"
+        network_name: Optional[str] = "sapphire-localnet",
+        contract_utility: Optional[ContractUtility] = None
 ) -> str:
-    contract_utility = ContractUtility(network_name)
-
-    abi, bytecode = get_contract("MessageBox")
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
 
-    contract = contract_utility.w3.eth.contract(
-        address=address,
-        abi=abi
-    )
+    contract = get_contract_instance(
+        contract_utility.w3, "MessageBox", address)
     # Retrieve message from contract
     message = await contract.functions.message().call()
     author = await contract.functions.author().call()
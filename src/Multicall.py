@@ -0,0 +1,192 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from eth_abi.grammar import parse
+from eth_utils import to_checksum_address
+from eth_utils.abi import get_abi_output_types
+from web3.exceptions import ContractLogicError
+
+from src.ContractUtility import ContractUtility
+from src.MainContract import ComputeTask
+from src.SubContract import Crumb, CrumbHeader
+from src.utils import get_contract_instance
+
+MULTICALL_WINDOW = 0.01  # Seconds calls are collected before a flush
+MULTICALL_MAX_CALLS = 100  # Calls aggregated into one eth_call
+HEADER_PAGE_SIZE = 1000  # Crumb headers read per sub-contract call
+
+
+def encode_call(function) -> bytes:
+    """Calldata of a bound contract function."""
+    return bytes.fromhex(function.selector[2:]) + function.w3.codec.encode(
+        list(function.argument_types), list(function.arguments))
+
+
+def checksum_addresses(abi_type, value):
+    """Checksums the addresses in a decoded value of the parsed abi_type,
+    as function.call() returns them."""
+    if abi_type.is_array:
+        return [checksum_addresses(abi_type.item_type, item)
+                for item in value]
+    if hasattr(abi_type, "components"):
+        return tuple(checksum_addresses(component, item)
+                     for component, item in zip(abi_type.components, value))
+    if abi_type.base == "address":
+        return to_checksum_address(value)
+    return value
+
+
+def decode_result(function, data: bytes):
+    """Decodes return data the way function.call() would."""
+    output_types = get_abi_output_types(function.abi)
+    decoded = function.w3.codec.decode(output_types, data)
+    normalized = [checksum_addresses(parse(output_type), value)
+                  for output_type, value in zip(output_types, decoded)]
+    if len(normalized) == 1:
+        return normalized[0]
+    return normalized
+
+
+class MulticallBatcher:
+    """
+    Batches view calls into Multicall.aggregate eth_calls.
+
+    Calls made through call() are collected for window seconds, or until
+    max_calls are waiting, and sent together. Inside batch() nothing is
+    sent before the block ends, so everything issued in it shares one
+    round trip. Each call gets its own future, resolved with the decoded
+    result or failed with a ContractLogicError when that call reverted.
+
+    The sub-calls run with the Multicall contract as msg.sender, so
+    functions that depend on the caller (getCrumbsByRequester) cannot be
+    batched.
+
+    :param contract_utility: Client used for the aggregated calls
+    :param address: Address of the deployed Multicall contract
+    :param window: Seconds calls are collected before a flush
+    :param max_calls: Calls aggregated into one eth_call
+    """
+
+    def __init__(self,
+                 contract_utility: ContractUtility,
+                 address: str,
+                 window: float = MULTICALL_WINDOW,
+                 max_calls: int = MULTICALL_MAX_CALLS):
+        self.contract_utility = contract_utility
+        self.address = address
+        self.window: float = window
+        self.max_calls: int = max_calls
+        self.pending: list[tuple[object, Callable, asyncio.Future]] = []
+        self.timer: Optional[asyncio.Task] = None
+        self.flushing: set[asyncio.Task] = set()
+        self.explicit: int = 0
+
+    def call(self, function, convert: Callable = lambda result: result
+             ) -> asyncio.Future:
+        """Queues a bound view function, returns the future of
+        convert(result)."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((function, convert, future))
+        if len(self.pending) >= self.max_calls and not self.explicit:
+            task = asyncio.ensure_future(self.flush())
+            self.flushing.add(task)
+            task.add_done_callback(self.flushing.discard)
+        elif self.timer is None and not self.explicit:
+            self.timer = asyncio.ensure_future(self.flush_later())
+        return future
+
+    @asynccontextmanager
+    async def batch(self):
+        """Collects the calls made in the block and sends them on exit."""
+        self.explicit += 1
+        try:
+            yield self
+        finally:
+            self.explicit -= 1
+            if not self.explicit:
+                await self.flush()
+
+    async def flush_later(self):
+        await asyncio.sleep(self.window)
+        self.timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self.timer is not None and self.timer is not asyncio.current_task():
+            self.timer.cancel()
+            self.timer = None
+        calls, self.pending = self.pending, []
+        await asyncio.gather(*(
+            self.send(calls[start:start + self.max_calls])
+            for start in range(0, len(calls), self.max_calls)))
+
+    async def aggregate(self, calls: list) -> list[tuple[bool, bytes]]:
+        multicall = get_contract_instance(
+            self.contract_utility.w3, "Multicall", self.address)
+        _, results = await multicall.functions.aggregate([
+            (function.address, encode_call(function))
+            for function, _, _ in calls
+        ]).call()
+        return results
+
+    async def send(self, calls: list):
+        try:
+            results = await self.aggregate(calls)
+        except Exception as error:
+            for _, _, future in calls:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (function, convert, future), (success, data) in \
+                zip(calls, results):
+            if future.done():
+                continue
+            if not success:
+                future.set_exception(ContractLogicError(
+                    f"{function.fn_name} reverted", data=data))
+                continue
+            try:
+                future.set_result(convert(decode_result(function, data)))
+            except Exception as error:
+                future.set_exception(error)
+
+    # Typed shortcuts for the getters the orchestrator polls
+    def _sub_contract(self, address: str):
+        return get_contract_instance(
+            self.contract_utility.w3, "SubContract", address).functions
+
+    def crumb(self, address: str, crumb_id: bytes) -> asyncio.Future:
+        return self.call(self._sub_contract(address).getCrumb(crumb_id),
+                         Crumb.from_tuple)
+
+    def crumb_count(self, address: str) -> asyncio.Future:
+        return self.call(self._sub_contract(address).getCrumbCount())
+
+    def crumb_count_by_status(self, address: str,
+                              status: int) -> asyncio.Future:
+        return self.call(
+            self._sub_contract(address).getCrumbCountByStatus(status))
+
+    def crumbs_by_status(self, address: str, status: int) -> asyncio.Future:
+        return self.call(
+            self._sub_contract(address).getCrumbsByStatus(status),
+            lambda crumbs: [Crumb.from_tuple(crumb) for crumb in crumbs])
+
+    def crumb_headers_by_status(self, address: str, status: int,
+                                offset: int = 0,
+                                limit: int = HEADER_PAGE_SIZE
+                                ) -> asyncio.Future:
+        return self.call(
+            self._sub_contract(address).getCrumbHeadersByStatusPage(
+                status, offset, limit),
+            lambda headers: [CrumbHeader.from_tuple(header)
+                             for header in headers])
+
+    def in_progress_queue(self, address: str) -> asyncio.Future:
+        functions = get_contract_instance(
+            self.contract_utility.w3, "MainContract", address).functions
+        return self.call(
+            functions.getInProgressQueue(),
+            lambda queue: [ComputeTask.from_tuple(task) for task in queue])
@@ -1,12 +1,25 @@
 # type: ignore
-from typing import Optional
+import asyncio
+import json
+from functools import cached_property
+from typing import AsyncIterator, Callable, Optional
 from src.ContractUtility import ContractUtility
-from src.utils import get_contract
+from src.utils import get_contract, get_contract_instance, has_function, \
+    iter_pages
+from eth_utils import event_abi_to_log_topic
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Tuple
+from typing import Any, Tuple, TYPE_CHECKING
 from enum import Enum
 
+if TYPE_CHECKING:
+    from src.CrumbIndex import CrumbIndex
+
+CRUMB_PAGE_SIZE = 50  # Crumbs returned by one paginated getter call
+PAGE_CONCURRENCY = 8  # Pages requested at the same time
+BATCH_SIZE = 200  # Crumbs tried in the first chunk of a batch write
+BATCH_GAS_LIMIT = 10_000_000  # Gas allowed per batch write transaction
+
 
 class CrumbStatus(Enum):
     NEW = 0
@@ -46,6 +59,78 @@ class Crumb:
     def last_updated_datetime(self) -> datetime:
         return datetime.fromtimestamp(self.last_updated)
 
+    # setup_validation stays the JSON string stored on chain, it is parsed
+    # on first access only
+    @cached_property
+    def validation(self) -> dict:
+        return json.loads(self.setup_validation or "{}")
+
+
+class CrumbHeader:
+    """Fixed-size fields of a crumb, as returned by the header getters.
+
+    Scanning headers skips the alias and JSON strings, which make up most
+    of a crumb; the full Crumb is fetched only once one is selected."""
+    __slots__ = ("id", "status", "price", "assignee", "last_updated",
+                 "max_run")
+
+    def __init__(self, id: bytes, status: CrumbStatus, price: int,
+                 assignee: str, last_updated: int, max_run: int):
+        self.id = id
+        self.status = status
+        self.price = price
+        self.assignee = assignee
+        self.last_updated = last_updated
+        self.max_run = max_run
+
+    @classmethod
+    def from_tuple(cls, data: Tuple) -> 'CrumbHeader':
+        return cls(data[0], CrumbStatus(data[1]), data[2], data[3], data[4],
+                   data[5])
+
+    @classmethod
+    def from_crumb(cls, crumb: Crumb) -> 'CrumbHeader':
+        return cls(crumb.id, crumb.status, crumb.price, crumb.assignee,
+                   crumb.last_updated, crumb.max_run)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CrumbHeader):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name)
+                   for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (f"CrumbHeader(id={self.id.hex()}, status={self.status.name}, "
+                f"assignee={self.assignee})")
+
+
+@dataclass
+class CrumbUpdate:
+    address: str  # Sub-contract that emitted the event
+    id: bytes
+    status: CrumbStatus
+    assignee: str
+    block_number: int
+
+    @classmethod
+    def from_event(cls, event) -> 'CrumbUpdate':
+        return cls(
+            address=event["address"],
+            id=event["args"]["id"],
+            status=CrumbStatus(event["args"]["status"]),
+            assignee=event["args"]["assignee"],
+            block_number=event["blockNumber"],
+        )
+
+
+def crumb_event_topic(event_name: str = "CrumbUpdated") -> bytes:
+    abi, _ = get_contract("SubContract")
+    event_abi = next(
+        item for item in abi
+        if item["type"] == "event" and item["name"] == event_name
+    )
+    return event_abi_to_log_topic(event_abi)
+
 
 async def add_crumb(
     address: str,
@@ -55,87 +140,259 @@ async def add_crumb(
     setup_task: str,
     setup_validation: str,
     max_run: int,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
 
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.addCrumb(
-        crumb_id, alias_name, price, setup_task, setup_validation, max_run
-    ).transact({"gasPrice": gas_price})
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"addCrumb transaction: {tx_receipt.transactionHash.hex()}")
+    return await contract_utility.send_transaction(
+        contract.functions.addCrumb(
+            crumb_id, alias_name, price, setup_task, setup_validation,
+            max_run),
+        wait=wait)
 
 
 async def update_crumb_to_queued(
     address: str,
     crumb_id: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
 
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.updateCrumbToQueued(crumb_id).transact({"gasPrice": gas_price})
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(
-        f"updateCrumbToQueued transaction: {tx_receipt.transactionHash.hex()}")
+    return await contract_utility.send_transaction(
+        contract.functions.updateCrumbToQueued(crumb_id),
+        wait=wait)
 
 
 async def update_crumb_to_closed(
     address: str,
     crumb_id: str,
     result: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
 
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.updateCrumbToClosed(crumb_id, result).transact({"gasPrice": gas_price})
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(
-        f"updateCrumbToClosed transaction: {tx_receipt.transactionHash.hex()}")
+    return await contract_utility.send_transaction(
+        contract.functions.updateCrumbToClosed(crumb_id, result),
+        wait=wait)
 
 
 async def update_crumb_to_closed_validated(
     address: str,
     crumb_id: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
 ):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
-
-    gas_price = await contract_utility.w3.eth.gas_price
-    tx_hash = await contract.functions.updateCrumbToClosedValidated(crumb_id).transact({"gasPrice": gas_price})
-    tx_receipt = await contract_utility.w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(
-        f"updateCrumbToClosedValidated transaction: {tx_receipt.transactionHash.hex()}")
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
+
+    return await contract_utility.send_transaction(
+        contract.functions.updateCrumbToClosedValidated(crumb_id),
+        wait=wait)
+
+
+async def settle(futures: list):
+    """Waits for transactions already sent when a later one fails, so the
+    error is raised once they are mined and none is left unobserved."""
+    await asyncio.gather(*futures, return_exceptions=True)
+
+
+async def send_in_chunks(
+    contract_utility: ContractUtility,
+    make_function: Callable[[list], object],
+    items: list,
+    batch_size: int = BATCH_SIZE,
+    gas_limit: int = BATCH_GAS_LIMIT,
+    wait: bool = True
+) -> list:
+    """Sends make_function(chunk) for consecutive chunks of items.
+
+    Every chunk is gas-estimated before it is sent; a chunk over
+    gas_limit is halved until it fits, and the next chunk is sized from
+    the gas used per item so far. A chunk is sent with 20% gas headroom,
+    capped at gas_limit. Chunks are pipelined through the transaction
+    manager, so they do not wait for each other's receipts. Returns the
+    receipts, or their futures when wait is False."""
+    futures = []
+    start = 0
+    size = batch_size
+    try:
+        while start < len(items):
+            size = max(1, min(size, len(items) - start))
+            while True:
+                function = make_function(items[start:start + size])
+                try:
+                    gas = await function.estimate_gas()
+                except Exception:
+                    if size == 1:
+                        raise
+                    gas = None
+                if gas is not None and gas <= gas_limit:
+                    break
+                if size == 1:
+                    raise ValueError(
+                        f"One item needs {gas} gas, over the {gas_limit} "
+                        f"limit")
+                size //= 2
+
+            futures.append(await contract_utility.send_transaction(
+                function, {"gas": min(gas + gas // 5, gas_limit)},
+                wait=False, label=f"{function.fn_name} ({size} crumbs)"))
+            start += size
+            size = max(1, size * gas_limit // gas)
+    except Exception:
+        await settle(futures)
+        raise
+    if wait:
+        return list(await asyncio.gather(*futures))
+    return futures
+
+
+async def send_each(
+    contract_utility: ContractUtility,
+    make_function: Callable[[object], object],
+    items: list,
+    wait: bool = True
+) -> list:
+    """Sends make_function(item) for every item, one transaction each.
+    For contracts deployed before the batch functions; the transactions
+    are pipelined like the chunks of send_in_chunks."""
+    futures = []
+    try:
+        for item in items:
+            futures.append(await contract_utility.send_transaction(
+                make_function(item), wait=False))
+    except Exception:
+        await settle(futures)
+        raise
+    if wait:
+        return list(await asyncio.gather(*futures))
+    return futures
+
+
+async def add_crumbs(
+    address: str,
+    crumbs: list[tuple],
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
+) -> list:
+    """Adds many crumbs, given as (crumb_id, alias_name, price, setup_task,
+    setup_validation, max_run) tuples like the arguments of add_crumb."""
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
+    if not await has_function(contract, "addCrumbs", []):
+        return await send_each(
+            contract_utility,
+            lambda crumb: contract.functions.addCrumb(*crumb),
+            crumbs, wait=wait)
+
+    return await send_in_chunks(
+        contract_utility,
+        lambda chunk: contract.functions.addCrumbs(chunk),
+        [tuple(crumb) for crumb in crumbs],
+        wait=wait)
+
+
+async def update_crumbs_to_queued(
+    address: str,
+    crumb_ids: list[bytes],
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
+) -> list:
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
+    if not await has_function(contract, "updateCrumbsToQueued", []):
+        return await send_each(
+            contract_utility, contract.functions.updateCrumbToQueued,
+            crumb_ids, wait=wait)
+
+    return await send_in_chunks(
+        contract_utility,
+        lambda chunk: contract.functions.updateCrumbsToQueued(chunk),
+        list(crumb_ids),
+        wait=wait)
+
+
+async def update_crumbs_to_closed_validated(
+    address: str,
+    crumb_ids: list[bytes],
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    wait: bool = True
+) -> list:
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
+    if not await has_function(contract, "updateCrumbsToClosedValidated", []):
+        return await send_each(
+            contract_utility, contract.functions.updateCrumbToClosedValidated,
+            crumb_ids, wait=wait)
+
+    return await send_in_chunks(
+        contract_utility,
+        lambda chunk: contract.functions.updateCrumbsToClosedValidated(chunk),
+        list(crumb_ids),
+        wait=wait)
 
 
 async def get_crumb(
     address: str,
     crumb_id: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    crumb_index: Optional["CrumbIndex"] = None,
+    max_staleness: Optional[float] = None
 ) -> Crumb:
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if crumb_index is not None:
+        await crumb_index.ensure_fresh(
+            address, contract_utility, max_staleness)
+        indexed_crumb = crumb_index.crumb(address, crumb_id)
+        if indexed_crumb is not None:
+            return indexed_crumb
+
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
 
     crumb = await contract.functions.getCrumb(crumb_id).call()
     print(f"Crumb: {crumb}")
     return Crumb.from_tuple(crumb)
 
 
-async def get_crumb_count(address: str, network_name: Optional[str] = "sapphire-testnet"):
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+async def get_crumb_count(
+    address: str,
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None
+):
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
 
     count: int = await contract.functions.getCrumbCount().call()
     print(f"Number of crumbs: {count}")
@@ -145,13 +402,23 @@ async def get_crumb_count(address: str, network_name: Optional[str] = "sapphire-
 async def get_crumbs_by_status(
     address: str,
     status: int,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    crumb_index: Optional["CrumbIndex"] = None,
+    max_staleness: Optional[float] = None
 ) -> list[Crumb]:
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
-
-    crumbs: list[tuple[Any]] = await contract.functions.getCrumbsByStatus(status).call()
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if crumb_index is not None:
+        await crumb_index.ensure_fresh(
+            address, contract_utility, max_staleness)
+        return crumb_index.crumbs_by_status(address, status)
+
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
+
+    crumbs: list[tuple[Any]] = \
+        await contract.functions.getCrumbsByStatus(status).call()
     print(f"Crumbs by status {status}: {crumbs}")
 
     return [Crumb.from_tuple(crumb) for crumb in crumbs]
@@ -159,11 +426,20 @@ async def get_crumbs_by_status(
 
 async def get_all_crumbs(
     address: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    crumb_index: Optional["CrumbIndex"] = None,
+    max_staleness: Optional[float] = None
 ) -> list[Crumb]:
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if crumb_index is not None:
+        await crumb_index.ensure_fresh(
+            address, contract_utility, max_staleness)
+        return crumb_index.all_crumbs(address)
+
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
 
     crumbs = await contract.functions.getAllCrumbs().call()
     print(f"All crumbs: {crumbs}")
@@ -173,16 +449,148 @@ async def get_all_crumbs(
 
 async def get_crumbs_by_requester(
     address: str,
-    network_name: Optional[str] = "sapphire-testnet"
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None,
+    crumb_index: Optional["CrumbIndex"] = None,
+    max_staleness: Optional[float] = None
 ) -> list[Crumb]:
     from src.ContractUtility import ContractUtility
-    from src.utils import get_contract
+    from src.utils import get_contract_instance
 
-    contract_utility = ContractUtility(network_name)
-    abi, _ = get_contract("SubContract")
-    contract = contract_utility.w3.eth.contract(address=address, abi=abi)
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if crumb_index is not None:
+        await crumb_index.ensure_fresh(
+            address, contract_utility, max_staleness)
+        return crumb_index.crumbs_by_assignee(
+            address, contract_utility.w3.eth.default_account)
+
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
 
     crumbs = await contract.functions.getCrumbsByRequester().call()
     print(f"Crumbs by requester: {crumbs}")
 
     return [Crumb.from_tuple(crumb) for crumb in crumbs]
+
+
+async def iter_crumb_pages(
+    address: str,
+    status: Optional[int] = None,
+    requester: bool = False,
+    headers: bool = False,
+    page_size: int = CRUMB_PAGE_SIZE,
+    concurrency: int = PAGE_CONCURRENCY,
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None
+) -> AsyncIterator[list[Crumb] | list[CrumbHeader]]:
+    """Yields the crumbs of a sub-contract one page at a time, in order:
+    all of them, those with a status, or those assigned to the caller.
+    With headers, CrumbHeader pages are read instead of full crumbs.
+
+    Pages come from the offset/limit getters, so no single eth_call
+    returns more than page_size crumbs. Up to concurrency pages are
+    requested ahead of the one being consumed. Contracts deployed before
+    the paged getters are read with their unpaged getter, and the result
+    is split into pages locally."""
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", address)
+    functions = contract.functions
+    if not await has_function(contract, "getCrumbsPage", 0, 0):
+        if status is not None:
+            call = functions.getCrumbsByStatus(status)
+        elif requester:
+            call = functions.getCrumbsByRequester()
+        else:
+            call = functions.getAllCrumbs()
+        crumbs = [Crumb.from_tuple(crumb) for crumb in await call.call()]
+        if headers:
+            crumbs = [CrumbHeader.from_crumb(crumb) for crumb in crumbs]
+        for offset in range(0, len(crumbs), page_size):
+            yield crumbs[offset:offset + page_size]
+        return
+
+    kind = "CrumbHeaders" if headers else "Crumbs"
+    convert = CrumbHeader.from_tuple if headers else Crumb.from_tuple
+
+    if status is not None:
+        count = await functions.getCrumbCountByStatus(status).call()
+        getter = functions[f"get{kind}ByStatusPage"]
+
+        def page(offset):
+            return getter(status, offset, page_size)
+    elif requester:
+        count = await functions.getCrumbCountByRequester().call()
+        getter = functions[f"get{kind}ByRequesterPage"]
+
+        def page(offset):
+            return getter(offset, page_size)
+    else:
+        count = await functions.getCrumbCount().call()
+        getter = functions[f"get{kind}Page"]
+
+        def page(offset):
+            return getter(offset, page_size)
+
+    async for crumbs in iter_pages(
+            count, page_size, lambda offset: page(offset).call(),
+            concurrency):
+        yield [convert(crumb) for crumb in crumbs]
+
+
+async def get_crumb_updates(
+    addresses: list[str],
+    from_block: int,
+    to_block: int,
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None
+) -> list[CrumbUpdate]:
+    """Returns the CrumbUpdated events emitted by any of the given
+    sub-contracts between from_block and to_block (inclusive), using a
+    single eth_getLogs call."""
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    if not addresses:
+        return []
+
+    logs = await contract_utility.w3.eth.get_logs({
+        "address": addresses,
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "topics": [crumb_event_topic("CrumbUpdated")],
+    })
+    return [decode_crumb_update(log, contract_utility) for log in logs]
+
+
+async def get_touched_crumb_ids(
+    address: str,
+    from_block: int,
+    to_block: int,
+    network_name: Optional[str] = "sapphire-testnet",
+    contract_utility: Optional[ContractUtility] = None
+) -> set[bytes]:
+    """Returns the ids of the crumbs added or updated on a sub-contract
+    between from_block and to_block (inclusive)."""
+    contract_utility = (
+        contract_utility or ContractUtility.get_pooled(network_name))
+    logs = await contract_utility.w3.eth.get_logs({
+        "address": address,
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "topics": [[crumb_event_topic("CrumbAdded"),
+                    crumb_event_topic("CrumbUpdated")]],
+    })
+    # Both events index the bytes16 crumb id as their first topic
+    return {bytes(log["topics"][1][:16]) for log in logs}
+
+
+def decode_crumb_update(
+    log,
+    contract_utility: ContractUtility
+) -> CrumbUpdate:
+    contract = get_contract_instance(
+        contract_utility.w3, "SubContract", log["address"])
+    return CrumbUpdate.from_event(
+        contract.events.CrumbUpdated().process_log(log))
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from web3.exceptions import ContractLogicError, TransactionNotFound
+
+GAS_PRICE_TTL = 5  # Seconds a fetched gas price is reused
+MAX_IN_FLIGHT = 16  # Unconfirmed transactions per account
+RECEIPT_POLL_INTERVAL = 1  # Seconds between receipt polling passes
+STUCK_AFTER = 60  # Seconds without a receipt before the gas price is bumped
+GAS_BUMP_PERCENT = 15  # Nodes require at least +10% to replace a transaction
+
+
+@dataclass
+class PendingTransaction:
+    function: object  # Contract function or constructor, has .transact
+    params: dict
+    nonce: int
+    gas_price: int
+    label: str
+    future: asyncio.Future
+    hashes: list = field(default_factory=list)  # Original and replacements
+    sent_at: float = 0
+
+
+class TransactionManager:
+    """
+    Pipelined transaction sender for one account.
+
+    Nonces are assigned locally, so several transactions can be in flight
+    at once instead of one per block. The gas price is cached for
+    gas_price_ttl seconds. A single background task polls the receipts of
+    every pending transaction in one pass and resolves the future
+    returned by send, or fails it with a ContractLogicError when the
+    transaction reverted. A transaction left unconfirmed for stuck_after
+    seconds is replaced with the same nonce and a bumped gas price.
+
+    :param w3: Client whose default account signs the transactions
+    :param gas_price_ttl: Seconds a fetched gas price is reused
+    :param max_in_flight: Unconfirmed transactions allowed at once
+    :param poll_interval: Seconds between receipt polling passes
+    :param stuck_after: Seconds before a transaction is replaced
+    :param bump_percent: Gas price increase of a replacement
+    """
+
+    def __init__(self,
+                 w3,
+                 gas_price_ttl: float = GAS_PRICE_TTL,
+                 max_in_flight: int = MAX_IN_FLIGHT,
+                 poll_interval: float = RECEIPT_POLL_INTERVAL,
+                 stuck_after: float = STUCK_AFTER,
+                 bump_percent: int = GAS_BUMP_PERCENT):
+        self.w3 = w3
+        self.gas_price_ttl: float = gas_price_ttl
+        self.poll_interval: float = poll_interval
+        self.stuck_after: float = stuck_after
+        self.bump_percent: int = bump_percent
+        self.slots: asyncio.Semaphore = asyncio.Semaphore(max_in_flight)
+        self.nonce_lock: asyncio.Lock = asyncio.Lock()
+        self.nonce: Optional[int] = None
+        self.cached_gas_price: Optional[int] = None
+        self.gas_price_fetched_at: float = 0
+        self.pending: dict[int, PendingTransaction] = {}
+        self.poller: Optional[asyncio.Task] = None
+
+    async def gas_price(self) -> int:
+        now = time.monotonic()
+        if self.cached_gas_price is None or \
+                now - self.gas_price_fetched_at > self.gas_price_ttl:
+            self.cached_gas_price = await self.w3.eth.gas_price
+            self.gas_price_fetched_at = now
+        return self.cached_gas_price
+
+    async def send(self,
+                   function,
+                   params: Optional[dict] = None,
+                   label: Optional[str] = None) -> asyncio.Future:
+        """
+        Signs and sends function.transact(params) with the next local
+        nonce and returns a future resolved with its receipt.
+
+        Waits while max_in_flight transactions are unconfirmed.
+        """
+        label = label or getattr(function, "fn_name", "transaction")
+        await self.slots.acquire()
+        try:
+            async with self.nonce_lock:
+                if self.nonce is None:
+                    self.nonce = await self.w3.eth.get_transaction_count(
+                        self.w3.eth.default_account, "pending")
+                pending = PendingTransaction(
+                    function=function, params=dict(params or {}),
+                    nonce=self.nonce, gas_price=await self.gas_price(),
+                    label=label,
+                    future=asyncio.get_running_loop().create_future())
+                try:
+                    await self.transact(pending)
+                except Exception:
+                    # The nonce may or may not have been used, ask again
+                    self.nonce = None
+                    raise
+                self.nonce += 1
+        except Exception:
+            self.slots.release()
+            raise
+
+        self.pending[pending.nonce] = pending
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.create_task(self.poll_receipts())
+        return pending.future
+
+    async def transact(self, pending: PendingTransaction):
+        tx_hash = await pending.function.transact({
+            **pending.params,
+            "nonce": pending.nonce,
+            "gasPrice": pending.gas_price,
+        })
+        pending.hashes.append(tx_hash)
+        pending.sent_at = time.monotonic()
+
+    async def receipt(self, tx_hash):
+        try:
+            return await self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+
+    async def poll_receipts(self):
+        while self.pending:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll_pass()
+            except Exception as error:
+                # The futures still wait on this task, keep polling
+                print(f"Polling transaction receipts failed: {error}")
+
+    async def poll_pass(self):
+        pending_transactions = list(self.pending.values())
+        # One pass over every pending hash, replacements included
+        receipts = await asyncio.gather(*(
+            self.receipt(tx_hash)
+            for pending in pending_transactions
+            for tx_hash in pending.hashes
+        ), return_exceptions=True)
+
+        position = 0
+        for pending in pending_transactions:
+            found = receipts[position:position + len(pending.hashes)]
+            position += len(pending.hashes)
+            receipt = next((receipt for receipt in found
+                            if receipt is not None and
+                            not isinstance(receipt, Exception)), None)
+            if receipt is not None:
+                self.resolve(pending, receipt)
+            elif time.monotonic() - pending.sent_at > self.stuck_after:
+                await self.bump(pending)
+
+    def resolve(self, pending: PendingTransaction, receipt):
+        del self.pending[pending.nonce]
+        self.slots.release()
+        tx_hash = receipt["transactionHash"].hex()
+        if not pending.future.done():
+            if receipt["status"] == 0:
+                pending.future.set_exception(ContractLogicError(
+                    f"{pending.label} transaction {tx_hash} reverted"))
+            else:
+                pending.future.set_result(receipt)
+        print(f"{pending.label} transaction: {tx_hash}")
+
+    async def bump(self, pending: PendingTransaction):
+        """Replaces a stuck transaction: same nonce, higher gas price."""
+        bumped = pending.gas_price * (100 + self.bump_percent) // 100
+        try:
+            pending.gas_price = max(bumped, await self.gas_price())
+            print(f"{pending.label} transaction with nonce {pending.nonce} "
+                  f"is stuck, resending with gas price {pending.gas_price}")
+            await self.transact(pending)
+        except Exception as error:
+            # Usually "nonce too low": an earlier hash was just mined
+            print(f"Replacing {pending.label} failed: {error}")
+            pending.sent_at = time.monotonic()
+
+    async def close(self):
+        if self.poller is not None:
+            self.poller.cancel()
+            try:
+                await self.poller
+            except asyncio.CancelledError:
+                pass
+        for pending in self.pending.values():
+            pending.future.cancel()
+        self.pending.clear()
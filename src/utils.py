@@ -1,12 +1,35 @@
 from web3 import Web3, AsyncWeb3
+from web3.exceptions import ABIFunctionNotFound, BadFunctionCallOutput, \
+    ContractLogicError
 from web3.middleware import SignAndSendRawMiddlewareBuilder
 
 from eth_account.signers.local import LocalAccount
 from eth_account import Account
 from sapphirepy import sapphire
+import asyncio
 import json
+import os
+from collections import deque
 from pathlib import Path
-from typing import Union
+from typing import AsyncIterator, Awaitable, Callable, Union
+from weakref import WeakKeyDictionary
+
+COMPILED_CONTRACTS_DIR = (
+    Path(__file__).parent.parent / "compiled_contracts"
+).resolve()
+
+# (abi, bytecode) per artifact path, tagged with the artifact's mtime
+_artifact_cache: dict[Path, tuple[int, tuple[list, str]]] = {}
+# Bound contract objects per client, keyed by (contract name, address)
+_contract_cache: WeakKeyDictionary = WeakKeyDictionary()
+# Whether a deployed contract has a function, per client, keyed by
+# (address, function name)
+_function_cache: WeakKeyDictionary = WeakKeyDictionary()
+
+# Raised by a function missing from the ABI artifact, or from the code
+# deployed at the address (calls to an unknown selector revert)
+MISSING_FUNCTION_ERRORS = (ABIFunctionNotFound, BadFunctionCallOutput,
+                           ContractLogicError)
 
 
 def setup_web3_middleware(
@@ -45,19 +68,137 @@ def process_json_file(filepath, mode="r", data=None):
             json.dump(data, file)
 
 
-def get_contract(contract_name: str):
-    output_path = (
-        Path(__file__).parent.parent
-        / "compiled_contracts"
-        / f"{contract_name}_compiled.json"
-    ).resolve()
-    compiled_contract = process_json_file(output_path)
+def compiled_contract_path(contract_name: str) -> Path:
+    return COMPILED_CONTRACTS_DIR / f"{contract_name}_compiled.json"
+
+
+def abi_artifact_path(contract_name: str) -> Path:
+    return COMPILED_CONTRACTS_DIR / f"{contract_name}_abi.json"
 
+
+def write_abi_artifact(contract_name: str, compiled_contract: dict) -> Path:
+    """
+    Writes the slim ABI-only artifact next to the full compiler output,
+    so loading a contract does not have to parse metadata and source maps.
+    """
     contract_data = compiled_contract["contracts"][f"{contract_name}.sol"][
         contract_name
     ]
-    abi, bytecode = (
-        contract_data["abi"],
-        contract_data["evm"]["bytecode"]["object"]
-        )
+    output_path = abi_artifact_path(contract_name)
+    process_json_file(output_path, mode="w", data={
+        "abi": contract_data["abi"],
+        "bytecode": contract_data["evm"]["bytecode"]["object"],
+    })
+    return output_path
+
+
+def _mtime(path: Path) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_contract(contract_name: str):
+    """
+    Returns the (abi, bytecode) pair of a compiled contract.
+
+    The slim ABI artifact is preferred when it is at least as recent as
+    the full compiler output. Parsed artifacts are cached until the file's
+    mtime changes.
+    """
+    output_path = compiled_contract_path(contract_name)
+    slim_path = abi_artifact_path(contract_name)
+    output_mtime, slim_mtime = _mtime(output_path), _mtime(slim_path)
+    if slim_mtime is not None and (output_mtime is None
+                                   or slim_mtime >= output_mtime):
+        output_path, output_mtime = slim_path, slim_mtime
+
+    cached = _artifact_cache.get(output_path)
+    if cached is not None and cached[0] == output_mtime:
+        return cached[1]
+
+    compiled_contract = process_json_file(output_path)
+    if output_path == slim_path:
+        abi, bytecode = compiled_contract["abi"], compiled_contract["bytecode"]
+    else:
+        contract_data = compiled_contract["contracts"][
+            f"{contract_name}.sol"][contract_name]
+        abi, bytecode = (
+            contract_data["abi"],
+            contract_data["evm"]["bytecode"]["object"]
+            )
+    _artifact_cache[output_path] = (output_mtime, (abi, bytecode))
     return abi, bytecode
+
+
+def get_contract_instance(
+        w3: Union[Web3, AsyncWeb3],
+        contract_name: str,
+        address: str,
+        ):
+    """
+    Returns a contract object bound to address on the given client.
+
+    Contract objects are cached per client and rebuilt whenever the
+    contract's ABI is reloaded.
+    """
+    abi, _ = get_contract(contract_name)
+    per_client = _contract_cache.setdefault(w3, {})
+    cached = per_client.get((contract_name, address))
+    if cached is not None and cached[0] is abi:
+        return cached[1]
+
+    contract = w3.eth.contract(address=address, abi=abi)
+    per_client[(contract_name, address)] = (abi, contract)
+    return contract
+
+
+async def has_function(contract, name: str, *probe_args) -> bool:
+    """
+    Whether a function is both in the contract's ABI and in the code
+    deployed at its address, so callers can fall back to the getters of
+    contracts deployed before it was added.
+
+    The function is called once with probe_args, which must make a call
+    that cannot revert otherwise. The answer is cached per client and
+    address.
+    """
+    per_client = _function_cache.setdefault(contract.w3, {})
+    key = (contract.address, name)
+    if key not in per_client:
+        try:
+            await contract.functions[name](*probe_args).call()
+            per_client[key] = True
+        except MISSING_FUNCTION_ERRORS:
+            per_client[key] = False
+    return per_client[key]
+
+
+async def iter_pages(
+        count: int,
+        page_size: int,
+        fetch_page: Callable[[int], Awaitable[list]],
+        concurrency: int,
+        ) -> AsyncIterator[list]:
+    """
+    Yields fetch_page(offset) for every page of a count items long list,
+    in order, keeping up to concurrency requests in flight ahead of the
+    page being consumed.
+    """
+    offsets = iter(range(0, count, page_size))
+    requested: deque[asyncio.Future] = deque()
+    try:
+        for offset in offsets:
+            requested.append(asyncio.ensure_future(fetch_page(offset)))
+            if len(requested) == concurrency:
+                break
+        while requested:
+            page = await requested.popleft()
+            offset = next(offsets, None)
+            if offset is not None:
+                requested.append(asyncio.ensure_future(fetch_page(offset)))
+            yield page
+    finally:
+        for request in requested:
+            request.cancel()
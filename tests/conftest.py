@@ -3,3 +3,105 @@ import sys
 import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from pathlib import Path
+
+import pytest
+
+from src.ContractUtility import ContractUtility
+from src.TransactionManager import TransactionManager
+
+CONTRACTS_DIR = Path(__file__).parent.parent / "contracts"
+
+
+class EVMContractUtility(ContractUtility):
+    """ContractUtility bound to a local EVM client instead of Sapphire."""
+
+    def __init__(self, w3):
+        self.network_name = "eth-tester"
+        self.w3 = w3
+        self._transactions = TransactionManager(w3, poll_interval=0.01)
+
+
+class LocalEVM:
+    """In-process EVM (eth-tester) with contracts compiled from contracts/.
+
+    The compiled artifacts are written to a temporary directory that
+    src.utils reads from, so the helpers in src/ work against the current
+    Solidity sources rather than the committed artifacts.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self.contract_utility = EVMContractUtility(w3)
+
+    async def deploy(self, contract_name, *args):
+        from src.utils import get_contract
+
+        abi, bytecode = get_contract(contract_name)
+        contract = self.w3.eth.contract(abi=abi, bytecode=bytecode)
+        tx_hash = await contract.constructor(*args).transact()
+        receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        return receipt.contractAddress
+
+    async def transact(self, function):
+        tx_hash = await function.transact()
+        return await self.w3.eth.wait_for_transaction_receipt(tx_hash)
+
+
+@pytest.fixture
+def evm(tmp_path, monkeypatch):
+    pytest.importorskip("eth_tester")
+    solcx = pytest.importorskip("solcx")
+    import src.utils
+
+    versions = solcx.get_installed_solc_versions()
+    if not versions:
+        pytest.skip("No solc compiler installed")
+
+    for source in CONTRACTS_DIR.glob("*.sol"):
+        compiled = solcx.compile_standard({
+            "language": "Solidity",
+            "sources": {source.name: {"content": source.read_text()}},
+            "settings": {"outputSelection": {
+                "*": {"*": ["abi", "evm.bytecode"]}}},
+        }, solc_version=max(versions))
+        for name, contract in compiled["contracts"][source.name].items():
+            src.utils.process_json_file(
+                tmp_path / f"{name}_abi.json", mode="w", data={
+                    "abi": contract["abi"],
+                    "bytecode": contract["evm"]["bytecode"]["object"],
+                })
+    monkeypatch.setattr(src.utils, "COMPILED_CONTRACTS_DIR", tmp_path)
+    return _local_evm()
+
+
+@pytest.fixture
+def legacy_evm():
+    """Local EVM with the committed artifacts, which stand in for
+    contracts deployed before the current Solidity sources. Runs without
+    a solc compiler."""
+    pytest.importorskip("eth_tester")
+    return _local_evm()
+
+
+def _local_evm():
+    from eth_tester.exceptions import TransactionFailed
+    from web3 import AsyncWeb3
+    from web3.exceptions import ContractLogicError
+    from web3.providers.eth_tester import AsyncEthereumTesterProvider
+
+    class RevertingProvider(AsyncEthereumTesterProvider):
+        """Raises ContractLogicError on reverts, like web3 does for the
+        error responses of a node, instead of eth-tester's own
+        TransactionFailed."""
+
+        async def make_request(self, method, params):
+            try:
+                return await super().make_request(method, params)
+            except TransactionFailed as error:
+                raise ContractLogicError(str(error)) from error
+
+    w3 = AsyncWeb3(RevertingProvider())
+    w3.eth.default_account = w3.provider.ethereum_tester.get_accounts()[0]
+    return LocalEVM(w3)
@@ -23,12 +23,25 @@ async def test_contract_utility_init():
         assert util.w3 == mock_middleware.return_value
 
 
+def test_get_pooled_reuses_client():
+    with patch("src.ContractUtility.setup_web3_middleware", side_effect=lambda *_: MagicMock()) as mock_middleware:
+        ContractUtility._pool.clear()
+        first = ContractUtility.get_pooled("sapphire-localnet")
+        second = ContractUtility.get_pooled("sapphire-localnet")
+        other_network = ContractUtility.get_pooled("sapphire-testnet")
+        assert first is second
+        assert other_network is not first
+        assert mock_middleware.call_count == 2
+        ContractUtility._pool.clear()
+
+
 @patch("src.ContractUtility.compile_standard", return_value="compiled_sol")
 @patch("src.ContractUtility.install_solc")
 @patch("builtins.open", new_callable=MagicMock)
 @patch("src.ContractUtility.setup_web3_middleware", return_value={})
+@patch("src.ContractUtility.write_abi_artifact")
 def test_setup_and_compile_contract(
-    mock_middleware, mock_open, mock_install_solc, mock_compile_standard
+    mock_write_abi, mock_middleware, mock_open, mock_install_solc, mock_compile_standard
 ):
     util = ContractUtility("sapphire-localnet")
     contract_name = "MessageBox"
@@ -37,6 +50,7 @@ def test_setup_and_compile_contract(
 
     mock_install_solc.assert_called_once()
     mock_compile_standard.assert_called_once()
+    mock_write_abi.assert_called_once_with(contract_name, "compiled_sol")
 
     assert output == "compiled_sol"
 
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.CrumbIndex import CrumbIndex
+from src.MainContract import ComputeTask, get_in_progress_queue
+from src.SubContract import Crumb, CrumbStatus, get_crumbs_by_requester
+
+SUB_CONTRACT = "0x885cA90bD752A682dD1883614edA0C0557c973a6"
+OUR_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+
+
+def _crumb(number, status=CrumbStatus.NEW, assignee="0x" + "0" * 40):
+    return Crumb(id=bytes([number]) * 16, alias_name=f"crumb-{number}",
+                 price=10 ** 30, status=status, setup_task="{}",
+                 setup_validation="{}", result="", assignee=assignee,
+                 last_updated=number, max_run=60)
+
+
+def _contract_utility(latest_block):
+    contract_utility = MagicMock()
+    contract_utility.w3.eth.default_account = OUR_ADDRESS
+    contract_utility.w3.eth.get_block_number = AsyncMock(
+        return_value=latest_block)
+    return contract_utility
+
+
+def test_index_survives_restart(tmp_path):
+    index = CrumbIndex(tmp_path / "index.sqlite3")
+    index.upsert_crumbs(SUB_CONTRACT, [
+        _crumb(1), _crumb(2, CrumbStatus.QUEUED, OUR_ADDRESS)])
+    index.mark_synced(SUB_CONTRACT, 42)
+    index.close()
+
+    index = CrumbIndex(tmp_path / "index.sqlite3")
+    assert index.synced_block(SUB_CONTRACT) == 42
+    assert index.all_crumbs(SUB_CONTRACT) == [
+        _crumb(1), _crumb(2, CrumbStatus.QUEUED, OUR_ADDRESS)]
+    assert index.crumbs_by_status(SUB_CONTRACT, 1) == [
+        _crumb(2, CrumbStatus.QUEUED, OUR_ADDRESS)]
+    assert index.crumbs_by_assignee(SUB_CONTRACT, OUR_ADDRESS) == [
+        _crumb(2, CrumbStatus.QUEUED, OUR_ADDRESS)]
+    assert index.crumb(SUB_CONTRACT, bytes([3]) * 16) is None
+
+
+@pytest.mark.asyncio
+async def test_sync_loads_once_then_replays_logs(tmp_path):
+    index = CrumbIndex(tmp_path / "index.sqlite3", block_range=10)
+    contract_utility = _contract_utility(latest_block=5)
+
+    with patch("src.CrumbIndex.get_all_crumbs",
+               AsyncMock(return_value=[_crumb(1), _crumb(2)])) as mock_all:
+        await index.sync(SUB_CONTRACT, contract_utility)
+    mock_all.assert_awaited_once()
+
+    contract_utility.w3.eth.get_block_number.return_value = 25
+    touched = {(6, 15): {bytes([2]) * 16}, (16, 25): set()}
+    updated = _crumb(2, CrumbStatus.QUEUED, OUR_ADDRESS)
+    with patch("src.CrumbIndex.get_all_crumbs") as mock_all, \
+            patch("src.CrumbIndex.get_touched_crumb_ids",
+                  AsyncMock(side_effect=lambda _, start, end, **__: touched[(start, end)])), \
+            patch("src.CrumbIndex.get_crumb", AsyncMock(return_value=updated)) as mock_get:
+        await index.sync(SUB_CONTRACT, contract_utility)
+    mock_all.assert_not_called()
+    mock_get.assert_awaited_once()
+    assert index.synced_block(SUB_CONTRACT) == 25
+    assert index.all_crumbs(SUB_CONTRACT) == [_crumb(1), updated]
+
+
+@pytest.mark.asyncio
+async def test_refresh_bounds_concurrent_reads(tmp_path):
+    index = CrumbIndex(tmp_path / "index.sqlite3")
+    reads = {"running": 0, "most": 0}
+
+    async def get_crumb(address, crumb_id, **_):
+        reads["running"] += 1
+        reads["most"] = max(reads["most"], reads["running"])
+        await asyncio.sleep(0.01)
+        reads["running"] -= 1
+        return _crumb(crumb_id[0])
+
+    with patch("src.CrumbIndex.FETCH_CONCURRENCY", 4), \
+            patch("src.CrumbIndex.get_crumb", get_crumb):
+        await index.refresh(
+            SUB_CONTRACT, [bytes([n]) * 16 for n in range(1, 21)],
+            _contract_utility(latest_block=1))
+    assert reads["most"] == 4
+    assert len(index.all_crumbs(SUB_CONTRACT)) == 20
+
+
+@pytest.mark.asyncio
+async def test_helpers_read_from_fresh_index(tmp_path):
+    index = CrumbIndex(tmp_path / "index.sqlite3")
+    contract_utility = _contract_utility(latest_block=5)
+    index.upsert_crumbs(SUB_CONTRACT, [_crumb(1, CrumbStatus.QUEUED, OUR_ADDRESS)])
+    index.mark_synced(SUB_CONTRACT, 5)
+    task = ComputeTask(sender=OUR_ADDRESS, timestamp=1, content="", sum=10 ** 30,
+                       id=7, subContractAddress=SUB_CONTRACT)
+    index.replace_compute_tasks(SUB_CONTRACT, "in_progress", [task])
+
+    with patch("src.SubContract.get_contract_instance") as mock_contract, \
+            patch("src.MainContract.get_contract_instance") as mock_main:
+        crumbs = await get_crumbs_by_requester(
+            SUB_CONTRACT, contract_utility=contract_utility, crumb_index=index)
+        queue = await get_in_progress_queue(
+            SUB_CONTRACT, contract_utility=contract_utility, crumb_index=index)
+    mock_contract.assert_not_called()
+    mock_main.assert_not_called()
+    assert crumbs == [_crumb(1, CrumbStatus.QUEUED, OUR_ADDRESS)]
+    assert queue == [task]
+
+    assert index.compute_tasks(SUB_CONTRACT, "in_progress", max_staleness=-1) is None
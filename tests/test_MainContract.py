@@ -0,0 +1,108 @@
+import pytest
+from web3.exceptions import ContractLogicError
+
+from src.MainContract import get_in_progress_headers, get_request_queue, \
+    iter_queue_pages
+from src.utils import get_contract_instance
+
+
+async def _main_contract(evm, task_count):
+    address = await evm.deploy("MainContract")
+    contract = get_contract_instance(evm.w3, "MainContract", address)
+    for task_id in range(task_count):
+        await evm.transact(contract.functions.addToRequestQueue(
+            f"task-{task_id}", 0, task_id))
+    return address, contract
+
+
+@pytest.mark.asyncio
+async def test_moves_tasks_between_queues_by_id(evm):
+    address, contract = await _main_contract(evm, 5)
+    sub_contract = evm.w3.eth.default_account
+    for task_id in (0, 3, 4):
+        await evm.transact(
+            contract.functions.moveToInProgressQueue(task_id, sub_contract))
+    await evm.transact(contract.functions.moveToCompletedQueue(3))
+
+    request_queue = await get_request_queue(
+        address, contract_utility=evm.contract_utility)
+    assert sorted(task.id for task in request_queue) == [1, 2]
+    headers = await get_in_progress_headers(
+        address, contract_utility=evm.contract_utility)
+    assert sorted(header.id for header in headers) == [0, 4]
+    assert {header.subContractAddress for header in headers} == {sub_contract}
+
+    # Swap-and-pop must keep the moved tasks findable
+    await evm.transact(contract.functions.moveToCompletedQueue(4))
+    await evm.transact(contract.functions.moveToCompletedQueue(0))
+    assert await contract.functions.getInProgressQueueLength().call() == 0
+
+    with pytest.raises(ContractLogicError):
+        await evm.transact(contract.functions.moveToCompletedQueue(4))
+    with pytest.raises(ContractLogicError):
+        await evm.transact(
+            contract.functions.addToRequestQueue("again", 0, 1))
+
+
+@pytest.mark.asyncio
+async def test_streams_queue_pages(evm):
+    address, _ = await _main_contract(evm, 7)
+
+    pages = [page async for page in iter_queue_pages(
+        address, "request", page_size=3, concurrency=2,
+        contract_utility=evm.contract_utility)]
+    assert [[task.id for task in page] for page in pages] == \
+        [[0, 1, 2], [3, 4, 5], [6]]
+    assert pages[0][0].content == "task-0"
+
+    headers = [page async for page in iter_queue_pages(
+        address, "request", headers=True, page_size=5,
+        contract_utility=evm.contract_utility)]
+    assert [len(page) for page in headers] == [5, 2]
+
+
+@pytest.mark.asyncio
+async def test_reads_contracts_deployed_before_the_paged_getters(legacy_evm):
+    address = await legacy_evm.deploy("MainContract")
+    contract = get_contract_instance(legacy_evm.w3, "MainContract", address)
+    for task_id in range(5):
+        await legacy_evm.transact(contract.functions.addToRequestQueue(
+            f"task-{task_id}", 0, task_id))
+    await legacy_evm.transact(contract.functions.moveToInProgressQueue(
+        3, legacy_evm.w3.eth.default_account))
+
+    pages = [page async for page in iter_queue_pages(
+        address, "request", page_size=2,
+        contract_utility=legacy_evm.contract_utility)]
+    assert [len(page) for page in pages] == [2, 2]
+    request_queue = await get_request_queue(
+        address, contract_utility=legacy_evm.contract_utility)
+    assert sorted(task.id for task in request_queue) == [0, 1, 2, 4]
+
+    headers = await get_in_progress_headers(
+        address, contract_utility=legacy_evm.contract_utility)
+    assert [(header.id, header.subContractAddress) for header in headers] \
+        == [(3, legacy_evm.w3.eth.default_account)]
+
+
+@pytest.mark.asyncio
+async def test_paged_getters_missing_from_the_deployed_code(
+        legacy_evm, monkeypatch):
+    # A regenerated ABI pointed at a contract deployed before the change
+    import src.utils
+    address = await legacy_evm.deploy("MainContract")
+    abi, bytecode = src.utils.get_contract("MainContract")
+    page_abi = {"type": "function", "name": "getRequestQueuePage",
+                "stateMutability": "view",
+                "inputs": [{"name": "_offset", "type": "uint256"},
+                           {"name": "_limit", "type": "uint256"}],
+                "outputs": [{"name": "", "type": "uint256[]"}]}
+    monkeypatch.setattr(src.utils, "get_contract",
+                        lambda name: (abi + [page_abi], bytecode))
+    contract = get_contract_instance(legacy_evm.w3, "MainContract", address)
+    await legacy_evm.transact(
+        contract.functions.addToRequestQueue("task", 0, 7))
+
+    request_queue = await get_request_queue(
+        address, contract_utility=legacy_evm.contract_utility)
+    assert [task.id for task in request_queue] == [7]
@@ -0,0 +1,193 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from eth_utils.abi import get_abi_output_types
+from web3 import AsyncWeb3
+from web3.exceptions import ContractLogicError
+
+from src.Multicall import MulticallBatcher, encode_call
+from src.SubContract import CrumbStatus
+from src.utils import get_contract_instance
+
+ASSIGNEE = "0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf"
+SUB_CONTRACTS = [f"0x{str(n) * 40}" for n in range(1, 4)]
+
+
+def _crumb_tuple(number):
+    return (bytes([number]) * 16, "crumb", 0, CrumbStatus.QUEUED.value,
+            "{}", "{}", "", ASSIGNEE.lower(), 0, 60)
+
+
+class FakeBatcher(MulticallBatcher):
+    """Answers aggregated calls locally and records each batch."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    async def aggregate(self, calls):
+        self.batches.append(len(calls))
+        results = []
+        for function, _, _ in calls:
+            assert encode_call(function)[:4].hex() == function.selector[2:]
+            if function.address == SUB_CONTRACTS[2]:
+                results.append((False, b""))
+                continue
+            output_types = get_abi_output_types(function.abi)
+            crumbs = [_crumb_tuple(SUB_CONTRACTS.index(function.address))]
+            results.append(
+                (True, function.w3.codec.encode(output_types, [crumbs])))
+        return results
+
+
+@pytest.fixture
+def batcher():
+    w3 = AsyncWeb3()
+    return FakeBatcher(SimpleNamespace(w3=w3), "0x" + "f" * 40,
+                       window=0.01, max_calls=10)
+
+
+@pytest.mark.asyncio
+async def test_batch_sends_one_aggregated_call(batcher):
+    async with batcher.batch():
+        futures = [batcher.crumbs_by_status(address, 1)
+                   for address in SUB_CONTRACTS]
+        await asyncio.sleep(0.05)
+        assert batcher.batches == []
+
+    assert batcher.batches == [3]
+    crumbs = futures[1].result()
+    assert crumbs[0].id == bytes([1]) * 16
+    # Addresses are checksummed like a regular call() would
+    assert crumbs[0].assignee == ASSIGNEE
+    assert isinstance(futures[2].exception(), ContractLogicError)
+
+
+@pytest.mark.asyncio
+async def test_calls_in_a_window_share_a_round_trip(batcher):
+    results = await asyncio.gather(*(
+        batcher.crumbs_by_status(address, 1)
+        for address in SUB_CONTRACTS[:2]))
+    assert batcher.batches == [2]
+    assert [crumbs[0].id[0] for crumbs in results] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_large_batches_are_split(batcher):
+    async with batcher.batch():
+        futures = [batcher.crumbs_by_status(SUB_CONTRACTS[0], 1)
+                   for _ in range(25)]
+    assert batcher.batches == [10, 10, 5]
+    assert all(future.done() for future in futures)
+
+
+@pytest.mark.asyncio
+async def test_full_batches_flush_without_waiting_for_the_window(batcher):
+    futures = [batcher.crumbs_by_status(SUB_CONTRACTS[0], 1)
+               for _ in range(10)]
+    # The flush started by the tenth call is held until it finishes
+    assert len(batcher.flushing) == 1
+    await asyncio.gather(*futures)
+    assert batcher.batches == [10]
+
+
+@pytest.mark.asyncio
+async def test_aggregates_on_a_local_evm(evm):
+    multicall = await evm.deploy("Multicall")
+    address = await evm.deploy(
+        "SubContract", "request", evm.w3.eth.default_account, b"\x00" * 21)
+    contract = get_contract_instance(evm.w3, "SubContract", address)
+    await evm.transact(contract.functions.addCrumb(
+        b"\x01" * 16, "crumb", 5, "{}", "{}", 60))
+
+    batcher = MulticallBatcher(evm.contract_utility, multicall)
+    async with batcher.batch():
+        count = batcher.crumb_count(address)
+        crumb = batcher.crumb(address, b"\x01" * 16)
+        missing = batcher.crumb(address, b"\x02" * 16)
+
+    assert count.result() == 1
+    assert crumb.result().price == 5
+    assert isinstance(missing.exception(), ContractLogicError)
+
+
+# ABI of contracts/Multicall.sol, for checking the calldata aggregate()
+# sends without a compiled artifact
+MULTICALL_ABI = [{
+    "type": "function", "name": "aggregate", "stateMutability": "view",
+    "inputs": [{"name": "_calls", "type": "tuple[]", "components": [
+        {"name": "target", "type": "address"},
+        {"name": "callData", "type": "bytes"}]}],
+    "outputs": [
+        {"name": "blockNumber", "type": "uint256"},
+        {"name": "results", "type": "tuple[]", "components": [
+            {"name": "success", "type": "bool"},
+            {"name": "returnData", "type": "bytes"}]}],
+}]
+MULTICALL_ADDRESS = "0x" + "c" * 40
+
+
+def _answer_multicalls(w3, monkeypatch):
+    """Answers eth_calls to MULTICALL_ADDRESS like Multicall.aggregate:
+    the calldata is decoded with the Solidity signature and every call is
+    run on the local EVM."""
+    from eth_abi import decode, encode
+    from eth_utils import keccak, to_checksum_address
+
+    provider = w3.provider
+    make_request = provider.make_request
+    selector = keccak(text="aggregate((address,bytes)[])")[:4]
+
+    async def answer(method, params):
+        if method != "eth_call" or \
+                params[0].get("to", "").lower() != MULTICALL_ADDRESS:
+            return await make_request(method, params)
+        data = bytes.fromhex(params[0]["data"][2:])
+        assert data[:4] == selector
+        (calls,) = decode(["(address,bytes)[]"], data[4:])
+        results = []
+        for target, call_data in calls:
+            try:
+                returned = await w3.eth.call({
+                    "to": to_checksum_address(target), "data": call_data})
+                results.append((True, bytes(returned)))
+            except ContractLogicError:
+                results.append((False, b""))
+        block_number = await w3.eth.block_number
+        return {"jsonrpc": "2.0", "id": 0, "result": "0x" + encode(
+            ["uint256", "(bool,bytes)[]"], [block_number, results]).hex()}
+
+    monkeypatch.setattr(provider, "make_request", answer)
+
+
+@pytest.mark.asyncio
+async def test_aggregate_follows_the_multicall_abi(legacy_evm, monkeypatch):
+    import src.utils
+    # Before the first request, web3 caches the provider's request function
+    _answer_multicalls(legacy_evm.w3, monkeypatch)
+    address = await legacy_evm.deploy(
+        "SubContract", "request", legacy_evm.w3.eth.default_account,
+        b"\x00" * 21)
+    contract = get_contract_instance(legacy_evm.w3, "SubContract", address)
+    await legacy_evm.transact(contract.functions.addCrumb(
+        b"\x01" * 16, "crumb", 5, "{}", "{}", 60))
+
+    get_contract = src.utils.get_contract
+    monkeypatch.setattr(src.utils, "get_contract", lambda name: (
+        (MULTICALL_ABI, "") if name == "Multicall" else get_contract(name)))
+
+    batcher = MulticallBatcher(legacy_evm.contract_utility,
+                               AsyncWeb3.to_checksum_address(
+                                   MULTICALL_ADDRESS))
+    async with batcher.batch():
+        count = batcher.crumb_count(address)
+        crumb = batcher.crumb(address, b"\x01" * 16)
+        missing = batcher.crumb(address, b"\x02" * 16)
+        queued = batcher.crumbs_by_status(address, CrumbStatus.NEW.value)
+
+    assert count.result() == 1
+    assert crumb.result().price == 5
+    assert crumb.result().assignee == \
+        "0x0000000000000000000000000000000000000000"
+    assert isinstance(missing.exception(), ContractLogicError)
+    assert [crumb.id for crumb in queued.result()] == [b"\x01" * 16]
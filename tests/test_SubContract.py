@@ -0,0 +1,210 @@
+import asyncio
+import pytest
+from web3.exceptions import ContractLogicError
+
+from src.SubContract import Crumb, CrumbHeader, CrumbStatus, add_crumbs, \
+    get_crumb, \
+    iter_crumb_pages, send_in_chunks, update_crumbs_to_closed_validated, \
+    update_crumbs_to_queued
+from src.utils import get_contract_instance
+
+
+def _id(number):
+    return bytes([number]) * 16
+
+
+async def _sub_contract(evm, crumb_count):
+    address = await evm.deploy(
+        "SubContract", "request", evm.w3.eth.default_account, b"\x00" * 21)
+    contract = get_contract_instance(evm.w3, "SubContract", address)
+    for number in range(crumb_count):
+        await evm.transact(contract.functions.addCrumb(
+            _id(number), f"crumb-{number}", number, "{}", "{}", 60))
+    return address, contract
+
+
+def test_setup_validation_is_parsed_once():
+    crumb = Crumb.from_tuple((_id(1), "crumb", 0, 1, "{}",
+                              '{"tolerance": 0.1}', "", "0x0", 0, 60))
+    assert crumb.setup_validation == '{"tolerance": 0.1}'
+    assert crumb.validation == {"tolerance": 0.1}
+    assert crumb.validation is crumb.validation
+    assert Crumb.from_tuple((_id(1), "crumb", 0, 1, "{}", "", "", "0x0", 0,
+                             60)).validation == {}
+
+
+async def _collect(address, evm, **kwargs):
+    pages = []
+    async for page in iter_crumb_pages(
+            address, contract_utility=evm.contract_utility, **kwargs):
+        pages.append([crumb.id for crumb in page])
+    return pages
+
+
+@pytest.mark.asyncio
+async def test_crumbs_are_found_by_id_and_status(evm):
+    address, contract = await _sub_contract(evm, 7)
+    for number in (1, 3, 5):
+        await evm.transact(contract.functions.updateCrumbToQueued(_id(number)))
+    await evm.transact(contract.functions.updateCrumbToClosed(_id(3), "done"))
+
+    crumb = await get_crumb(address, _id(3),
+                            contract_utility=evm.contract_utility)
+    assert crumb.status == CrumbStatus.CLOSED
+    assert crumb.result == "done"
+    assert crumb.assignee == evm.w3.eth.default_account
+
+    functions = contract.functions
+    assert await functions.getCrumbCountByStatus(0).call() == 4
+    assert await functions.getCrumbCountByStatus(1).call() == 2
+    assert await functions.getCrumbCountByStatus(2).call() == 1
+    assert await functions.getCrumbCountByRequester().call() == 3
+    assert {crumb[0] for crumb in await functions.getCrumbsByStatus(1).call()} \
+        == {_id(1), _id(5)}
+
+    with pytest.raises(ContractLogicError):
+        await functions.getCrumb(_id(99)).call()
+    with pytest.raises(ContractLogicError):
+        await evm.transact(functions.addCrumb(_id(0), "again", 0, "", "", 0))
+
+
+@pytest.mark.asyncio
+async def test_iterates_pages_in_order(evm):
+    address, contract = await _sub_contract(evm, 7)
+    for number in (0, 2, 4, 6):
+        await evm.transact(contract.functions.updateCrumbToQueued(_id(number)))
+
+    assert await _collect(address, evm, page_size=3, concurrency=2) == [
+        [_id(0), _id(1), _id(2)], [_id(3), _id(4), _id(5)], [_id(6)]]
+
+    queued = await _collect(address, evm, status=1, page_size=3)
+    assert [len(page) for page in queued] == [3, 1]
+    assert sorted(sum(queued, [])) == [_id(0), _id(2), _id(4), _id(6)]
+
+    assigned = await _collect(address, evm, requester=True, page_size=10)
+    assert sorted(sum(assigned, [])) == [_id(0), _id(2), _id(4), _id(6)]
+
+    assert await _collect(address, evm, status=3) == []
+
+
+@pytest.mark.asyncio
+async def test_header_pages_match_the_crumbs(evm):
+    address, contract = await _sub_contract(evm, 5)
+    await evm.transact(contract.functions.updateCrumbToQueued(_id(2)))
+
+    pages = []
+    async for page in iter_crumb_pages(
+            address, status=1, headers=True, page_size=2,
+            contract_utility=evm.contract_utility):
+        pages.append(page)
+    assert pages == [[CrumbHeader(
+        _id(2), CrumbStatus.QUEUED, 2, evm.w3.eth.default_account,
+        pages[0][0].last_updated, 60)]]
+    assert not hasattr(pages[0][0], "__dict__")
+
+
+class _FakeBatchFunction:
+    fn_name = "addCrumbs"
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+
+    async def estimate_gas(self):
+        return 21_000 + 50_000 * len(self.chunk)
+
+
+class _FakeContractUtility:
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.futures = []
+        self.fail_after = fail_after
+
+    async def send_transaction(self, function, params, wait, label):
+        if len(self.sent) == self.fail_after:
+            raise ConnectionError("node unreachable")
+        self.sent.append((function.chunk, params["gas"]))
+        future = asyncio.get_running_loop().create_future()
+        # Mined a little later
+        asyncio.get_running_loop().call_later(
+            0.05, future.set_result, len(function.chunk))
+        self.futures.append(future)
+        return future
+
+
+@pytest.mark.asyncio
+async def test_batch_writes_are_split_by_gas():
+    contract_utility = _FakeContractUtility()
+    items = list(range(45))
+
+    receipts = await send_in_chunks(
+        contract_utility, _FakeBatchFunction, items,
+        batch_size=40, gas_limit=1_000_000)
+
+    chunks = [chunk for chunk, _ in contract_utility.sent]
+    assert sum(chunks, []) == items
+    assert all(21_000 + 50_000 * len(chunk) <= 1_000_000 for chunk in chunks)
+    assert all(gas <= 1_000_000 for _, gas in contract_utility.sent)
+    # 40 is over the limit and halved, then the size follows the gas used
+    assert [len(chunk) for chunk in chunks] == [10, 19, 16]
+    assert receipts == [10, 19, 16]
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_waits_for_the_chunks_sent():
+    contract_utility = _FakeContractUtility(fail_after=2)
+
+    with pytest.raises(ConnectionError):
+        await send_in_chunks(
+            contract_utility, _FakeBatchFunction, list(range(45)),
+            batch_size=10, gas_limit=1_000_000)
+    assert len(contract_utility.futures) == 2
+    assert all(future.done() for future in contract_utility.futures)
+
+
+@pytest.mark.asyncio
+async def test_batch_writes_on_a_local_evm(evm):
+    address, contract = await _sub_contract(evm, 0)
+    crumbs = [(_id(n), f"crumb-{n}", n, "{}", "{}", 60) for n in range(30)]
+
+    await add_crumbs(address, crumbs, contract_utility=evm.contract_utility)
+    await update_crumbs_to_queued(address, [_id(n) for n in range(10)],
+                                  contract_utility=evm.contract_utility)
+    await update_crumbs_to_closed_validated(
+        address, [_id(n) for n in range(5)],
+        contract_utility=evm.contract_utility)
+
+    functions = contract.functions
+    assert await functions.getCrumbCount().call() == 30
+    assert await functions.getCrumbCountByStatus(1).call() == 5
+    assert await functions.getCrumbCountByStatus(3).call() == 5
+
+
+@pytest.mark.asyncio
+async def test_contracts_deployed_before_the_paged_getters(legacy_evm):
+    address = await legacy_evm.deploy(
+        "SubContract", "request", legacy_evm.w3.eth.default_account,
+        b"\x00" * 21)
+    contract_utility = legacy_evm.contract_utility
+    crumbs = [(_id(n), f"crumb-{n}", n, "{}", "{}", 60) for n in range(5)]
+
+    await add_crumbs(address, crumbs, contract_utility=contract_utility)
+    await update_crumbs_to_queued(address, [_id(1), _id(3), _id(4)],
+                                  contract_utility=contract_utility)
+    await update_crumbs_to_closed_validated(
+        address, [_id(4)], contract_utility=contract_utility)
+
+    assert await _collect(address, legacy_evm, page_size=2) == [
+        [_id(0), _id(1)], [_id(2), _id(3)], [_id(4)]]
+    assert await _collect(address, legacy_evm, status=1) == [
+        [_id(1), _id(3)]]
+    assert await _collect(address, legacy_evm, requester=True) == [
+        [_id(1), _id(3), _id(4)]]
+
+    pages = []
+    async for page in iter_crumb_pages(
+            address, status=3, headers=True,
+            contract_utility=contract_utility):
+        pages.append(page)
+    assert pages == [[CrumbHeader(
+        _id(4), CrumbStatus.CLOSED_VALIDATED, 4,
+        legacy_evm.w3.eth.default_account, pages[0][0].last_updated, 60)]]
@@ -0,0 +1,140 @@
+import asyncio
+import pytest
+from web3.exceptions import ContractLogicError, TransactionNotFound
+
+from src.TransactionManager import TransactionManager
+
+
+class FakeEth:
+    default_account = "0xabc"
+
+    def __init__(self, mined_after=1):
+        self.gas_price_calls = 0
+        self.sent = []  # (hash, params)
+        self.receipt_polls = 0
+        self.mined_after = mined_after
+        self.blocked = set()  # hashes that never get mined
+        self.reverted = set()  # hashes mined with status 0
+        self.gas_price_error = None
+
+    @property
+    async def gas_price(self):
+        self.gas_price_calls += 1
+        if self.gas_price_error is not None:
+            raise self.gas_price_error
+        return 100
+
+    async def get_transaction_count(self, account, block_identifier):
+        return 7
+
+    async def get_transaction_receipt(self, tx_hash):
+        self.receipt_polls += 1
+        if tx_hash in self.blocked or self.receipt_polls < self.mined_after:
+            raise TransactionNotFound("pending")
+        return {"transactionHash": tx_hash,
+                "status": 0 if tx_hash in self.reverted else 1}
+
+
+class FakeWeb3:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+class FakeFunction:
+    fn_name = "updateCrumbToClosed"
+
+    def __init__(self, eth):
+        self.eth = eth
+
+    async def transact(self, params):
+        tx_hash = bytes([len(self.eth.sent)]) * 32
+        self.eth.sent.append((tx_hash, params))
+        return tx_hash
+
+
+@pytest.mark.asyncio
+async def test_pipelines_transactions_with_local_nonces():
+    eth = FakeEth()
+    manager = TransactionManager(FakeWeb3(eth), poll_interval=0.01)
+
+    futures = [await manager.send(FakeFunction(eth), {"value": 1})
+               for _ in range(5)]
+    # Everything is sent before any receipt is known
+    assert [params["nonce"] for _, params in eth.sent] == [7, 8, 9, 10, 11]
+    assert all(params["value"] == 1 for _, params in eth.sent)
+    assert eth.gas_price_calls == 1
+
+    receipts = await asyncio.wait_for(asyncio.gather(*futures), 1)
+    assert [receipt["transactionHash"] for receipt in receipts] == \
+        [tx_hash for tx_hash, _ in eth.sent]
+    assert not manager.pending
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_bumps_stuck_transactions():
+    eth = FakeEth()
+    manager = TransactionManager(FakeWeb3(eth), poll_interval=0.01,
+                                 stuck_after=0.02, bump_percent=20)
+    eth.blocked.add(bytes([0]) * 32)
+
+    future = await manager.send(FakeFunction(eth))
+    receipt = await asyncio.wait_for(future, 1)
+
+    (_, original), (replacement_hash, replacement) = eth.sent
+    assert replacement["nonce"] == original["nonce"]
+    assert replacement["gasPrice"] == 120
+    assert receipt["transactionHash"] == replacement_hash
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_limits_transactions_in_flight():
+    eth = FakeEth(mined_after=10 ** 9)
+    manager = TransactionManager(FakeWeb3(eth), max_in_flight=2,
+                                 poll_interval=0.01, stuck_after=60)
+
+    await manager.send(FakeFunction(eth))
+    await manager.send(FakeFunction(eth))
+    third = asyncio.create_task(manager.send(FakeFunction(eth)))
+    await asyncio.sleep(0.05)
+    assert not third.done()
+
+    eth.mined_after = 0
+    await asyncio.wait_for(third, 1)
+    assert len(eth.sent) == 3
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_reverted_transactions_fail_their_future():
+    eth = FakeEth()
+    manager = TransactionManager(FakeWeb3(eth), poll_interval=0.01)
+    eth.reverted.add(bytes([0]) * 32)
+
+    reverted = await manager.send(FakeFunction(eth))
+    mined = await manager.send(FakeFunction(eth))
+    with pytest.raises(ContractLogicError, match="reverted"):
+        await asyncio.wait_for(reverted, 1)
+    assert (await asyncio.wait_for(mined, 1))["status"] == 1
+    assert not manager.pending
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_gas_price_keeps_the_poller_running():
+    eth = FakeEth()
+    manager = TransactionManager(FakeWeb3(eth), gas_price_ttl=0,
+                                 poll_interval=0.01, stuck_after=0.02)
+    eth.blocked.add(bytes([0]) * 32)
+
+    future = await manager.send(FakeFunction(eth))
+    eth.gas_price_error = ConnectionError("node unreachable")
+    await asyncio.sleep(0.1)
+    assert not manager.poller.done()
+    assert len(eth.sent) == 1
+
+    eth.gas_price_error = None
+    receipt = await asyncio.wait_for(future, 1)
+    assert receipt["transactionHash"] == eth.sent[-1][0]
+    await manager.close()
@@ -0,0 +1,90 @@
+import json
+import pytest
+from pathlib import Path
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("peft")
+pytest.importorskip("safetensors")
+
+from core.adapter import AdapterSettings, adapter_settings, \
+    adapter_state_dict, base_model_digest
+from core.artifact_store import LocalArtifactStore
+from core.result_codec import load_model_weights, store_model
+
+
+def _model():
+    torch.manual_seed(0)
+    config = transformers.BertConfig(
+        vocab_size=100, hidden_size=32, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=64, num_labels=3)
+    return transformers.BertForSequenceClassification(config).eval()
+
+
+def test_fine_tuning_modes():
+    assert adapter_settings() is None
+    assert adapter_settings("full") is None
+    assert adapter_settings("adapter").r == 8
+    assert adapter_settings(
+        "adapter", {"r": 4, "target_modules": ["query"]}) == \
+        AdapterSettings(r=4, target_modules=("query",))
+    with pytest.raises(ValueError):
+        adapter_settings("prefix")
+    with pytest.raises(ValueError):
+        adapter_settings("adapter", {"rank": 4})
+
+
+def test_only_adapters_and_head_are_trained():
+    model = AdapterSettings(r=2).wrap(_model())
+    trainable = {name for name, parameter in model.named_parameters()
+                 if parameter.requires_grad}
+    assert trainable
+    assert all("lora_" in name or "classifier" in name for name in trainable)
+
+    weights = adapter_state_dict(model)
+    adapter_bytes = sum(tensor.numel() * tensor.element_size()
+                        for tensor in weights.values())
+    base_bytes = sum(tensor.numel() * tensor.element_size()
+                     for tensor in _model().state_dict().values())
+    assert adapter_bytes < base_bytes / 10
+
+
+def test_published_adapter_reproduces_the_trained_model(tmp_path):
+    settings = AdapterSettings(r=2)
+    trained = settings.wrap(_model()).eval()
+    with torch.no_grad():
+        for name, parameter in trained.named_parameters():
+            if parameter.requires_grad:
+                parameter.add_(torch.randn_like(parameter))
+    inputs = {"input_ids": torch.tensor([[1, 5, 7, 2]])}
+    expected = trained(**inputs).logits
+
+    store = LocalArtifactStore(tmp_path)
+    entry = store_model(adapter_state_dict(trained), store)
+    loaded = settings.load(_model(),
+                           load_model_weights(entry, store)).eval()
+    assert torch.allclose(loaded(**inputs).logits, expected, atol=1e-5)
+    merged = loaded.merge_and_unload()
+    assert torch.allclose(merged(**inputs).logits, expected, atol=1e-5)
+
+
+def test_settings_round_trip_through_result_params():
+    settings = AdapterSettings(r=4, target_modules=("query", "value"))
+    params = json.loads(json.dumps(settings.to_params()))
+    assert adapter_settings("adapter", params) == settings
+
+
+def test_base_model_digest_follows_weight_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        base_model_digest(tmp_path)
+
+    (tmp_path / "config.json").write_text("{}")
+    (tmp_path / "model.safetensors").write_bytes(b"weights")
+    (tmp_path / "tokenizer.json").write_text("{}")
+    digest = base_model_digest(tmp_path)
+    assert base_model_digest(Path(tmp_path)) == digest
+
+    (tmp_path / "tokenizer.json").write_text('{"changed": 1}')
+    assert base_model_digest(tmp_path) == digest
+    (tmp_path / "model.safetensors").write_bytes(b"other weights")
+    assert base_model_digest(tmp_path) != digest
@@ -0,0 +1,58 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from core.batch_predictor import BatchPredictor, select_labels
+from core.metrics import multi_label_mask
+
+WORDS = ["good", "bad", "movie", "very", "not", "the", "plot", "was"]
+
+
+@pytest.fixture(scope="module")
+def model_and_tokenizer(tmp_path_factory):
+    vocab = tmp_path_factory.mktemp("tokenizer") / "vocab.txt"
+    vocab.write_text("\n".join(
+        ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    tokenizer = transformers.BertTokenizerFast(vocab_file=str(vocab))
+    torch.manual_seed(0)
+    model = transformers.BertForSequenceClassification(transformers.BertConfig(
+        vocab_size=len(WORDS) + 5, hidden_size=16, num_hidden_layers=1,
+        num_attention_heads=2, intermediate_size=32, num_labels=4))
+    return model, tokenizer
+
+
+def test_select_labels():
+    probabilities = np.array([[0.1, 0.6, 0.3, 0.0],
+                              [0.25, 0.25, 0.3, 0.2],
+                              [0.05, 0.05, 0.1, 0.8]])
+    assert select_labels(probabilities, multi_label=False) == [1, 2, 3]
+    assert select_labels(probabilities, multi_label=True) == [
+        [1, 2], [2, 0, 1], [3]]
+
+
+def test_metrics_score_the_selected_labels():
+    probabilities = np.random.default_rng(0).random((50, 6))
+    mask = multi_label_mask(probabilities)
+    for row, labels in zip(mask, select_labels(probabilities, True)):
+        assert sorted(labels) == np.flatnonzero(row).tolist()
+
+
+@pytest.mark.parametrize("multi_label", [False, True])
+def test_batched_predictions_match_one_by_one(model_and_tokenizer, multi_label):
+    model, tokenizer = model_and_tokenizer
+    texts = ["good", "the plot was very very bad", "not good",
+             "the movie", "bad bad bad bad bad bad", "very good movie"]
+    text_ids = [f"id-{i}" for i in range(len(texts))]
+
+    predictor = BatchPredictor(model, tokenizer, batch_size=4,
+                               multi_label=multi_label)
+    batched = predictor.predict(text_ids, texts)
+
+    assert list(batched) == text_ids
+    for text_id, text in zip(text_ids, texts):
+        with torch.inference_mode():
+            logits = model(**tokenizer(text, return_tensors="pt")).logits
+        expected = select_labels(predictor.probabilities(logits), multi_label)
+        assert batched[text_id] == expected[0]
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+HELP_IMPORT_BUDGET = 0.5  # Seconds of imports allowed for main.py --help
+HEAVY_MODULES = {"torch", "transformers", "datasets", "evaluate", "scipy",
+                 "pandas", "pyarrow", "web3"}
+
+
+def _imports(*args: str) -> list[tuple[str, int, float]]:
+    """Runs python -X importtime with args and returns (module, nesting
+    depth, cumulative seconds) for every module it imported."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT,
+        capture_output=True, text=True, check=True)
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(cumulative) / 1e6))
+    return imports
+
+
+def _top_level_modules(imports) -> set[str]:
+    return {name.split(".")[0] for name, _, _ in imports}
+
+
+def test_help_does_not_load_the_ml_stack():
+    imports = _imports("main.py", "--help")
+    assert not HEAVY_MODULES & _top_level_modules(imports)
+    assert sum(seconds for _, depth, seconds in imports if depth == 0) \
+        < HELP_IMPORT_BUDGET
+
+
+def test_orchestrator_process_does_not_load_the_ml_stack():
+    # Tasks import torch and transformers in their worker processes only
+    imports = _imports("-c", "import core.scheduler")
+    assert not {"torch", "transformers", "evaluate", "datasets"} \
+        & _top_level_modules(imports)
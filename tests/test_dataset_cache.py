@@ -0,0 +1,123 @@
+import fcntl
+import functools
+import os
+import threading
+import pytest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from core.dataset_cache import DatasetCache
+
+
+def _write_csv(path, ids):
+    pd.DataFrame({"id": ids, "text": [f"t{i}" for i in ids]}).to_csv(
+        path, index=False)
+
+
+def test_local_files_are_cached_by_content(tmp_path):
+    cache = DatasetCache(tmp_path / "cache")
+    first, second = tmp_path / "first.csv", tmp_path / "second.csv"
+    _write_csv(first, [1, 2, 3])
+    _write_csv(second, [1, 2, 3])
+
+    blob = cache.fetch(str(first))
+    assert cache.fetch(f"file://{second}") == blob
+    assert cache.read_dataframe(str(first))["id"].tolist() == [1, 2, 3]
+    assert blob.with_suffix(".arrow").exists()
+
+    _write_csv(first, [4, 5])
+    os.utime(first, ns=(0, 1))
+    assert cache.read_dataframe(str(first))["id"].tolist() == [4, 5]
+    assert cache.read_dataframe(str(second))["id"].tolist() == [1, 2, 3]
+
+
+def test_string_columns_keep_mixed_type_ids(tmp_path):
+    # The first block of the CSV only holds numbers, the last id does not
+    source = tmp_path / "mixed.csv"
+    ids = [str(i) for i in range(200_000)] + ["row-x"]
+    _write_csv(source, ids)
+    cache = DatasetCache(tmp_path / "cache")
+
+    frame = cache.read_dataframe(str(source), ("id", "text"))
+    assert frame["id"].tolist() == ids
+    batches = list(cache.iter_batches(
+        str(source), 100_000, ["id"], ("id", "text")))
+    assert batches[-1].column("id")[-1].as_py() == "row-x"
+    # The copy with inferred types is kept apart
+    assert not cache.fetch(str(source)).with_suffix(".arrow").exists()
+
+
+def test_least_recently_used_blobs_are_evicted(tmp_path):
+    sources = []
+    for number in range(3):
+        source = tmp_path / f"{number}.csv"
+        _write_csv(source, list(range(number * 100, number * 100 + 100)))
+        sources.append(source)
+    blob_size = max(os.path.getsize(source) for source in sources)
+    cache = DatasetCache(tmp_path / "cache", max_bytes=2 * blob_size)
+
+    blobs = [cache.fetch(str(source)) for source in sources]
+    assert not blobs[0].exists()
+    assert blobs[1].exists() and blobs[2].exists()
+
+
+def test_arrow_copies_count_against_the_limit(tmp_path):
+    sources = []
+    for number in range(2):
+        source = tmp_path / f"{number}.csv"
+        _write_csv(source, list(range(number * 100, number * 100 + 100)))
+        sources.append(source)
+    blob_size = max(os.path.getsize(source) for source in sources)
+    cache = DatasetCache(tmp_path / "cache", max_bytes=2 * blob_size)
+
+    blobs = [cache.fetch(str(source)) for source in sources]
+    assert all(blob.exists() for blob in blobs)
+    arrow_path = cache.arrow_path(str(sources[1]))
+    assert arrow_path.exists() and blobs[1].exists()
+    assert not blobs[0].exists()
+
+
+def test_downloads_do_not_hold_the_index_lock(tmp_path):
+    source = tmp_path / "data.csv"
+    _write_csv(source, [1, 2])
+    cache = DatasetCache(tmp_path / "cache")
+    store = cache.store
+
+    def store_unlocked(*args):
+        with open(cache.root / ".lock", "w") as lock_file:
+            # Raises BlockingIOError while another fetch holds the lock
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return store(*args)
+
+    cache.store = store_unlocked
+    assert cache.read_dataframe(str(source))["id"].tolist() == [1, 2]
+
+
+@pytest.fixture
+def http_root(tmp_path):
+    root = tmp_path / "served"
+    root.mkdir()
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            requests.append(self.headers.get("If-Modified-Since"))
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(Handler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+
+
+def test_remote_files_are_revalidated(tmp_path, http_root):
+    root, base_url, requests = http_root
+    _write_csv(root / "data.csv", [1, 2])
+    cache = DatasetCache(tmp_path / "cache")
+
+    blob = cache.fetch(f"{base_url}/data.csv")
+    assert cache.fetch(f"{base_url}/data.csv") == blob
+    assert requests[0] is None and requests[1] is not None
+    assert cache.read_dataframe(f"{base_url}/data.csv")["id"].tolist() == [1, 2]
@@ -0,0 +1,130 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from core.discovery import CrumbEventFollower
+from src.SubContract import CrumbStatus, CrumbUpdate
+
+OUR_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+OTHER_ADDRESS = "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC"
+SUB_CONTRACT = "0x885cA90bD752A682dD1883614edA0C0557c973a6"
+
+
+def _follower(tmp_path, latest_block):
+    contract_utility = MagicMock()
+    contract_utility.w3.eth.default_account = OUR_ADDRESS
+    contract_utility.w3.eth.get_block_number = AsyncMock(
+        return_value=latest_block)
+    follower = CrumbEventFollower(
+        contract_utility, cursor_path=tmp_path / "cursor.json", block_range=100)
+    follower.set_addresses([SUB_CONTRACT])
+    return follower
+
+
+def _update(status, assignee, block_number):
+    return CrumbUpdate(address=SUB_CONTRACT, id=b"\x01" * 16, status=status,
+                       assignee=assignee, block_number=block_number)
+
+
+@pytest.mark.asyncio
+async def test_first_poll_only_sets_cursor(tmp_path):
+    follower = _follower(tmp_path, latest_block=120)
+    with patch("core.discovery.get_crumb_updates") as mock_updates:
+        assert await follower.poll() == []
+    mock_updates.assert_not_called()
+    assert _follower(tmp_path, latest_block=120).cursor == 120
+
+
+@pytest.mark.asyncio
+async def test_poll_replays_block_ranges_and_queues_our_crumbs(tmp_path):
+    follower = _follower(tmp_path, latest_block=10)
+    await follower.poll()
+    follower.contract_utility.w3.eth.get_block_number.return_value = 260
+
+    ours = _update(CrumbStatus.QUEUED, OUR_ADDRESS, 150)
+    updates = {
+        (11, 110): [_update(CrumbStatus.QUEUED, OTHER_ADDRESS, 20)],
+        (111, 210): [ours, _update(CrumbStatus.CLOSED, OUR_ADDRESS, 160)],
+        (211, 260): [],
+    }
+
+    async def get_crumb_updates(addresses, from_block, to_block, **_):
+        assert addresses == [SUB_CONTRACT]
+        return updates[(from_block, to_block)]
+
+    with patch("core.discovery.get_crumb_updates", side_effect=get_crumb_updates):
+        assert await follower.poll() == [ours]
+
+    assert follower.queued.get_nowait() == ours
+    assert follower.queued.empty()
+    assert _follower(tmp_path, latest_block=260).cursor == 260
+
+
+@pytest.mark.asyncio
+async def test_follow_backs_off_on_failed_polls(tmp_path):
+    follower = _follower(tmp_path, latest_block=10)
+    follower.poll_interval = 2
+    follower.contract_utility.w3.eth.get_block_number.side_effect = [
+        ConnectionError("node down"), ConnectionError("node down"),
+        ConnectionError("node down"), 10]
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 4:
+            raise asyncio.CancelledError
+
+    with patch("core.discovery.asyncio.sleep", sleep), \
+            pytest.raises(asyncio.CancelledError):
+        await follower.follow()
+    assert delays == [2, 4, 8, 2]
+    assert follower.cursor == 10
+
+
+@pytest.mark.asyncio
+async def test_poll_refreshes_addresses_and_replays_new_sub_contracts(
+        tmp_path):
+    follower = _follower(tmp_path, latest_block=10)
+    new_contract = "0x" + "ab" * 20
+    listed = [[SUB_CONTRACT], [SUB_CONTRACT, new_contract]]
+    follower.list_addresses = AsyncMock(side_effect=listed)
+    block_number = follower.contract_utility.w3.eth.get_block_number
+    await follower.poll()
+    assert follower.addresses_block == 10
+
+    block_number.return_value = 50
+    with patch("core.discovery.get_crumb_updates",
+               AsyncMock(return_value=[])):
+        await follower.poll()
+    assert follower.cursor == 50
+
+    # The new sub-contract was missed in blocks 11-50, which are replayed
+    # for it alone before the poll goes on with both
+    follower.address_refresh_interval = 0
+    block_number.return_value = 60
+    ours = _update(CrumbStatus.QUEUED, OUR_ADDRESS, 40)
+    calls = []
+
+    async def get_crumb_updates(addresses, from_block, to_block, **_):
+        calls.append((addresses, from_block, to_block))
+        return [ours] if from_block == 11 else []
+
+    with patch("core.discovery.get_crumb_updates",
+               side_effect=get_crumb_updates):
+        await follower.poll()
+    new_address = follower.addresses[1]
+    assert calls == [([new_address], 11, 50),
+                     ([SUB_CONTRACT, new_address], 51, 60)]
+    assert follower.queued.get_nowait() == ours
+    assert follower.cursor == 60
+
+
+@pytest.mark.asyncio
+async def test_addresses_are_read_again_only_after_the_interval(tmp_path):
+    follower = _follower(tmp_path, latest_block=10)
+    follower.list_addresses = AsyncMock(return_value=[SUB_CONTRACT])
+    with patch("core.discovery.get_crumb_updates",
+               AsyncMock(return_value=[])):
+        for _ in range(3):
+            await follower.poll()
+    follower.list_addresses.assert_awaited_once()
@@ -0,0 +1,66 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+metrics_module = pytest.importorskip("sklearn.metrics")
+
+from core.metrics import ClassificationMetrics, multi_label_mask
+
+
+def _expected(actual, predicted):
+    expected = {"accuracy": metrics_module.accuracy_score(actual, predicted)}
+    for name, score in (("precision", metrics_module.precision_score),
+                        ("recall", metrics_module.recall_score),
+                        ("f1", metrics_module.f1_score)):
+        for average in ("micro", "macro", "weighted"):
+            expected[f"{name}_{average}"] = score(
+                actual, predicted, average=average, zero_division=0)
+    return expected
+
+
+def test_single_label_matches_sklearn_over_streamed_batches():
+    rng = np.random.default_rng(0)
+    logits = rng.normal(size=(1000, 4)).astype(np.float32)
+    labels = rng.integers(0, 4, size=1000)
+    # Class 3 is never predicted
+    logits[:, 3] = -10
+
+    metrics = ClassificationMetrics()
+    for start in range(0, 1000, 64):
+        metrics.update(logits[start:start + 64], labels[start:start + 64])
+
+    predicted = logits.argmax(axis=1)
+    assert metrics.compute() == pytest.approx(_expected(labels, predicted))
+    assert np.array_equal(metrics.confusion_matrix(),
+                          metrics_module.confusion_matrix(labels, predicted))
+
+
+def test_multi_label_uses_the_prediction_thresholds():
+    rng = np.random.default_rng(1)
+    logits = rng.normal(size=(500, 5)) * 3
+    labels = (rng.random(size=(500, 5)) > 0.6).astype(np.float32)
+
+    metrics = ClassificationMetrics(multi_label=True)
+    for start in range(0, 500, 100):
+        metrics.update(logits[start:start + 100], labels[start:start + 100])
+
+    predicted = multi_label_mask(1 / (1 + np.exp(-logits)))
+    assert predicted.sum(axis=1).max() <= 3
+    assert metrics.compute() == pytest.approx(
+        _expected(labels.astype(bool), predicted))
+    assert np.array_equal(
+        metrics.confusion_matrix(),
+        metrics_module.multilabel_confusion_matrix(labels, predicted))
+
+
+def test_trainer_batches_are_reduced_on_the_last_one():
+    torch = pytest.importorskip("torch")
+    metrics = ClassificationMetrics()
+    first = (torch.tensor([[2.0, 0.0], [0.0, 2.0]], dtype=torch.bfloat16),
+             torch.tensor([0, 0]))
+    last = (torch.tensor([[0.0, 1.0], [0.0, 1.0]]), torch.tensor([1, -100]))
+
+    assert metrics(first, compute_result=False) == {}
+    result = metrics(last, compute_result=True)
+    assert result["accuracy"] == pytest.approx(2 / 3)
+    # Counts start over for the next evaluation
+    assert metrics.rows == 0
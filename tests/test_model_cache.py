@@ -0,0 +1,43 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from core.model_cache import ModelCache, estimate_size
+
+
+def _model(floats):
+    return torch.nn.Linear(floats - 1, 1)  # floats - 1 weights + 1 bias
+
+
+def test_estimate_size():
+    assert estimate_size(_model(10)) == 40
+    assert estimate_size(type("Pipeline", (), {"model": _model(10)})()) == 40
+    assert estimate_size("tokenizer") == 0
+
+
+def test_lru_eviction_pinning_and_counters():
+    cache = ModelCache(max_bytes=100)
+    loads = []
+
+    def loader(name):
+        def load():
+            loads.append(name)
+            return _model(10)
+        return load
+
+    first = cache.get("a", loader("a"), pin=True)
+    cache.get("b", loader("b"))
+    assert cache.get("a", loader("a")) is first
+    cache.get("c", loader("c"))  # 120 bytes: evicts b, a is pinned
+
+    assert list(cache.entries) == ["a", "c"]
+    assert loads == ["a", "b", "c"]
+    assert cache.stats() == {"entries": 2, "bytes": 80, "hits": 1,
+                             "misses": 3, "evictions": 1}
+
+    cache.get("d", loader("d"))
+    cache.get("e", loader("e"))
+    assert list(cache.entries) == ["a", "e"]
+    cache.unpin("a")
+    cache.get("f", loader("f"))
+    assert list(cache.entries) == ["e", "f"]
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import multiprocessing
+import pytest
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import core.pipeline as pipeline_module
+from core.artifact_store import LocalArtifactStore
+from core.pipeline import JobPipeline, RetryBackoff, run_task
+from core.prediction_spill import PredictionSpill
+from src.SubContract import Crumb, CrumbStatus
+
+
+def _crumb(number, max_run=0):
+    return Crumb(id=bytes([number]) * 16, alias_name="crumb", price=0,
+                 status=CrumbStatus.QUEUED, setup_task=json.dumps({"number": number}),
+                 setup_validation="{}", result="", assignee="0x0",
+                 last_updated=0, max_run=max_run)
+
+
+class FakeOrchestrator:
+    def __init__(self, crumbs):
+        self.crumbs = list(crumbs)
+        self.follower = None
+        self.in_flight = set()
+        self.current_job = None
+        self.selected_contract = None
+        self.published = []
+
+    async def fetch_job(self):
+        if not self.crumbs:
+            return False
+        self.selected_contract, self.current_job = "sub", self.crumbs.pop(0)
+        return True
+
+    async def publish_job_results(self, result, sub_contract_address, crumb):
+        await asyncio.sleep(0.01)
+        self.published.append((sub_contract_address, crumb.id, result))
+
+
+def _run_task(setup_task, artifact_store, checkpoint_dir, training_profile,
+              deadline):
+    number = json.loads(setup_task)["number"]
+    assert training_profile == "cpu"
+    Path(checkpoint_dir).mkdir(parents=True, exist_ok=True)
+    if number == 2:
+        raise RuntimeError("boom")
+    if number == 3:
+        time.sleep(60)
+    return json.dumps({"number": number})
+
+
+def _pipeline(orchestrator, tmp_path, retries=None):
+    # Forked workers see the patched run_task
+    return JobPipeline(orchestrator, compute_slots=2, queue_size=1,
+                       publish_concurrency=2, poll_interval=0.01,
+                       mp_context=multiprocessing.get_context("fork"),
+                       checkpoint_root=str(tmp_path),
+                       training_profile="cpu", retries=retries)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_computes_and_publishes_every_job(tmp_path):
+    # 2 fails and 3 runs past its max_run, the others are published
+    orchestrator = FakeOrchestrator(
+        [_crumb(n, max_run=0.5 if n == 3 else 0) for n in range(1, 6)])
+    pipeline = _pipeline(orchestrator, tmp_path)
+
+    with patch.object(pipeline_module, "run_task", _run_task):
+        run = asyncio.create_task(pipeline.run())
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if len(orchestrator.published) == 3 and \
+                    len(pipeline.retries.failures) == 2:
+                break
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    assert sorted(crumb_id[0] for _, crumb_id, _ in orchestrator.published) == [1, 4, 5]
+    assert ("sub", bytes([4]) * 16, json.dumps({"number": 4})) in orchestrator.published
+    # The failed jobs wait for their retry
+    failed = {("sub", bytes([n]) * 16) for n in (2, 3)}
+    assert orchestrator.in_flight == failed
+    assert pipeline.retries.failures == {key: 1 for key in failed}
+    assert not pipeline.progress
+    # Only the checkpoints of jobs that can be retried are kept
+    assert sorted(path.name for path in (tmp_path / "sub").iterdir()) == [
+        (bytes([n]) * 16).hex() for n in (2, 3)]
+
+
+class RetryingOrchestrator(FakeOrchestrator):
+    """Offers its crumbs again until they are published, like a chain."""
+
+    def __init__(self, crumbs):
+        super().__init__(crumbs)
+        self.fetches = 0
+
+    async def fetch_job(self):
+        self.fetches += 1
+        if self.fetches == 1:
+            raise ConnectionError("node down")
+        for crumb in self.crumbs:
+            if ("sub", crumb.id) not in self.in_flight:
+                self.selected_contract, self.current_job = "sub", crumb
+                return True
+        return False
+
+
+@pytest.mark.asyncio
+async def test_failed_jobs_are_retried_with_a_backoff(tmp_path):
+    orchestrator = RetryingOrchestrator([_crumb(2)])
+    retries = RetryBackoff(max_attempts=3, delay=0.1)
+    pipeline = _pipeline(orchestrator, tmp_path, retries)
+    key = ("sub", bytes([2]) * 16)
+
+    with patch.object(pipeline_module, "run_task", _run_task):
+        run = asyncio.create_task(pipeline.run())
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if retries.failures.get(key) == 3:
+                break
+        fetches = orchestrator.fetches
+        await asyncio.sleep(0.3)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    # Discovery survived the failed fetch, the crumb was given up after
+    # three attempts and is not picked up again
+    assert retries.failures[key] == 3
+    assert key in orchestrator.in_flight
+    assert orchestrator.fetches > fetches
+    assert not orchestrator.published
+
+
+
+class FailingPublisher(RetryingOrchestrator):
+    """Its first publish_failures publications raise."""
+
+    def __init__(self, crumbs, publish_failures):
+        super().__init__(crumbs)
+        self.fetches = 1  # No failed fetch
+        self.publish_failures = publish_failures
+        self.offered = 0
+
+    async def fetch_job(self):
+        found = await super().fetch_job()
+        self.offered += found
+        return found
+
+    async def publish_job_results(self, result, sub_contract_address, crumb):
+        if self.publish_failures:
+            self.publish_failures -= 1
+            raise ValueError("replacement transaction underpriced")
+        await super().publish_job_results(result, sub_contract_address, crumb)
+        self.crumbs.remove(crumb)
+
+
+async def _run_until(pipeline, done):
+    with patch.object(pipeline_module, "run_task", _run_task):
+        run = asyncio.create_task(pipeline.run())
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if done():
+                break
+        await asyncio.sleep(0.1)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+
+@pytest.mark.asyncio
+async def test_failed_publications_are_retried_without_recomputing(
+        tmp_path):
+    orchestrator = FailingPublisher([_crumb(1)], publish_failures=2)
+    pipeline = _pipeline(orchestrator, tmp_path,
+                         RetryBackoff(max_attempts=3, delay=0.05))
+
+    await _run_until(pipeline, lambda: orchestrator.published)
+
+    assert [crumb_id for _, crumb_id, _ in orchestrator.published] == \
+        [bytes([1]) * 16]
+    assert orchestrator.offered == 1
+    assert not orchestrator.in_flight
+    assert not pipeline.retries.failures
+
+
+@pytest.mark.asyncio
+async def test_publishing_is_given_up_after_max_attempts(tmp_path):
+    orchestrator = FailingPublisher([_crumb(1)], publish_failures=10)
+    retries = RetryBackoff(max_attempts=3, delay=0.05)
+    pipeline = _pipeline(orchestrator, tmp_path, retries)
+    key = ("sub", bytes([1]) * 16)
+
+    await _run_until(pipeline, lambda: retries.failures.get(key) == 3)
+
+    assert orchestrator.publish_failures == 7
+    assert orchestrator.offered == 1
+    assert key in orchestrator.in_flight
+    assert not orchestrator.published
+
+
+def test_run_task_removes_the_stored_spill(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    pytest.importorskip("safetensors")
+    spill_path = tmp_path / "predictions" / "spill.arrow"
+
+    class StreamingTask:
+        def set_params(self, setup_task):
+            pass
+
+        def start_working(self):
+            pass
+
+        def get_results(self):
+            with PredictionSpill(spill_path) as spill:
+                spill.write({1: "A", 2: "B"})
+            return {"model_name": "bert"}, spill
+
+    monkeypatch.setattr("core.transformer_task.TransformerTask",
+                        StreamingTask)
+    store = LocalArtifactStore(tmp_path / "artifacts")
+    manifest = run_task("{}", store)
+
+    from core.result_codec import decode_results
+    assert decode_results(manifest, store)[1] == {1: "A", 2: "B"}
+    assert not spill_path.exists()
@@ -0,0 +1,102 @@
+import json
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("safetensors")
+
+from core.artifact_store import LocalArtifactStore, open_artifact_store
+from core.prediction_spill import PredictionSpill
+from core.result_codec import EncodedPredictions, decode_predictions, \
+    decode_results, encode_predictions, encode_results, load_model_weights
+
+
+@pytest.mark.parametrize("predictions", [
+    {12: 1, 3: 0, 7: 1, 1000000: 2},
+    {"b": "POSITIVE", "a": "NEGATIVE", "c": "POSITIVE"},
+    {1: [0, 2], 2: [], 3: [1]},
+    {},
+])
+def test_predictions_round_trip(predictions):
+    decoded = decode_predictions(encode_predictions(predictions))
+    assert decoded == predictions
+    assert list(decoded) == sorted(predictions)
+
+
+@pytest.mark.parametrize("predictions", [
+    {i * 7: i % 3 for i in range(1000)},
+    {f"id-{i:04}": "POSITIVE" if i % 2 else "NEGATIVE" for i in range(1000)},
+])
+def test_encoded_predictions_decode_only_the_requested_rows(predictions):
+    encoded = EncodedPredictions(encode_predictions(predictions))
+    assert len(encoded) == 1000
+    ordered = sorted(predictions)
+    sample = encoded.items([999, 0, 512])
+    assert sample == {text_id: predictions[text_id]
+                      for text_id in (ordered[999], ordered[0], ordered[512])}
+
+
+def test_predictions_are_compact():
+    predictions = {i: i % 3 for i in range(100_000)}
+    assert len(encode_predictions(predictions)) < 10_000
+    assert len(encode_predictions(predictions)) \
+        < len(str(predictions)) / 100
+
+
+def test_spills_encode_like_mappings(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.result_codec.ENCODE_BATCH_SIZE", 7)
+    predictions = {text_id: [text_id % 3] for text_id in range(50, 0, -1)}
+    with PredictionSpill(tmp_path / "spill.arrow") as spill:
+        items = list(predictions.items())
+        for start in range(0, len(items), 9):
+            spill.write(dict(items[start:start + 9]))
+
+    assert encode_predictions(spill) == encode_predictions(predictions)
+    assert encode_predictions(PredictionSpill(tmp_path / "empty.arrow")) \
+        == encode_predictions({})
+
+
+@pytest.mark.parametrize("predictions", [
+    {1: 0, "2": 1},
+    {1.5: 0},
+    {True: 0},
+])
+def test_rejects_ids_that_are_not_all_int_or_all_str(predictions):
+    with pytest.raises(TypeError):
+        encode_predictions(predictions)
+
+
+def test_rejects_unknown_versions():
+    data = bytearray(encode_predictions({1: 0}))
+    data[4] = 99
+    with pytest.raises(ValueError):
+        decode_predictions(bytes(data))
+
+
+def test_store_is_content_addressed(tmp_path):
+    store = LocalArtifactStore(tmp_path)
+    digest = store.put(b"weights")
+    assert store.put(b"weights") == digest
+    assert store.get(digest) == b"weights"
+    assert open_artifact_store(tmp_path.as_uri()).get(digest) == b"weights"
+
+    store.path(digest).write_bytes(b"tampered")
+    with pytest.raises(ValueError):
+        store.get(digest)
+
+
+def test_manifest_holds_hashes_not_weights(tmp_path):
+    store = LocalArtifactStore(tmp_path)
+    model = torch.nn.Linear(256, 256)
+    with PredictionSpill(tmp_path / "spill.arrow") as spill:
+        spill.write({2: 1, 1: 0})
+
+    manifest = encode_results(
+        ({"model_name": "bert", "model": model}, spill), store)
+
+    assert len(manifest) < 1000
+    params, predictions = decode_results(manifest, store)
+    assert predictions == {1: 0, 2: 1}
+    assert params["model_name"] == "bert"
+    assert json.loads(manifest)["params"]["model"]["format"] == "safetensors"
+    weights = load_model_weights(params["model"], store)
+    assert torch.equal(weights["weight"], model.weight)
@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from core.scheduler import Orchestrator
+from src.MainContract import ComputeTaskHeader
+from src.SubContract import Crumb, CrumbHeader, CrumbStatus
+
+
+def _compute_task(sub_contract_address):
+    return ComputeTaskHeader(id=0, subContractAddress=sub_contract_address,
+                             timestamp=0)
+
+
+def _crumb(status):
+    return Crumb(id=b"\x01" * 16, alias_name="crumb", price=0, status=status,
+                 setup_task=json.dumps({"task_type": "sentiment-analysis"}),
+                 setup_validation="{}", result="", assignee="0x0",
+                 last_updated=0, max_run=0)
+
+
+def _header(crumb):
+    return CrumbHeader(crumb.id, crumb.status, crumb.price, crumb.assignee,
+                       crumb.last_updated, crumb.max_run)
+
+
+@pytest.fixture
+def orchestrator(tmp_path):
+    pkey = tmp_path / "pkey"
+    pkey.write_text("0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d")
+    with patch("core.scheduler.ContractUtility.get_pooled", return_value=MagicMock()):
+        yield Orchestrator("sapphire-localnet", "MessageBox", str(pkey),
+                           fetch_concurrency=2, fetch_timeout=0.5)
+
+
+@pytest.mark.asyncio
+async def test_fetch_job_short_circuits_on_first_queued_crumb(orchestrator):
+    cancelled = []
+    fetched = []
+
+    async def header_pages(address, **kwargs):
+        assert kwargs["requester"] and kwargs["headers"]
+        if address == "slow":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(address)
+                raise
+        status = CrumbStatus.QUEUED if address == "queued" else CrumbStatus.NEW
+        yield [_header(_crumb(status))]
+
+    async def get_crumb(address, crumb_id, **_):
+        fetched.append(address)
+        return _crumb(CrumbStatus.QUEUED)
+
+    queue = [_compute_task(a) for a in ("slow", "new", "queued")]
+    with patch("core.scheduler.get_in_progress_headers", return_value=queue), \
+            patch("core.scheduler.iter_crumb_pages", header_pages), \
+            patch("core.scheduler.get_crumb", side_effect=get_crumb):
+        assert await orchestrator.fetch_job()
+
+    assert orchestrator.selected_contract == "queued"
+    # Only the selected crumb is read in full
+    assert fetched == ["queued"]
+    assert cancelled == ["slow"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_job_skips_sub_contracts_that_time_out(orchestrator):
+    async def header_pages(address, **_):
+        await asyncio.sleep(10)
+        yield []
+
+    with patch("core.scheduler.get_in_progress_headers", return_value=[_compute_task("slow")]), \
+            patch("core.scheduler.iter_crumb_pages", header_pages):
+        assert not await orchestrator.fetch_job()
+    assert orchestrator.current_job is None
+
+
+class _StubMulticall:
+    def __init__(self, crumbs_by_address, page_size=1000):
+        self.crumbs_by_address = crumbs_by_address
+        self.page_size = page_size
+        self.batches = 0
+        self.pages = []
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        yield self
+        self.batches += 1
+
+    def _resolved(self, result):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(result)
+        return future
+
+    def crumb_count_by_status(self, address, status):
+        return self._resolved(len(self.crumbs_by_address[address]))
+
+    def crumb_headers_by_status(self, address, status, offset=0):
+        self.pages.append((address, offset))
+        return self._resolved([
+            _header(crumb) for crumb in
+            self.crumbs_by_address[address][offset:offset + self.page_size]])
+
+    def crumbs_by_status(self, address, status):
+        self.pages.append((address, "all"))
+        return self._resolved(self.crumbs_by_address[address])
+
+    def crumb(self, address, crumb_id):
+        return self._resolved(next(
+            crumb for crumb in self.crumbs_by_address[address]
+            if crumb.id == crumb_id))
+
+
+@pytest.mark.asyncio
+async def test_fetch_job_polls_every_sub_contract_in_one_batch(orchestrator):
+    mine = _crumb(CrumbStatus.QUEUED)
+    mine.assignee = orchestrator.w3.eth.default_account
+    others = _crumb(CrumbStatus.QUEUED)
+    orchestrator.multicall = _StubMulticall({"others": [others], "mine": [mine]})
+
+    queue = [_compute_task(a) for a in ("others", "mine")]
+    with patch("core.scheduler.get_in_progress_headers", return_value=queue), \
+            patch("core.scheduler.has_function", AsyncMock(return_value=True)):
+        assert await orchestrator.fetch_job()
+
+    assert orchestrator.multicall.batches == 1
+    assert orchestrator.selected_contract == "mine"
+
+
+def _queued_crumb(number, assignee):
+    crumb = _crumb(CrumbStatus.QUEUED)
+    crumb.id = bytes([number]) * 16
+    crumb.assignee = assignee
+    return crumb
+
+
+@pytest.mark.asyncio
+async def test_batched_pass_reads_every_header_page(orchestrator):
+    me = orchestrator.w3.eth.default_account
+    crumbs = [_queued_crumb(n, "0xother") for n in range(5)] + \
+        [_queued_crumb(5, me)]
+    orchestrator.multicall = _StubMulticall({"busy": crumbs}, page_size=2)
+
+    with patch("core.scheduler.get_in_progress_headers",
+               return_value=[_compute_task("busy")]), \
+            patch("core.scheduler.has_function", AsyncMock(return_value=True)), \
+            patch("core.scheduler.HEADER_PAGE_SIZE", 2):
+        assert await orchestrator.fetch_job()
+
+    assert orchestrator.multicall.batches == 2
+    assert orchestrator.multicall.pages == [
+        ("busy", 0), ("busy", 2), ("busy", 4)]
+    assert orchestrator.current_job.id == bytes([5]) * 16
+
+
+@pytest.mark.asyncio
+async def test_batched_pass_reads_crumbs_of_old_sub_contracts(orchestrator):
+    me = orchestrator.w3.eth.default_account
+    orchestrator.multicall = _StubMulticall(
+        {"old": [_queued_crumb(1, "0xother"), _queued_crumb(2, me)]})
+
+    with patch("core.scheduler.get_in_progress_headers",
+               return_value=[_compute_task("old")]), \
+            patch("core.scheduler.has_function",
+                  AsyncMock(return_value=False)):
+        assert await orchestrator.fetch_job()
+
+    assert orchestrator.multicall.pages == [("old", "all")]
+    assert orchestrator.current_job.id == bytes([2]) * 16
+
+
+def test_multicall_needs_a_compiled_artifact(tmp_path, monkeypatch):
+    import src.utils
+    monkeypatch.setattr(src.utils, "COMPILED_CONTRACTS_DIR", tmp_path)
+    pkey = tmp_path / "pkey"
+    pkey.write_text("0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d")
+    with patch("core.scheduler.ContractUtility.get_pooled", return_value=MagicMock()), \
+            pytest.raises(FileNotFoundError, match="compile --contract Multicall"):
+        Orchestrator("sapphire-localnet", "MessageBox", str(pkey),
+                     multicall_address="0x" + "f" * 40)
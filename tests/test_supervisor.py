@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+from core.supervisor import TaskError, TaskTimeout, TaskWorker, \
+    report_progress
+
+# Forked workers see the test functions without importing this module again
+fork = multiprocessing.get_context("fork")
+
+
+def _count_rows(rows):
+    report_progress("loading")
+    for done in range(1, rows + 1):
+        report_progress("predicting", done)
+    return os.getpid()
+
+
+def _fail():
+    raise ValueError("bad setup_task")
+
+
+def _hang():
+    time.sleep(60)
+
+
+def _start_child():
+    # As a DataLoader with num_workers > 0 does
+    child = fork.Process(target=time.sleep, args=(0,))
+    child.start()
+    child.join()
+    return child.exitcode
+
+
+@pytest.fixture
+def worker():
+    worker = TaskWorker(fork, poll_interval=0.01)
+    yield worker
+    worker.stop()
+
+
+@pytest.mark.asyncio
+async def test_streams_progress_and_keeps_the_process(worker):
+    events = []
+    pid = await worker.run(_count_rows, 3, on_progress=events.append)
+
+    assert [event.phase for event in events] == ["loading", "predicting"]
+    assert events[1].rows_done == 1
+    assert pid == worker.process.pid
+    # The same process serves the next task, with its caches
+    assert await worker.run(_count_rows, 1) == pid
+
+
+@pytest.mark.asyncio
+async def test_task_errors_are_raised_with_the_traceback(worker):
+    with pytest.raises(TaskError, match="bad setup_task"):
+        await worker.run(_fail)
+    assert worker.process.is_alive()
+
+
+@pytest.mark.asyncio
+async def test_deadline_stops_the_process(worker):
+    with pytest.raises(TaskTimeout):
+        await worker.run(_hang, deadline=0.1)
+    assert worker.process is None
+
+    assert await worker.run(_count_rows, 1) != os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_caller_stops_the_process(worker):
+    run = asyncio.create_task(worker.run(_hang))
+    await asyncio.sleep(0.2)
+    process = worker.process
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
+    assert not process.is_alive()
+
+
+@pytest.mark.asyncio
+async def test_tasks_can_start_processes(worker):
+    assert await worker.run(_start_child) == 0
+
+
+def test_interpreter_exit_stops_the_worker():
+    script = ("import asyncio, multiprocessing\n"
+              "from core.supervisor import TaskWorker\n"
+              "worker = TaskWorker(multiprocessing.get_context('fork'))\n"
+              "asyncio.run(worker.run(sorted, [2, 1]))\n")
+    subprocess.run([sys.executable, "-c", script], check=True, timeout=30,
+                   cwd=os.path.dirname(os.path.dirname(__file__)))
@@ -0,0 +1,63 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("datasets")
+
+from core import tokenization_cache as tokenization_cache_module
+from core.tokenization_cache import TokenizationCache, dataset_fingerprint
+
+WORDS = ["good", "bad", "movie", "very", "not", "the", "plot", "was"]
+
+
+@pytest.fixture(scope="module")
+def tokenizer(tmp_path_factory):
+    vocab = tmp_path_factory.mktemp("tokenizer") / "vocab.txt"
+    vocab.write_text("\n".join(
+        ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    return transformers.BertTokenizerFast(vocab_file=str(vocab))
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "text": ["good", "the plot was very bad", "not good movie"],
+        "label": [1, 0, 1]})
+
+
+def test_tokenizes_without_padding(tmp_path, tokenizer, frame):
+    tokenized = TokenizationCache(tmp_path).tokenize(tokenizer, frame)
+
+    lengths = [len(ids) for ids in tokenized["input_ids"]]
+    assert lengths == [3, 7, 5]
+    assert tokenized["label"] == [1, 0, 1]
+
+
+def test_second_call_loads_from_disk(tmp_path, tokenizer, frame,
+                                     monkeypatch):
+    cache = TokenizationCache(tmp_path)
+    first = cache.tokenize(tokenizer, frame)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("tokenized again")
+
+    monkeypatch.setattr(tokenization_cache_module.Dataset, "from_pandas",
+                        fail)
+    second = cache.tokenize(tokenizer, frame)
+    assert second["input_ids"] == first["input_ids"]
+
+
+def test_key_depends_on_content(tmp_path, tokenizer, frame):
+    cache = TokenizationCache(tmp_path)
+    changed = frame.copy()
+    changed.loc[0, "text"] = "bad"
+
+    assert dataset_fingerprint(frame) == dataset_fingerprint(frame.copy())
+    assert cache.key(tokenizer, frame, "text") != \
+        cache.key(tokenizer, changed, "text")
+
+
+def test_small_datasets_stay_in_process(tmp_path):
+    cache = TokenizationCache(tmp_path, processes=4)
+    assert cache.num_proc(100) is None
+    assert cache.num_proc(10 ** 7) == 4
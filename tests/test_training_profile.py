@@ -0,0 +1,94 @@
+import json
+import pytest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+training_profile_module = pytest.importorskip("core.training_profile")
+from core.training_profile import TimeLimit, TrainingProfile, training_profile
+
+
+def test_default_profile_is_configured_one():
+    assert training_profile().name == "default"
+    with patch.object(training_profile_module, "TRAINING_PROFILE", "cpu"):
+        assert training_profile().name == "cpu"
+
+
+def test_unknown_profile_or_option_is_rejected():
+    with pytest.raises(ValueError):
+        training_profile("tpu")
+    with pytest.raises(ValueError):
+        training_profile("cpu", {"learning_rate": 1})
+
+
+def test_options_override_profile_fields():
+    profile = training_profile("cpu", {"gradient_accumulation_steps": 4,
+                                       "bf16": False})
+    assert profile.name == "cpu"
+    assert profile.group_by_length
+    assert profile.gradient_accumulation_steps == 4
+    assert profile.training_arguments()["bf16"] is False
+
+
+def test_cpu_profile_splits_cores_between_loaders_and_model():
+    with patch.object(training_profile_module, "available_cores",
+                      return_value=32):
+        profile = training_profile("cpu")
+    assert profile.dataloader_workers == 2
+    assert profile.intra_op_threads == 30
+    assert profile.inter_op_threads == 1
+
+    with patch.object(training_profile_module, "available_cores",
+                      return_value=1):
+        profile = training_profile("cpu")
+    assert profile.dataloader_workers == 0
+    assert profile.intra_op_threads == 1
+
+
+def test_bf16_only_where_cpu_supports_it():
+    profile = TrainingProfile(name="test", bf16=True, use_cpu=True)
+    with patch.object(training_profile_module, "cpu_supports_bf16",
+                      return_value=False):
+        assert not profile.use_bf16()
+    with patch.object(training_profile_module, "cpu_supports_bf16",
+                      return_value=True):
+        assert profile.use_bf16()
+
+
+@pytest.mark.parametrize("name", ["default", "cpu"])
+def test_training_arguments_are_accepted(name, tmp_path):
+    with patch.object(training_profile_module, "cpu_supports_bf16",
+                      return_value=False):
+        arguments = training_profile(name).training_arguments()
+    args = transformers.TrainingArguments(output_dir=str(tmp_path),
+                                          **arguments)
+    assert args.dataloader_num_workers == arguments["dataloader_num_workers"]
+    assert args.train_sampling_strategy == \
+        ("group_by_length" if name == "cpu" else "random")
+
+
+def test_time_limit_stops_training_with_a_checkpoint():
+    state = MagicMock(global_step=3)
+    control = transformers.TrainerControl()
+
+    TimeLimit(60).on_step_end(None, state, control)
+    assert not control.should_training_stop
+
+    TimeLimit(0).on_step_end(None, state, control)
+    assert control.should_training_stop
+    assert control.should_save
+
+
+def test_task_profile_overrides_worker_profile():
+    transformer_task = pytest.importorskip("core.transformer_task")
+    params = json.loads((Path(__file__).parent.parent / "jsons" /
+                         "transformer_task.json").read_text())
+
+    task = transformer_task.TransformerTask()
+    task.default_training_profile = "cpu"
+    task.set_params(json.dumps(params))
+    assert task.training_profile.name == "cpu"
+
+    task.set_params(json.dumps({**params, "training_profile": "default"}))
+    assert task.training_profile.name == "default"
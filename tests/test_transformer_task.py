@@ -0,0 +1,155 @@
+import json
+import pickle
+import pytest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+pd = pytest.importorskip("pandas")
+transformer_task = pytest.importorskip("core.transformer_task")
+TransformerTask = transformer_task.TransformerTask
+from core.dataset_cache import DatasetCache
+
+SAMPLE_TASK = Path(__file__).parent.parent / "jsons" / "transformer_task.json"
+model_cache = transformer_task.model_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_caches(tmp_path):
+    model_cache.clear()
+    dataset_cache = DatasetCache(tmp_path / "datasets")
+    with patch.object(transformer_task, "dataset_cache", dataset_cache):
+        yield
+    model_cache.clear()
+
+
+def _task(**overrides):
+    params = json.loads(SAMPLE_TASK.read_text())
+    params["batch_size"] = 2
+    params.update(overrides)
+    task = TransformerTask()
+    task.set_params(json.dumps(params))
+    return task
+
+
+def test_zero_shot_builds_one_pipeline_and_batches(tmp_path):
+    predict = tmp_path / "predict.csv"
+    pd.DataFrame({"id": [10, 11, 12], "text": ["a", "b", "c"]}).to_csv(
+        predict, index=False)
+    task = _task(predict_ds_url=str(predict))
+
+    classifier = MagicMock(side_effect=lambda texts, batch_size: [
+        {"label": text.upper(), "score": 1.0} for text in texts])
+    with patch.object(transformer_task, "pipeline",
+                      return_value=classifier) as mock_pipeline:
+        task.start_working()
+
+    mock_pipeline.assert_called_once_with(
+        "sentiment-analysis", model=None, revision=None)
+    classifier.assert_called_once_with(["a", "b", "c"], batch_size=2)
+    assert task.get_results() == ({"model_name": None},
+                                  {"10": "A", "11": "B", "12": "C"})
+
+
+def test_zero_shot_pipeline_is_reused_across_jobs(tmp_path):
+    predict = tmp_path / "predict.csv"
+    pd.DataFrame({"id": [1], "text": ["a"]}).to_csv(predict, index=False)
+
+    classifier = MagicMock(side_effect=lambda texts, batch_size: [
+        {"label": "A", "score": 1.0} for _ in texts])
+    with patch.object(transformer_task, "pipeline",
+                      return_value=classifier) as mock_pipeline:
+        for _ in range(3):
+            _task(predict_ds_url=str(predict)).start_working()
+
+    mock_pipeline.assert_called_once()
+    assert model_cache.stats()["hits"] >= 2
+
+
+def test_streaming_mode_spills_predictions_chunk_by_chunk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(transformer_task, "STREAMING_CHUNK_ROWS", 2)
+    predict = tmp_path / "predict.csv"
+    pd.DataFrame({"id": [10, 11, 12, 13, 14],
+                  "text": ["a", "b", "c", "d", "e"]}).to_csv(predict, index=False)
+    task = _task(predict_ds_url=str(predict), streaming=True)
+
+    classifier = MagicMock(side_effect=lambda texts, batch_size: [
+        {"label": text.upper(), "score": 1.0} for text in texts])
+    with patch.object(transformer_task, "pipeline", return_value=classifier):
+        task.start_working()
+
+    assert [call.args[0] for call in classifier.call_args_list] == [
+        ["a", "b"], ["c", "d"], ["e"]]
+    _, spill = task.get_results()
+    spill = pickle.loads(pickle.dumps(spill))
+    assert len(spill) == 5
+    assert spill.to_dict() == {"10": "A", "11": "B", "12": "C", "13": "D",
+                               "14": "E"}
+
+
+def test_streaming_mode_resumes_from_checkpointed_chunks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(transformer_task, "STREAMING_CHUNK_ROWS", 2)
+    predict = tmp_path / "predict.csv"
+    pd.DataFrame({"id": [10, 11, 12, 13, 14],
+                  "text": ["a", "b", "c", "d", "e"]}).to_csv(predict, index=False)
+
+    def classify(texts, batch_size):
+        if texts == ["c", "d"] and fail_once:
+            fail_once.pop()
+            raise RuntimeError("stopped")
+        return [{"label": text.upper(), "score": 1.0} for text in texts]
+
+    fail_once = [True]
+    classifier = MagicMock(side_effect=classify)
+    with patch.object(transformer_task, "pipeline", return_value=classifier):
+        for _ in range(2):
+            task = _task(predict_ds_url=str(predict), streaming=True)
+            task.checkpoint_dir = str(tmp_path / "checkpoint")
+            try:
+                task.start_working()
+            except RuntimeError:
+                pass
+
+    # The first chunk was kept by the stopped run and not predicted again
+    assert [call.args[0] for call in classifier.call_args_list] == [
+        ["a", "b"], ["c", "d"], ["c", "d"], ["e"]]
+    _, spill = task.get_results()
+    assert spill.to_dict() == {"10": "A", "11": "B", "12": "C", "13": "D",
+                               "14": "E"}
+
+
+class TiedModel(transformer_task.torch.nn.Module):
+    """Embedding and head sharing one weight, like a tied language
+    model head."""
+    _tied_weights_keys = {"head.weight": "embedding.weight"}
+
+    def __init__(self):
+        super().__init__()
+        self.embedding = transformer_task.torch.nn.Embedding(4, 2)
+        self.head = transformer_task.torch.nn.Linear(2, 4, bias=False)
+        self.head.weight = self.embedding.weight
+        self.norm = transformer_task.torch.nn.LayerNorm(2)
+
+
+def _predict_with_weights(weights):
+    task = _task(model_name="tied")
+    predictor = MagicMock()
+    predictor.return_value.predict.return_value = {1: "A"}
+    with patch.object(task, "load_model", return_value=TiedModel()), \
+            patch.object(task, "load_tokenizer"), \
+            patch.object(transformer_task, "BatchPredictor", predictor):
+        return task.predict_sample([1], ["a"], weights)
+
+
+def test_predict_sample_accepts_weights_without_tied_duplicates():
+    weights = TiedModel().state_dict()
+    del weights["embedding.weight"]
+    assert _predict_with_weights(weights) == {1: "A"}
+
+
+def test_predict_sample_rejects_weights_with_missing_params():
+    weights = TiedModel().state_dict()
+    del weights["norm.weight"]
+    with pytest.raises(ValueError, match="norm.weight"):
+        _predict_with_weights(weights)
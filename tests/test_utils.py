@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+import pytest
+from unittest.mock import MagicMock, patch
+
+from src import utils
+from src.utils import get_contract, get_contract_instance, iter_pages, \
+    write_abi_artifact
+
+
+def _compiled(abi):
+    return {"contracts": {"Box.sol": {"Box": {
+        "abi": abi,
+        "evm": {"bytecode": {"object": "6080"}},
+        "metadata": "{}",
+    }}}}
+
+
+def _write_compiled(directory, abi):
+    path = directory / "Box_compiled.json"
+    path.write_text(json.dumps(_compiled(abi)))
+    return path
+
+
+def test_get_contract_is_cached_until_mtime_changes(tmp_path):
+    path = _write_compiled(tmp_path, [{"name": "a"}])
+    with patch.object(utils, "COMPILED_CONTRACTS_DIR", tmp_path), \
+            patch.object(utils, "process_json_file",
+                         wraps=utils.process_json_file) as mock_read:
+        abi, bytecode = get_contract("Box")
+        assert get_contract("Box")[0] is abi
+        assert bytecode == "6080"
+        assert mock_read.call_count == 1
+
+        _write_compiled(tmp_path, [{"name": "b"}])
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert get_contract("Box")[0] == [{"name": "b"}]
+        assert mock_read.call_count == 2
+
+
+def test_get_contract_prefers_slim_artifact(tmp_path):
+    _write_compiled(tmp_path, [{"name": "a"}])
+    with patch.object(utils, "COMPILED_CONTRACTS_DIR", tmp_path):
+        slim_path = write_abi_artifact("Box", _compiled([{"name": "a"}]))
+        assert json.loads(slim_path.read_text()) == {
+            "abi": [{"name": "a"}], "bytecode": "6080"}
+        os.remove(tmp_path / "Box_compiled.json")
+        assert get_contract("Box") == ([{"name": "a"}], "6080")
+
+
+def test_get_contract_instance_is_reused_per_client(tmp_path):
+    _write_compiled(tmp_path, [])
+    w3, other_w3 = MagicMock(), MagicMock()
+    with patch.object(utils, "COMPILED_CONTRACTS_DIR", tmp_path):
+        first = get_contract_instance(w3, "Box", "0x1")
+        assert get_contract_instance(w3, "Box", "0x1") is first
+        assert get_contract_instance(other_w3, "Box", "0x1") is not first
+        w3.eth.contract.assert_called_once_with(address="0x1", abi=[])
+
+
+@pytest.mark.asyncio
+async def test_iter_pages_keeps_order_and_bounds_requests():
+    in_flight, most_in_flight = 0, 0
+
+    async def fetch_page(offset):
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        # Later pages answer first
+        await asyncio.sleep(0.01 * (10 - offset) / 10)
+        in_flight -= 1
+        return list(range(offset, min(offset + 3, 10)))
+
+    pages = [page async for page in iter_pages(10, 3, fetch_page, 2)]
+    assert pages == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert most_in_flight == 2
+    assert [page async for page in iter_pages(0, 3, fetch_page, 2)] == []
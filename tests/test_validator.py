@@ -0,0 +1,164 @@
+import json
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from core.artifact_store import LocalArtifactStore
+from core.pipeline import RetryBackoff
+from core.scheduler import start_orchestrator
+from core.validator import ResultValidator, ValidationReport, sample_size
+from src.CrumbIndex import CrumbIndex
+from src.MainContract import ComputeTaskHeader
+from src.SubContract import Crumb, CrumbStatus
+
+SAMPLE_TASK = Path(__file__).parent.parent / "jsons" / "transformer_task.json"
+ME = "0x0000000000000000000000000000000000000001"
+
+
+def test_sample_size_does_not_grow_with_the_dataset():
+    assert sample_size(10 ** 6, confidence=0.95, margin=0.05) == 384
+    assert sample_size(100, confidence=0.95, margin=0.05) == 80
+    assert sample_size(10, confidence=0.99, margin=0.01) == 10
+    assert sample_size(0) == 0
+    assert sample_size(10 ** 9) - sample_size(10 ** 5) < 200
+
+
+def test_validate_result_predicts_only_the_sample(tmp_path):
+    pd = pytest.importorskip("pandas")
+    transformer_task = pytest.importorskip("core.transformer_task")
+    from core.dataset_cache import DatasetCache
+    from core.result_codec import encode_results
+    from core.validator import validate_result
+
+    predict = tmp_path / "predict.csv"
+    texts = [f"text {n}" for n in range(2000)]
+    pd.DataFrame({"id": range(2000), "text": texts}).to_csv(
+        predict, index=False)
+    params = json.loads(SAMPLE_TASK.read_text())
+    params["predict_ds_url"] = str(predict)
+    store = LocalArtifactStore(tmp_path / "artifacts")
+
+    honest = {n: text.upper() for n, text in enumerate(texts)}
+    # One row in ten was never computed
+    lazy = {n: "POSITIVE" if n % 10 == 0 else label
+            for n, label in honest.items()}
+
+    classifier = MagicMock(side_effect=lambda texts, batch_size: [
+        {"label": text.upper(), "score": 1.0} for text in texts])
+    with patch.object(transformer_task, "pipeline", return_value=classifier), \
+            patch.object(transformer_task, "dataset_cache",
+                         DatasetCache(tmp_path / "datasets")):
+        reports = [
+            validate_result(
+                json.dumps(params), {"tolerance": 0.02},
+                encode_results(({"model_name": None}, predictions), store),
+                store, seed=7)
+            for predictions in (honest, lazy)]
+
+    size = sample_size(2000)
+    assert [len(call.args[0]) for call in classifier.call_args_list] == \
+        [size, size]
+    assert reports[0].passed and reports[0].mismatches == 0
+    assert not reports[1].passed
+    assert 0.05 < reports[1].mismatch_rate < 0.15
+
+
+class _FakeWorker:
+    async def run(self, target, setup_task, validation, manifest,
+                  store, **_):
+        rows = json.loads(manifest)["rows"]
+        return ValidationReport(10, mismatches=0 if rows == 5 else 3,
+                                missing=0, published_rows=rows,
+                                dataset_rows=rows, tolerance=0.1)
+
+
+def _crumb(number, assignee, rows):
+    return Crumb(id=bytes([number]) * 16, alias_name="crumb", price=0,
+                 status=CrumbStatus.CLOSED, setup_task="{}",
+                 setup_validation="{}", result=json.dumps({"rows": rows}),
+                 assignee=assignee, last_updated=0, max_run=0)
+
+
+def _validator(tmp_path, crumbs, **kwargs):
+    # A fresh index answers without syncing
+    crumb_index = CrumbIndex(tmp_path / "index.sqlite3")
+    crumb_index.upsert_crumbs("sub", list(crumbs.values()))
+    crumb_index.mark_synced("sub", 0)
+    orchestrator = SimpleNamespace(
+        network="sapphire-localnet", contract_utility=None, crumb_index=None,
+        w3=SimpleNamespace(eth=SimpleNamespace(default_account=ME)))
+    return ResultValidator(orchestrator, "0xmain", validation_slots=2,
+                           artifact_store=LocalArtifactStore(tmp_path),
+                           crumb_index=crumb_index, **kwargs)
+
+
+def _chain(crumbs):
+    async def get_crumb(address, crumb_id, **_):
+        return crumbs[crumb_id]
+
+    return (patch("core.validator.get_in_progress_headers",
+                  return_value=[ComputeTaskHeader(0, "sub", 0)]),
+            patch("core.validator.get_crumb", side_effect=get_crumb),
+            patch("src.CrumbIndex.get_crumb", side_effect=get_crumb))
+
+
+@pytest.mark.asyncio
+async def test_passing_results_are_validated_in_one_write(tmp_path):
+    crumbs = {crumb.id: crumb for crumb in (
+        _crumb(1, "0xother", 5), _crumb(2, "0xother", 7),
+        _crumb(3, ME, 5), _crumb(4, "0xother", 5))}
+    validator = _validator(tmp_path, crumbs)
+    validator.workers = [_FakeWorker(), _FakeWorker()]
+
+    headers, get_crumb, refresh = _chain(crumbs)
+    with headers, get_crumb, refresh, \
+            patch("core.validator.update_crumbs_to_closed_validated") \
+            as mock_update:
+        assert await validator.run_once() == 2
+        # The rejected result is not checked again
+        assert await validator.run_once() == 2
+
+    address, crumb_ids = mock_update.call_args_list[0].args
+    assert address == "sub"
+    assert sorted(crumb_ids) == [bytes([1]) * 16, bytes([4]) * 16]
+    assert validator.rejected == {("sub", bytes([2]) * 16)}
+
+
+class _BrokenWorker:
+    def __init__(self):
+        self.runs = 0
+
+    async def run(self, *args, **kwargs):
+        self.runs += 1
+        raise ConnectionError("artifact store unreachable")
+
+
+@pytest.mark.asyncio
+async def test_results_that_cannot_be_checked_back_off(tmp_path):
+    crumbs = {crumb.id: crumb for crumb in [_crumb(1, "0xother", 5)]}
+    retries = RetryBackoff(max_attempts=2, delay=60)
+    validator = _validator(tmp_path, crumbs, retries=retries)
+    worker = _BrokenWorker()
+    validator.workers = [worker]
+
+    headers, get_crumb, refresh = _chain(crumbs)
+    with headers, get_crumb, refresh:
+        assert await validator.run_once() == 0
+        # Waiting for its retry
+        assert await validator.run_once() == 0
+        assert worker.runs == 1
+
+        retries.retry_at.clear()
+        assert await validator.run_once() == 0
+        assert worker.runs == 2
+        assert validator.rejected == {("sub", bytes([1]) * 16)}
+        assert await validator.run_once() == 0
+        assert worker.runs == 2
+
+
+@pytest.mark.asyncio
+async def test_validator_mode_needs_a_shared_artifact_store():
+    with pytest.raises(ValueError, match="--artifact-store"):
+        await start_orchestrator("sapphire-localnet", "MessageBox", "key",
+                                 mode="validate")